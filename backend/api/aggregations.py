@@ -0,0 +1,121 @@
+"""
+Server-side ledger aggregations
+Pushes date-range filtering and sums into MongoDB instead of materialising transactions in Python
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+
+from bson import ObjectId
+
+from .models import Transaction
+
+
+def _user_oid(user_id) -> ObjectId:
+    return ObjectId(str(getattr(user_id, "id", user_id)))
+
+
+def sum_by_type_for_windows(
+    user_id,
+    windows: Dict[str, Tuple[datetime, datetime]],
+    types: Iterable[str] = ("income", "expense"),
+) -> Dict[str, Dict[str, float]]:
+    """
+    Totals per transaction type for any number of (start, end) date windows in one round trip.
+
+    windows: {"name": (start, end)}  (naive UTC datetimes, both ends inclusive)
+    returns: {"name": {"income": 0.0, "expense": 0.0}}
+    """
+    types = list(types)
+    result = {name: {t: 0.0 for t in types} for name in windows}
+    if not windows:
+        return result
+
+    names = list(windows)
+    group = {"_id": "$type"}
+    for i, name in enumerate(names):
+        start, end = windows[name]
+        group[f"w{i}"] = {"$sum": {"$cond": [
+            {"$and": [{"$gte": ["$date", start]}, {"$lte": ["$date", end]}]},
+            "$amount",
+            0,
+        ]}}
+
+    pipeline = [
+        {"$match": {
+            "user_id": _user_oid(user_id),
+            "type": {"$in": types},
+            "date": {
+                "$gte": min(start for start, _ in windows.values()),
+                "$lte": max(end for _, end in windows.values()),
+            },
+        }},
+        {"$group": group},
+    ]
+    for row in Transaction._get_collection().aggregate(pipeline):
+        for i, name in enumerate(names):
+            result[name][row["_id"]] = float(row.get(f"w{i}") or 0.0)
+    return result
+
+
+def daily_sums_by_type(
+    user_id,
+    types: Iterable[str] = ("income", "expense"),
+    since: datetime = None,
+) -> Dict[str, Tuple[list, list]]:
+    """
+    Daily totals per transaction type in one $group round trip (days are UTC calendar days).
+
+    returns: {"income": ([datetime day, ...], [total, ...]), "expense": (...)}  ascending by day
+    """
+    types = list(types)
+    match = {"user_id": _user_oid(user_id), "type": {"$in": types}}
+    if since is not None:
+        match["date"] = {"$gte": since}
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+                "type": "$type",
+            },
+            "total": {"$sum": "$amount"},
+        }},
+        {"$sort": {"_id.day": 1}},
+    ]
+    result = {t: ([], []) for t in types}
+    for row in Transaction._get_collection().aggregate(pipeline):
+        if row["_id"].get("day") is None:
+            continue  # transactions without a date
+        days, totals = result[row["_id"]["type"]]
+        days.append(datetime.strptime(row["_id"]["day"], "%Y-%m-%d"))
+        totals.append(float(row.get("total") or 0.0))
+    return result
+
+
+def category_amount_stats(user_id, tx_type: str = "expense") -> Dict[str, Dict[str, float]]:
+    """
+    Per-category count / mean / population std-dev of amounts, computed server-side.
+
+    returns: {"groceries": {"count": 12, "mean": 840.0, "std": 120.5, "sum": 10080.0}, ...}
+    """
+    pipeline = [
+        {"$match": {"user_id": _user_oid(user_id), "type": tx_type}},
+        {"$group": {
+            "_id": "$category",
+            "count": {"$sum": 1},
+            "sum": {"$sum": "$amount"},
+            "mean": {"$avg": "$amount"},
+            "std": {"$stdDevPop": "$amount"},
+        }},
+    ]
+    return {
+        row["_id"]: {
+            "count": int(row.get("count") or 0),
+            "sum": float(row.get("sum") or 0.0),
+            "mean": float(row.get("mean") or 0.0),
+            "std": float(row.get("std") or 0.0),
+        }
+        for row in Transaction._get_collection().aggregate(pipeline)
+    }
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.conf import settings
+        if getattr(settings, 'ML_WARMUP_ON_START', False):
+            # the ML stack is imported lazily (api/ml.py); preload it off the request path
+            from .ml import warm_up_in_background
+            warm_up_in_background()
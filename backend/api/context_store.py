@@ -0,0 +1,138 @@
+"""
+Conversation context store
+Chat context (last query, time period, recent history) per (engine namespace, user), bounded in size
+and age; shared by every engine instance in the process, or by every worker with the MongoDB backend
+"""
+
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from .data_cache import BoundedLRUCache, user_key
+from .models import ConversationState
+
+BACKEND = getattr(settings, "CONVERSATION_CONTEXT_BACKEND", "memory")
+TTL_SECONDS = getattr(settings, "CONVERSATION_CONTEXT_TTL_SECONDS", 24 * 60 * 60)
+HISTORY_LIMIT = getattr(settings, "CONVERSATION_CONTEXT_HISTORY_LIMIT", 10)
+MAX_ENTRIES = getattr(settings, "CONVERSATION_CONTEXT_MAX_ENTRIES", 10000)
+MAX_BYTES = getattr(settings, "CONVERSATION_CONTEXT_MAX_BYTES", 32 * 1024 * 1024)
+
+def _trimmed(state: Dict) -> Dict:
+    """Copy of state with conversation_history cut down to the last HISTORY_LIMIT entries"""
+    state = dict(state)
+    history = state.get("conversation_history")
+    if history is not None:
+        state["conversation_history"] = list(history[-HISTORY_LIMIT:])
+    return state
+
+
+class MemoryContextStore:
+    """Per-process store: LRU over users, evicted by TTL, entry count and a global byte cap"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES, ttl: float = TTL_SECONDS):
+        self._cache = BoundedLRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+
+    def get(self, namespace: str, user_id) -> Optional[Dict]:
+        state = self._cache.get((namespace, user_key(user_id)))
+        # callers mutate what they get; the cached copy only changes through put()
+        return json.loads(state) if state is not None else None
+
+    def put(self, namespace: str, user_id, state: Dict) -> None:
+        # stored serialised: the size is exact and no caller can hold a live reference to it
+        body = json.dumps(_trimmed(state), default=str)
+        self._cache.set((namespace, user_key(user_id)), body, size=len(body))
+
+    def delete(self, namespace: str, user_id) -> bool:
+        key = (namespace, user_key(user_id))
+        existed = self._cache.get(key) is not None
+        self._cache.pop(key)
+        return existed
+
+    def forget_user(self, user_id) -> None:
+        key = user_key(user_id)
+        self._cache.pop_matching(lambda k: k[1] == key)
+
+    def stats(self) -> Dict:
+        return self._cache.stats()
+
+
+class MongoContextStore:
+    """Shared across workers and restarts; a TTL index on expires_at removes idle contexts"""
+
+    def __init__(self, ttl: float = TTL_SECONDS):
+        self.ttl = ttl
+
+    def get(self, namespace: str, user_id) -> Optional[Dict]:
+        try:
+            doc = ConversationState._get_collection().find_one(
+                {"user_id": user_key(user_id), "namespace": namespace,
+                 "expires_at": {"$gt": datetime.utcnow()}},  # the TTL monitor only runs once a minute
+                {"state": 1},
+            )
+        except Exception as e:
+            print("❌ Conversation context load failed:", str(e))
+            return None
+        return doc.get("state") if doc else None
+
+    def put(self, namespace: str, user_id, state: Dict) -> None:
+        try:
+            ConversationState._get_collection().update_one(
+                {"user_id": user_key(user_id), "namespace": namespace},
+                {"$set": {
+                    # round-trip through JSON so datetimes/ObjectIds are stored like the memory backend keeps them
+                    "state": json.loads(json.dumps(_trimmed(state), default=str)),
+                    "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl),
+                }},
+                upsert=True,
+            )
+        except Exception as e:
+            print("❌ Conversation context save failed:", str(e))
+
+    def delete(self, namespace: str, user_id) -> bool:
+        try:
+            result = ConversationState._get_collection().delete_one(
+                {"user_id": user_key(user_id), "namespace": namespace}
+            )
+            return result.deleted_count > 0
+        except Exception as e:
+            print("❌ Conversation context delete failed:", str(e))
+            return False
+
+    def forget_user(self, user_id) -> None:
+        try:
+            ConversationState._get_collection().delete_many({"user_id": user_key(user_id)})
+        except Exception as e:
+            print("❌ Conversation context cleanup failed:", str(e))
+
+    def stats(self) -> Dict:
+        return {"entries": ConversationState._get_collection().estimated_document_count()}
+
+
+BACKENDS = {
+    "memory": MemoryContextStore,
+    "mongo": MongoContextStore,
+}
+
+_store = None
+_lock = threading.Lock()
+
+
+def get_context_store():
+    """Process-wide store for CONVERSATION_CONTEXT_BACKEND (memory | mongo)"""
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                if BACKEND not in BACKENDS:
+                    raise ValueError(f"Unknown CONVERSATION_CONTEXT_BACKEND {BACKEND!r} "
+                                     f"(expected one of: {', '.join(BACKENDS)})")
+                _store = BACKENDS[BACKEND]()
+    return _store
+
+
+def forget_user(user_id) -> None:
+    """Drop every conversation context of a user (e.g. when the user is deleted)"""
+    get_context_store().forget_user(user_id)
@@ -0,0 +1,144 @@
+"""
+Per-user data versions and bounded in-process caches
+Write paths bump a user's data version; read paths key cached results on it
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Hashable, Optional
+
+from .models import UserDataVersion
+
+
+# -------------------------
+# Data versions
+# -------------------------
+def user_key(user) -> str:
+    """Normalise a User document, DBRef, ObjectId or id string to a str key"""
+    if user is None:
+        return ""
+    return str(getattr(user, "id", user))
+
+
+def get_data_version(user) -> int:
+    """Current data version for a user (0 if nothing was ever written)"""
+    doc = UserDataVersion._get_collection().find_one(
+        {"user_id": user_key(user)}, {"version": 1}
+    )
+    return int(doc["version"]) if doc else 0
+
+
+def bump_data_version(user) -> None:
+    """Invalidate everything cached for a user; called by every write path"""
+    key = user_key(user)
+    if not key:
+        return
+    try:
+        UserDataVersion.objects(user_id=key).update_one(
+            inc__version=1, set__updated_at=datetime.utcnow(), upsert=True
+        )
+    except Exception as e:
+        print("❌ Data version bump failed:", str(e))
+
+
+# -------------------------
+# Bounded LRU cache
+# -------------------------
+def approx_size(obj, _seen=None) -> int:
+    """Rough deep size in bytes of dict/list/scalar trees (good enough for a memory cap)"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, _seen) + approx_size(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(v, _seen) for v in obj)
+    elif hasattr(obj, "nbytes"):  # numpy arrays
+        size += int(obj.nbytes)
+    return size
+
+
+class BoundedLRUCache:
+    """Thread-safe LRU cache bounded by entry count, approximate bytes and optional TTL"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, size: Optional[int] = None) -> None:
+        if size is None:
+            size = approx_size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return  # never evict the whole cache for one oversized entry
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def pop_matching(self, predicate) -> None:
+        """Drop every entry whose key satisfies predicate(key)"""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
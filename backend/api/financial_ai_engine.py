@@ -6,39 +6,96 @@ Uses real database data instead of JSON files
 
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta, timezone
+from django.conf import settings
 from .models import User, Account, Transaction, Budget, Goal, Portfolio, Debt, UserPermission
+from .data_cache import BoundedLRUCache, get_data_version
+from .aggregations import sum_by_type_for_windows
+from .ml import empty_ledger, load_ledger
+from .intent_router import PhraseRouter
+from .context_store import get_context_store
+
+# user_id -> (data_version, snapshot); shared by every engine instance in the process
+_snapshot_cache = BoundedLRUCache(
+    max_entries=getattr(settings, 'FINANCIAL_SNAPSHOT_CACHE_MAX_ENTRIES', 1024),
+    max_bytes=getattr(settings, 'FINANCIAL_SNAPSHOT_CACHE_MAX_BYTES', 128 * 1024 * 1024),
+)
+
+# process_query intents, highest priority first — ORDER MATTERS (more specific patterns first)
+QUERY_INTENTS = [
+    ("income", ["what's my income", "my income", "income last month", "income this month", "how much do i earn", "my salary"]),
+    ("balance", ["what's my balance", "my balance", "current balance", "account balance", "how much money do i have"]),
+    ("spending", ["how much did i spend", "my spending", "spending this month", "spending last month", "what did i spend"]),
+    ("net_worth", ["what's my net worth", "my net worth", "total assets", "my worth"]),
+    ("savings", ["how much can i save", "my savings", "saving this month", "savings potential"]),
+    ("investment", ["my investments", "investment portfolio", "should i invest", "invest more"]),
+    ("budget", ["my budget", "budget status", "how are my budgets"]),
+    ("affordability", ["can i afford", "afford a vacation", "afford to buy", "afford to take"]),
+    ("expense_analysis", ["why did my expenses increase", "expenses increased", "expense analysis"]),
+    ("debt_repayment", ["repay my loan", "pay off debt", "debt repayment", "best option for repaying"]),
+]
+
+FOLLOW_UP_INDICATORS = [
+    'what about', 'how about', 'and', 'also', 'then', 'next',
+    'last 3 months', 'last 6 months', 'last year', 'this year',
+    'compared to', 'vs', 'versus', 'difference', 'change',
+    'more', 'less', 'higher', 'lower', 'increase', 'decrease'
+]
+
+# asking about a time period counts as a follow-up even without previous context
+TIME_PERIOD_FOLLOW_UPS = [
+    'what about last month', 'what about this month', 'what about last year',
+    'what about last 3 months', 'what about last 6 months', 'what about this year'
+]
+
+# every phrase list above, compiled once: one pass over the query per process_query call
+QUERY_ROUTER = PhraseRouter(QUERY_INTENTS, {
+    'follow_up': FOLLOW_UP_INDICATORS,
+    'time_period': TIME_PERIOD_FOLLOW_UPS,
+})
 
 class FinancialAIEngine:
-    def __init__(self):
-        # Conversation context storage
-        self.conversation_context = {}
+    # intent -> handler; anything unrouted goes to _handle_general_query
+    INTENT_HANDLERS = {
+        "income": "_handle_income_query",
+        "balance": "_handle_balance_query",
+        "spending": "_handle_spending_query",
+        "net_worth": "_handle_net_worth_query",
+        "savings": "_handle_savings_query",
+        "investment": "_handle_investment_query",
+        "budget": "_handle_budget_query",
+        "affordability": "_handle_affordability_query",
+        "expense_analysis": "_handle_expense_analysis_query",
+        "debt_repayment": "_handle_debt_repayment_query",
+    }
+
+    CONTEXT_NAMESPACE = "ai"
+
+    def __init__(self, context_store=None):
+        # Conversation context storage (process-wide unless a store is passed in)
+        self.context_store = context_store or get_context_store()
     
-    def _get_conversation_context(self, user_id: str) -> Dict[str, Any]:
-        """Get conversation context for a user"""
-        return self.conversation_context.get(user_id, {
+    @staticmethod
+    def _empty_context() -> Dict[str, Any]:
+        return {
             'last_query_type': None,
             'last_time_period': None,
             'last_category': None,
             'last_amount': None,
             'conversation_history': []
-        })
+        }
+    
+    def _get_conversation_context(self, user_id: str) -> Dict[str, Any]:
+        """Get conversation context for a user"""
+        return self.context_store.get(self.CONTEXT_NAMESPACE, user_id) or self._empty_context()
     
     def _update_conversation_context(self, user_id: str, query_type: str, time_period: str = None, category: str = None, amount: float = None):
         """Update conversation context for a user"""
-        if user_id not in self.conversation_context:
-            self.conversation_context[user_id] = {
-                'last_query_type': None,
-                'last_time_period': None,
-                'last_category': None,
-                'last_amount': None,
-                'conversation_history': []
-            }
-        
-        self.conversation_context[user_id]['last_query_type'] = query_type
-        self.conversation_context[user_id]['last_time_period'] = time_period
-        self.conversation_context[user_id]['last_category'] = category
-        self.conversation_context[user_id]['last_amount'] = amount
-        self.conversation_context[user_id]['conversation_history'].append({
+        context = self._get_conversation_context(user_id)
+        context['last_query_type'] = query_type
+        context['last_time_period'] = time_period
+        context['last_category'] = category
+        context['last_amount'] = amount
+        context['conversation_history'].append({
             'query_type': query_type,
             'time_period': time_period,
             'category': category,
@@ -46,9 +103,8 @@ class FinancialAIEngine:
             'timestamp': datetime.now().isoformat()
         })
         
-        # Keep only last 10 conversation entries
-        if len(self.conversation_context[user_id]['conversation_history']) > 10:
-            self.conversation_context[user_id]['conversation_history'] = self.conversation_context[user_id]['conversation_history'][-10:]
+        # the store keeps only the last CONVERSATION_CONTEXT_HISTORY_LIMIT entries
+        self.context_store.put(self.CONTEXT_NAMESPACE, user_id, context)
     
     def _parse_time_period(self, query: str) -> Dict[str, Any]:
         """Parse time period from natural language query"""
@@ -152,31 +208,14 @@ class FinancialAIEngine:
         
         return None
     
-    def _is_follow_up_query(self, query_lower: str, context: Dict[str, Any]) -> bool:
-        """Check if query is a follow-up to previous conversation"""
-        follow_up_indicators = [
-            'what about', 'how about', 'and', 'also', 'then', 'next',
-            'last 3 months', 'last 6 months', 'last year', 'this year',
-            'compared to', 'vs', 'versus', 'difference', 'change',
-            'more', 'less', 'higher', 'lower', 'increase', 'decrease'
-        ]
-        
-        # Check if query contains follow-up indicators
-        has_follow_up_indicators = any(indicator in query_lower for indicator in follow_up_indicators)
+    def _is_follow_up_query(self, query_lower: str, context: Dict[str, Any], route=None) -> bool:
+        """Check if query is a follow-up to previous conversation (route: a precomputed QUERY_ROUTER match)"""
+        flags = (route or QUERY_ROUTER.match(query_lower)).flags
         
         # Check if we have previous context
         has_context = context.get('last_query_type') is not None
         
-        # Also check if query is asking about a specific time period without context
-        # This handles cases like "what about last month" when there's no previous context
-        time_period_queries = [
-            'what about last month', 'what about this month', 'what about last year',
-            'what about last 3 months', 'what about last 6 months', 'what about this year'
-        ]
-        
-        is_time_period_query = any(time_query in query_lower for time_query in time_period_queries)
-        
-        return (has_follow_up_indicators and has_context) or is_time_period_query
+        return ('follow_up' in flags and has_context) or 'time_period' in flags
     
     def _handle_follow_up_query(self, query: str, user_id: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Handle follow-up queries using conversation context"""
@@ -231,9 +270,10 @@ class FinancialAIEngine:
                 "financial_data": {}
             }
         
-        # Calculate spending for both periods
-        spending1 = self._calculate_spending_for_period(data['transactions'], period1)
-        spending2 = self._calculate_spending_for_period(data['transactions'], period2)
+        # Calculate spending for both periods (one aggregation round trip)
+        totals = self._calculate_period_totals(user_id, [period1, period2])
+        spending1 = totals[period1]['expense']
+        spending2 = totals[period2]['expense']
         
         difference = spending2 - spending1
         percentage_change = (difference / spending1 * 100) if spending1 > 0 else 0
@@ -272,9 +312,10 @@ class FinancialAIEngine:
                 "financial_data": {}
             }
         
-        # Calculate income for both periods
-        income1 = self._calculate_income_for_period(data['transactions'], period1)
-        income2 = self._calculate_income_for_period(data['transactions'], period2)
+        # Calculate income for both periods (one aggregation round trip)
+        totals = self._calculate_period_totals(user_id, [period1, period2])
+        income1 = totals[period1]['income']
+        income2 = totals[period2]['income']
         
         difference = income2 - income1
         percentage_change = (difference / income1 * 100) if income1 > 0 else 0
@@ -319,7 +360,7 @@ class FinancialAIEngine:
         
         # Estimate previous balance based on transactions
         if data.get('transactions'):
-            net_change = self._calculate_net_change_for_period(data['transactions'], period1)
+            net_change = self._calculate_net_change_for_period(user_id, period1)
             estimated_previous_balance = current_balance - net_change
         else:
             estimated_previous_balance = current_balance * 0.9  # Rough estimate
@@ -361,8 +402,9 @@ class FinancialAIEngine:
                 "financial_data": {}
             }
         
-        spending1 = self._calculate_spending_for_period(data['transactions'], period1)
-        spending2 = self._calculate_spending_for_period(data['transactions'], period2)
+        totals = self._calculate_period_totals(user_id, [period1, period2])
+        spending1 = totals[period1]['expense']
+        spending2 = totals[period2]['expense']
         
         difference = spending2 - spending1
         percentage_change = (difference / spending1 * 100) if spending1 > 0 else 0
@@ -402,8 +444,9 @@ class FinancialAIEngine:
                 "financial_data": {}
             }
         
-        income1 = self._calculate_income_for_period(data['transactions'], period1)
-        income2 = self._calculate_income_for_period(data['transactions'], period2)
+        totals = self._calculate_period_totals(user_id, [period1, period2])
+        income1 = totals[period1]['income']
+        income2 = totals[period2]['income']
         
         difference = income2 - income1
         percentage_change = (difference / income1 * 100) if income1 > 0 else 0
@@ -446,13 +489,9 @@ class FinancialAIEngine:
             # Fall back to general query handling
             return self._handle_general_query(query, user_id)
     
-    def _calculate_spending_for_period(self, transactions: List[Dict], period: str) -> float:
-        """Calculate total spending for a given time period"""
-        if not transactions:
-            return 0.0
-        
-        # Calculate date range based on period
-        end_date = datetime.now(timezone.utc)
+    def _period_window(self, period: str):
+        """(start, end) UTC window for a time period label"""
+        end_date = datetime.utcnow()
         if period == 'last month':
             start_date = end_date - timedelta(days=60)
         elif period == 'last 3 months':
@@ -463,48 +502,29 @@ class FinancialAIEngine:
             start_date = end_date - timedelta(days=365)
         else:
             start_date = end_date - timedelta(days=30)  # Default to last month
-        
-        total_spending = 0.0
-        for transaction in transactions:
-            if transaction.get('type') == 'expense':
-                transaction_date = datetime.fromisoformat(transaction.get('date', '').replace('Z', '+00:00'))
-                if start_date <= transaction_date <= end_date:
-                    total_spending += transaction.get('amount', 0)
-        
-        return total_spending
+        return start_date, end_date
     
-    def _calculate_income_for_period(self, transactions: List[Dict], period: str) -> float:
+    def _calculate_period_totals(self, user_id: str, periods: List[str]) -> Dict[str, Dict[str, float]]:
+        """Income/expense totals for several time periods, summed by MongoDB in one aggregation"""
+        windows = {period: self._period_window(period) for period in periods}
+        try:
+            return sum_by_type_for_windows(user_id, windows)
+        except Exception as e:
+            print(f"Error aggregating period totals for user {user_id}: {e}")
+            return {period: {'income': 0.0, 'expense': 0.0} for period in periods}
+    
+    def _calculate_spending_for_period(self, user_id: str, period: str) -> float:
+        """Calculate total spending for a given time period"""
+        return self._calculate_period_totals(user_id, [period])[period]['expense']
+    
+    def _calculate_income_for_period(self, user_id: str, period: str) -> float:
         """Calculate total income for a given time period"""
-        if not transactions:
-            return 0.0
-        
-        # Calculate date range based on period
-        end_date = datetime.now(timezone.utc)
-        if period == 'last month':
-            start_date = end_date - timedelta(days=60)
-        elif period == 'last 3 months':
-            start_date = end_date - timedelta(days=90)
-        elif period == 'last 6 months':
-            start_date = end_date - timedelta(days=180)
-        elif period == 'last year':
-            start_date = end_date - timedelta(days=365)
-        else:
-            start_date = end_date - timedelta(days=30)  # Default to last month
-        
-        total_income = 0.0
-        for transaction in transactions:
-            if transaction.get('type') == 'income':
-                transaction_date = datetime.fromisoformat(transaction.get('date', '').replace('Z', '+00:00'))
-                if start_date <= transaction_date <= end_date:
-                    total_income += transaction.get('amount', 0)
-        
-        return total_income
+        return self._calculate_period_totals(user_id, [period])[period]['income']
     
-    def _calculate_net_change_for_period(self, transactions: List[Dict], period: str) -> float:
+    def _calculate_net_change_for_period(self, user_id: str, period: str) -> float:
         """Calculate net change (income - expenses) for a given time period"""
-        income = self._calculate_income_for_period(transactions, period)
-        expenses = self._calculate_spending_for_period(transactions, period)
-        return income - expenses
+        totals = self._calculate_period_totals(user_id, [period])[period]
+        return totals['income'] - totals['expense']
     
     def get_user_permissions(self, user_id: str) -> Dict[str, bool]:
         """Get user permissions for data access"""
@@ -538,7 +558,29 @@ class FinancialAIEngine:
             return f"I have access to: {', '.join(granted_permissions)}. Grant more permissions for comprehensive insights."
         
     def load_financial_data(self, user_id: str) -> Dict[str, Any]:
-        """Load complete financial data from database respecting user permissions"""
+        """
+        Load complete financial data respecting user permissions.
+        Served from the snapshot cache while the user's data version is unchanged;
+        the returned dict is shared between requests and must be treated as read-only.
+        """
+        try:
+            # Read the version before building so a concurrent write always forces a rebuild
+            version = get_data_version(user_id)
+        except Exception as e:
+            print(f"Data version lookup failed for user {user_id}: {e}")
+            return self._build_financial_snapshot(user_id)
+
+        cached = _snapshot_cache.get(str(user_id))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        data = self._build_financial_snapshot(user_id)
+        if "error" not in data:
+            _snapshot_cache.set(str(user_id), (version, data))
+        return data
+
+    def _build_financial_snapshot(self, user_id: str) -> Dict[str, Any]:
+        """Query every permitted collection and build the financial data dict"""
         try:
             # Get user permissions first
             permissions = self.get_user_permissions(user_id)
@@ -552,9 +594,9 @@ class FinancialAIEngine:
                 accounts = Account.objects.filter(user_id=user_id)
             
             # Get transactions (only if permission granted)
-            transactions = []
+            ledger = empty_ledger()
             if permissions.get('transactions', False):
-                transactions = Transaction.objects.filter(user_id=user_id)
+                ledger = load_ledger(user_id, include_descriptions=True)
             
             # Get budgets (only if permission granted)
             budgets = []
@@ -589,14 +631,8 @@ class FinancialAIEngine:
             
             # Calculate monthly income and expenses from transactions
             current_month = datetime.now().replace(day=1)
-            monthly_transactions = transactions.filter(date__gte=current_month)
-            
-            monthly_income_from_transactions = sum(
-                t.amount for t in monthly_transactions if t.type == "income"
-            )
-            monthly_expenses_from_transactions = sum(
-                t.amount for t in monthly_transactions if t.type == "expense"
-            )
+            monthly_income_from_transactions = ledger.total("income", since=current_month)
+            monthly_expenses_from_transactions = ledger.total("expense", since=current_month)
             
             return {
                 "user_id": str(user_id),
@@ -614,16 +650,7 @@ class FinancialAIEngine:
                         "expenses": account.total_expenses
                     } for account in accounts
                 ],
-                "transactions": [
-                    {
-                        "id": str(transaction.id),
-                        "type": transaction.type,
-                        "amount": transaction.amount,
-                        "category": transaction.category,
-                        "date": transaction.date.isoformat() if transaction.date else None,
-                        "description": transaction.description
-                    } for transaction in transactions
-                ],
+                "transactions": ledger.to_records(),
                 "budgets": [
                     {
                         "id": str(budget.id),
@@ -697,8 +724,10 @@ class FinancialAIEngine:
         query_lower = query.lower()
         context = self._get_conversation_context(user_id)
         
+        route = QUERY_ROUTER.match(query_lower)
+        
         # Check for follow-up queries that reference previous context
-        if self._is_follow_up_query(query_lower, context):
+        if self._is_follow_up_query(query_lower, context, route):
             return self._handle_follow_up_query(query, user_id, context)
         
         # Parse time period and category from query
@@ -706,52 +735,9 @@ class FinancialAIEngine:
         category = self._parse_category_from_query(query)
         amount = self._extract_amount_from_query(query)
         
-        # Determine query type and process accordingly - ORDER MATTERS!
-        # More specific patterns first, then general ones
-        
-        # Income queries (very specific)
-        if any(phrase in query_lower for phrase in ["what's my income", "my income", "income last month", "income this month", "how much do i earn", "my salary"]):
-            return self._handle_income_query(query, user_id)
-        
-        # Balance queries (very specific)
-        elif any(phrase in query_lower for phrase in ["what's my balance", "my balance", "current balance", "account balance", "how much money do i have"]):
-            return self._handle_balance_query(query, user_id)
-        
-        # Spending queries (very specific)
-        elif any(phrase in query_lower for phrase in ["how much did i spend", "my spending", "spending this month", "spending last month", "what did i spend"]):
-            return self._handle_spending_query(query, user_id)
-        
-        # Net worth queries (very specific)
-        elif any(phrase in query_lower for phrase in ["what's my net worth", "my net worth", "total assets", "my worth"]):
-            return self._handle_net_worth_query(query, user_id)
-        
-        # Savings queries (very specific)
-        elif any(phrase in query_lower for phrase in ["how much can i save", "my savings", "saving this month", "savings potential"]):
-            return self._handle_savings_query(query, user_id)
-        
-        # Investment queries (very specific)
-        elif any(phrase in query_lower for phrase in ["my investments", "investment portfolio", "should i invest", "invest more"]):
-            return self._handle_investment_query(query, user_id)
-        
-        # Budget queries (very specific)
-        elif any(phrase in query_lower for phrase in ["my budget", "budget status", "how are my budgets"]):
-            return self._handle_budget_query(query, user_id)
-        
-        # Affordability queries (specific patterns)
-        elif any(phrase in query_lower for phrase in ["can i afford", "afford a vacation", "afford to buy", "afford to take"]):
-            return self._handle_affordability_query(query, user_id)
-        
-        # Expense analysis queries (specific patterns)
-        elif any(phrase in query_lower for phrase in ["why did my expenses increase", "expenses increased", "expense analysis"]):
-            return self._handle_expense_analysis_query(query, user_id)
-        
-        # Debt repayment queries (specific patterns)
-        elif any(phrase in query_lower for phrase in ["repay my loan", "pay off debt", "debt repayment", "best option for repaying"]):
-            return self._handle_debt_repayment_query(query, user_id)
-        
-        # General queries (fallback) - handle both financial and general conversation
-        else:
-            return self._handle_general_query(query, user_id)
+        # Dispatch on the highest-priority intent (QUERY_INTENTS order); general queries are the fallback
+        handler = self.INTENT_HANDLERS.get(route.intent, "_handle_general_query")
+        return getattr(self, handler)(query, user_id)
     
     def _handle_affordability_query(self, query: str, user_id: str) -> Dict[str, Any]:
         """Handle affordability questions like 'Can I afford to take a vacation next month?'"""
@@ -0,0 +1,182 @@
+"""
+Asynchronous forecast jobs
+Heavy forecasts run on a bounded local worker pool; clients submit, then poll (or long-poll) by job id
+"""
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from bson import ObjectId
+from django.conf import settings
+from mongoengine.errors import NotUniqueError
+
+from .data_cache import user_key
+from .models import ForecastJob
+
+WORKERS = getattr(settings, "FORECAST_JOB_WORKERS", 2)
+QUEUE_SIZE = getattr(settings, "FORECAST_JOB_QUEUE_SIZE", 16)
+MAX_WAIT_SECONDS = getattr(settings, "FORECAST_JOB_MAX_WAIT_SECONDS", 30)
+STALE_SECONDS = getattr(settings, "FORECAST_JOB_STALE_SECONDS", 15 * 60)
+
+
+class JobQueueFull(Exception):
+    """Every worker is busy and the pending queue is at capacity"""
+
+
+_executor = None
+_slots = threading.BoundedSemaphore(WORKERS + QUEUE_SIZE)  # running + queued
+_lock = threading.Lock()
+_finished = {}   # job id -> threading.Event, set when the job leaves the pool
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="forecast-job")
+        return _executor
+
+
+def dedup_key(user_id, params: Dict) -> str:
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{user_key(user_id)}:{digest}"
+
+
+# -------------------------
+# Submit / run
+# -------------------------
+def _active_job(key: str) -> Optional[ForecastJob]:
+    """Queued or running job for this key in any worker process (jobs past STALE_SECONDS don't count)"""
+    return ForecastJob.objects(
+        dedup_key=key,
+        status__in=["queued", "running"],
+        created_at__gte=datetime.utcnow() - timedelta(seconds=STALE_SECONDS),
+    ).first()
+
+
+def _expire_stale(key: str) -> None:
+    """Retire an abandoned job (its worker died) so the key can be submitted again"""
+    ForecastJob.objects(
+        dedup_key=key, active=True,
+        created_at__lt=datetime.utcnow() - timedelta(seconds=STALE_SECONDS),
+    ).update(set__active=False, set__status="failed", set__error="Job expired before completing")
+
+
+def submit_forecast_job(user_id, params: Dict) -> Tuple[ForecastJob, bool]:
+    """
+    Queue build_forecast_payload(user_id, **params).
+    returns: (job, created) — an identical in-flight job for the same user (submitted by any
+             worker process) is returned instead of a new one.
+    raises JobQueueFull when the pool is saturated.
+    """
+    key = dedup_key(user_id, params)
+    for attempt in range(2):
+        job = _active_job(key)
+        if job is not None:
+            return job, False
+
+        with _lock:
+            if not _slots.acquire(blocking=False):
+                raise JobQueueFull("Forecast queue is full, please retry shortly")
+            try:
+                # the partial unique index on dedup_key lets only one worker insert an active job
+                job = ForecastJob(user_id=user_key(user_id), dedup_key=key, params=params).save()
+            except NotUniqueError:
+                _slots.release()
+                if attempt == 0:
+                    _expire_stale(key)
+                    continue
+                raise
+            except Exception:
+                _slots.release()
+                raise
+            _finished[str(job.id)] = threading.Event()
+        break
+
+    try:
+        _get_executor().submit(_run_job, job.id, user_id, params)
+    except Exception as e:
+        _release(job.id)
+        ForecastJob.objects(id=job.id).update_one(
+            set__status="failed", set__active=False, set__error=str(e)
+        )
+        raise
+    return job, True
+
+
+def _run_job(job_id, user_id, params: Dict) -> None:
+    from .ml import build_forecast_payload
+
+    try:
+        ForecastJob.objects(id=job_id).update_one(
+            set__status="running", set__started_at=datetime.utcnow()
+        )
+        payload = build_forecast_payload(user_id=user_id, **params)
+        ForecastJob.objects(id=job_id).update_one(
+            set__status="done", set__active=False, set__result=payload, set__finished_at=datetime.utcnow()
+        )
+    except Exception as e:
+        print("❌ Forecast job failed:", str(e))
+        ForecastJob.objects(id=job_id).update_one(
+            set__status="failed", set__active=False, set__error=str(e), set__finished_at=datetime.utcnow()
+        )
+    finally:
+        _release(job_id)
+
+
+def _release(job_id) -> None:
+    with _lock:
+        event = _finished.pop(str(job_id), None)
+    _slots.release()
+    if event is not None:
+        event.set()
+
+
+# -------------------------
+# Poll
+# -------------------------
+def get_job(job_id, wait: float = 0) -> Optional[ForecastJob]:
+    """Current job state; with wait > 0 blocks (up to MAX_WAIT_SECONDS) until it finishes"""
+    try:
+        oid = ObjectId(str(job_id))
+    except Exception:
+        return None
+
+    deadline = time.monotonic() + max(0.0, min(float(wait or 0), MAX_WAIT_SECONDS))
+    event = _finished.get(str(oid))
+    while True:
+        job = ForecastJob.objects(id=oid).first()
+        remaining = deadline - time.monotonic()
+        if job is None or job.status in ("done", "failed") or remaining <= 0:
+            return job
+        if event is not None:
+            # submitted by this process: wake as soon as the worker finishes
+            event.wait(remaining)
+            event = None
+        else:
+            time.sleep(min(0.5, remaining))
+
+
+def job_payload(job: ForecastJob) -> Dict:
+    status = job.status
+    error = job.error
+    if status in ("queued", "running") and job.created_at < datetime.utcnow() - timedelta(seconds=STALE_SECONDS):
+        status, error = "failed", "Job expired before completing"
+
+    data = {
+        "job_id": str(job.id),
+        "status": status,
+        "params": job.params,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if status == "done":
+        data["result"] = job.result
+    if status == "failed":
+        data["error"] = error
+    return data
@@ -0,0 +1,66 @@
+"""
+Process pool for CPU-bound forecast fits
+Long-lived worker processes fit the income and expense models in parallel; when the pool is
+disabled, saturated or broken, callers get None back and fit in-process instead
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+
+WORKERS = getattr(settings, "FORECAST_FIT_WORKERS", 2)
+TIMEOUT_SECONDS = getattr(settings, "FORECAST_FIT_TIMEOUT_SECONDS", 60)
+MAX_PENDING = WORKERS * 2  # running + queued fits before callers fall back in-process
+
+_pool = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def init_worker():
+    """Initializer for spawned worker processes (also used by ml_batch's pool)"""
+    # spawned workers start clean: load settings (and the MongoDB connection) before any task runs
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "item_service.settings")
+    import django
+    django.setup()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=WORKERS,
+            # spawn, not fork: forked children would share the parent's MongoDB sockets
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        )
+    return _pool
+
+
+def _release(_future=None) -> None:
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+def submit_fit(fn, *args, **kwargs) -> Optional[Future]:
+    """Queue fn(*args) on the pool; None when the pool is disabled or saturated"""
+    global _pending, _pool
+    with _lock:
+        if WORKERS <= 0 or _pending >= MAX_PENDING:
+            return None
+        _pending += 1
+        try:
+            future = _get_pool().submit(fn, *args, **kwargs)
+        except Exception as e:
+            # BrokenProcessPool etc. — drop the pool so the next request builds a fresh one
+            print("❌ Forecast pool unavailable:", str(e))
+            _pending -= 1
+            _pool = None
+            return None
+    future.add_done_callback(_release)
+    return future
@@ -0,0 +1,148 @@
+"""
+Compiled phrase router
+Many substring-phrase checks folded into one regex, so intent dispatch is a single pass over the query
+"""
+
+import re
+from typing import Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+
+class RouteMatch(NamedTuple):
+    intent: Optional[str]     # highest-priority route with a phrase in the text (None = no route)
+    flags: FrozenSet[str]     # flag groups with at least one phrase in the text
+
+
+def _alternation(phrases: Iterable[str]) -> str:
+    """
+    Regex matching any of `phrases`, factored into a prefix trie ("my (?:income|salary)"),
+    so the engine rejects a position after one character instead of trying every phrase.
+    """
+    trie = {}
+    for phrase in set(phrases):
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # end of phrase
+
+    def build(node) -> str:
+        ends = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # a phrase ending here still wins over nothing; longer continuations are tried first
+        return f"(?:{body})?" if ends else body
+
+    return build(trie)
+
+
+class PhraseRouter:
+    """
+    Equivalent to `any(phrase in text for phrase in phrases)` per group, evaluated at once.
+
+    routes: [(intent, phrases)] in priority order; match() returns the first intent whose
+            phrases occur anywhere in the text, like an if/elif chain of any() checks.
+    flags:  {name: phrases}; match() reports every flag with at least one occurrence.
+
+    Every group is a lookahead tried at each position, so overlapping occurrences are all
+    seen. Route alternatives are ordered by priority, so at any position the best route
+    starting there wins. The best route over all positions is then the best route overall.
+    """
+
+    def __init__(self, routes: Sequence[Tuple[str, Iterable[str]]],
+                 flags: Optional[Mapping[str, Iterable[str]]] = None):
+        self.intents: List[str] = []
+        self.flag_names: List[str] = []
+        parts = []
+        for name, phrases in (flags or {}).items():
+            self.flag_names.append(name)
+            parts.append(f"(?=(?P<f{len(self.flag_names) - 1}>{_alternation(phrases)}))?")
+
+        route_parts = []
+        for intent, phrases in routes:
+            self.intents.append(intent)
+            route_parts.append(f"(?P<r{len(self.intents) - 1}>{_alternation(phrases)})")
+        if route_parts:
+            parts.append(f"(?=(?:{'|'.join(route_parts)}))?")
+
+        # only positions where some phrase starts produce a match (checked in C), so the
+        # Python-side loop below runs once per hit rather than once per character
+        every_phrase = [p for _, phrases in routes for p in phrases]
+        every_phrase += [p for phrases in (flags or {}).values() for p in phrases]
+        prefix = f"(?=(?:{_alternation(every_phrase)}))"
+        self.pattern = re.compile(prefix + "".join(parts))
+
+    def match(self, text: str) -> RouteMatch:
+        best = len(self.intents)
+        flags = set()
+        n_flags = len(self.flag_names)
+        for groups in self.pattern.findall(text):
+            if not isinstance(groups, tuple):
+                groups = (groups,)
+            for i, value in enumerate(groups):
+                if not value:
+                    continue
+                if i < n_flags:
+                    flags.add(self.flag_names[i])
+                elif i - n_flags < best:
+                    best = i - n_flags
+        return RouteMatch(self.intents[best] if best < len(self.intents) else None, frozenset(flags))
+
+
+_CAPTURE = re.compile(r"(?<!\\)\((?!\?)")
+
+
+class PatternRouter:
+    """
+    Several prioritised regex tables evaluated in one scan of the text.
+
+    tables: {name: [(label, [regex, ...]), ...]}. Per table, the first pattern (in order) found
+            anywhere in the text wins, like a loop of re.search() calls that stops at a hit.
+    match() -> {name: (label, entity)}, where entity is the winning pattern's first capture
+            group at its leftmost hit (None without one), or (None, None) when nothing matched.
+
+    Same construction as PhraseRouter: one optional lookahead per table at every position,
+    alternatives in priority order. A trailing conditional rejects positions where nothing
+    matched, so only hits reach Python.
+    """
+
+    def __init__(self, tables: Mapping[str, Sequence[Tuple[str, Sequence[str]]]]):
+        self.tables = list(tables)
+        self._patterns: List[Tuple[int, int, str]] = []  # pattern k -> (table, label index, label)
+        parts = []
+        for t, routes in enumerate(tables.values()):
+            alternatives = []
+            for l, (label, patterns) in enumerate(routes):
+                for pattern in patterns:
+                    k = len(self._patterns)
+                    self._patterns.append((t, l, label))
+                    # the pattern's own capture group (if any) becomes the entity group e<k>
+                    body = _CAPTURE.sub(f"(?P<e{k}>", pattern, count=1)
+                    alternatives.append(f"(?P<p{k}>{body})")
+            parts.append(f"(?=(?:{'|'.join(alternatives)}))?")
+
+        require_hit = "(?!)"
+        for k in reversed(range(len(self._patterns))):
+            require_hit = f"(?(p{k})|{require_hit})"
+        self.pattern = re.compile("".join(parts) + require_hit)
+        index = self.pattern.groupindex
+        # (pattern group, entity group or None, table, priority, label) with 0-based group slots
+        self._slots = [
+            (index[f"p{k}"] - 1, index[f"e{k}"] - 1 if f"e{k}" in index else None, t, k, label)
+            for k, (t, _, label) in enumerate(self._patterns)
+        ]
+
+    def match(self, text: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        best = [None] * len(self.tables)  # table -> (pattern priority, label, entity)
+        for m in self.pattern.finditer(text):
+            groups = m.groups()
+            for p, e, t, k, label in self._slots:
+                if groups[p] is None:
+                    continue
+                # strictly better only, so a pattern keeps its leftmost hit like re.search()
+                if best[t] is None or k < best[t][0]:
+                    best[t] = (k, label, groups[e] if e is not None else None)
+        return {
+            name: (hit[1], hit[2]) if hit else (None, None)
+            for name, hit in zip(self.tables, best)
+        }
@@ -0,0 +1,179 @@
+"""
+Columnar per-user ledger
+Loads a user's transactions once (as_pymongo + projection) into NumPy columns shared by every analytics consumer
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .aggregations import _user_oid
+from .models import Transaction
+
+TYPES = ("income", "expense")
+TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+OTHER_TYPE = len(TYPES)
+
+_FIELDS = ("id", "date", "amount", "type", "category", "account_id")
+
+
+class Ledger:
+    """
+    One user's transactions sorted by date, as parallel arrays:
+      ts            datetime64[us] timestamp
+      day           int32 days since 1970-01-01
+      amount        float64
+      type_code     int8   (TYPE_CODES, OTHER_TYPE for anything else)
+      category_code int32  index into .categories
+      account_code  int32  index into .accounts (ObjectIds)
+    ids / descriptions are plain lists kept only for consumers that need per-row output.
+    """
+
+    def __init__(self, ids, ts, amount, type_code, category_code, account_code,
+                 categories, accounts, descriptions=None):
+        self.ids = ids
+        self.ts = ts
+        self.day = ts.astype("datetime64[D]").astype(np.int32)
+        self.amount = amount
+        self.type_code = type_code
+        self.category_code = category_code
+        self.account_code = account_code
+        self.categories = categories
+        self.accounts = accounts
+        self.descriptions = descriptions
+        self._frame = None
+
+    @classmethod
+    def empty(cls) -> "Ledger":
+        return cls(
+            [], np.array([], dtype="datetime64[us]"), np.array([], dtype=np.float64),
+            np.array([], dtype=np.int8), np.array([], dtype=np.int32), np.array([], dtype=np.int32),
+            [], [], [],
+        )
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    # -------------------------
+    # Selection
+    # -------------------------
+    def select(self, kind: Optional[str] = None, since: Optional[datetime] = None,
+               account_ids: Optional[Iterable] = None) -> np.ndarray:
+        """Boolean row mask; kind is 'income'/'expense' or None for all rows"""
+        mask = np.ones(len(self), dtype=bool)
+        if kind is not None:
+            mask &= self.type_code == TYPE_CODES.get(kind, OTHER_TYPE)
+        if since is not None:
+            mask &= self.ts >= np.datetime64(since, "us")
+        if account_ids is not None:
+            wanted = {str(a) for a in account_ids}
+            codes = [i for i, acc in enumerate(self.accounts) if str(acc) in wanted]
+            mask &= np.isin(self.account_code, codes)
+        return mask
+
+    def total(self, kind: Optional[str] = None, since: Optional[datetime] = None) -> float:
+        return float(self.amount[self.select(kind, since)].sum())
+
+    def monthly_totals(self, kind: Optional[str] = None, since: Optional[datetime] = None,
+                       account_ids: Optional[Iterable] = None) -> Dict[str, float]:
+        """{'YYYY-MM': total} for months that have at least one matching row"""
+        mask = self.select(kind, since, account_ids)
+        months = self.ts[mask].astype("datetime64[M]")
+        if not len(months):
+            return {}
+        keys, inverse = np.unique(months, return_inverse=True)
+        sums = np.bincount(inverse, weights=self.amount[mask])
+        return dict(zip(np.datetime_as_string(keys, unit="M").tolist(), sums.tolist()))
+
+    def daily_totals(self, kind: Optional[str] = None):
+        """(epoch days, totals) for days that have at least one matching row, ascending"""
+        mask = self.select(kind)
+        days, inverse = np.unique(self.day[mask], return_inverse=True)
+        return days, np.bincount(inverse, weights=self.amount[mask], minlength=len(days))
+
+    # -------------------------
+    # Views for existing consumers
+    # -------------------------
+    def daily_series(self, kind: Optional[str] = None):
+        """pd.Series of daily sums indexed by date (gaps not filled)"""
+        import pandas as pd
+        days, sums = self.daily_totals(kind)
+        index = pd.DatetimeIndex(days.astype("datetime64[D]").astype("datetime64[ns]"))
+        return pd.Series(sums, index=index, dtype=float)
+
+    def to_frame(self):
+        """DataFrame with date/amount/type/category(/description) columns; built once per ledger"""
+        if self._frame is None:
+            import pandas as pd
+            types = np.array(TYPES + ("other",), dtype=object)
+            columns = {
+                "date": self.ts.astype("datetime64[ns]"),
+                "amount": self.amount,
+                "type": types[self.type_code],
+                "category": np.array(self.categories, dtype=object)[self.category_code]
+                if self.categories else np.array([], dtype=object),
+            }
+            if self.descriptions is not None:
+                columns["description"] = [d or "" for d in self.descriptions]
+            self._frame = pd.DataFrame(columns)
+        return self._frame
+
+    def to_records(self) -> List[Dict]:
+        """Row dicts in the shape the AI engines already consume"""
+        types = TYPES + ("other",)
+        dates = self.ts.astype(datetime)
+        return [
+            {
+                "id": str(self.ids[i]),
+                "type": types[self.type_code[i]],
+                "amount": float(self.amount[i]),
+                "category": self.categories[self.category_code[i]],
+                "date": dates[i].isoformat(),
+                "description": self.descriptions[i] if self.descriptions is not None else None,
+            }
+            for i in range(len(self))
+        ]
+
+
+def load_ledger(user_id, since: Optional[datetime] = None, include_descriptions: bool = False) -> Ledger:
+    """One projected as_pymongo() query -> Ledger (rows without a date are skipped)"""
+    fields = _FIELDS + ("description",) if include_descriptions else _FIELDS
+    qs = Transaction.objects(user_id=_user_oid(user_id))
+    if since is not None:
+        qs = qs.filter(date__gte=since)
+    rows = qs.only(*fields).order_by("date").as_pymongo()
+
+    ids, dates, amounts, type_codes, category_codes, account_codes = [], [], [], [], [], []
+    descriptions = [] if include_descriptions else None
+    categories, accounts = {}, {}
+    for row in rows:
+        date = row.get("date")
+        if date is None:
+            continue
+        ids.append(row["_id"])
+        dates.append(date)
+        amounts.append(float(row.get("amount") or 0.0))
+        type_codes.append(TYPE_CODES.get(row.get("type"), OTHER_TYPE))
+        category_codes.append(categories.setdefault(row.get("category") or "other", len(categories)))
+        account = row.get("account_id")
+        account_codes.append(accounts.setdefault(getattr(account, "id", account), len(accounts)))
+        if descriptions is not None:
+            descriptions.append(row.get("description"))
+
+    if not ids:
+        ledger = Ledger.empty()
+        ledger.descriptions = descriptions
+        return ledger
+
+    return Ledger(
+        ids,
+        np.array(dates, dtype="datetime64[us]"),
+        np.array(amounts, dtype=np.float64),
+        np.array(type_codes, dtype=np.int8),
+        np.array(category_codes, dtype=np.int32),
+        np.array(account_codes, dtype=np.int32),
+        list(categories),
+        list(accounts),
+        descriptions,
+    )
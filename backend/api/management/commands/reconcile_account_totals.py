@@ -0,0 +1,53 @@
+"""
+Recompute account totals from the transaction ledger and report drift
+
+    python manage.py reconcile_account_totals [--user <id>] [--account <id>] [--dry-run] [--budgets]
+"""
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Account, Budget
+from api.serializers import reconcile_account_totals, recompute_budgets_for_user
+
+
+class Command(BaseCommand):
+    help = "Recompute Account.total_income/total_expenses/total_balance/savings_rate and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only reconcile accounts of this user id")
+        parser.add_argument("--account", action="append", default=[], help="Account id (repeatable)")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without fixing it")
+        parser.add_argument("--tolerance", type=float, default=0.01, help="Ignore drift below this amount")
+        parser.add_argument("--budgets", action="store_true",
+                            help="Also rebuild budget spend for --user (or every user with budgets)")
+
+    def handle(self, *args, **options):
+        try:
+            account_ids = [ObjectId(a) for a in options["account"]] or None
+            if options["user"]:
+                user_accounts = Account.objects(user_id=ObjectId(options["user"])).scalar("id")
+                account_ids = (account_ids or []) + list(user_accounts)
+        except Exception as e:
+            raise CommandError(f"Invalid id: {e}")
+
+        drifted = reconcile_account_totals(
+            account_ids=account_ids,
+            fix=not options["dry_run"],
+            tolerance=options["tolerance"],
+        )
+
+        for row in drifted:
+            parts = ", ".join(f"{k}={v:+.2f}" for k, v in row["drift"].items())
+            self.stdout.write(f"{row['account_id']}: {parts}")
+
+        verb = "found" if options["dry_run"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"{len(drifted)} drifted account(s) {verb}"))
+
+        if options["budgets"] and not options["dry_run"]:
+            if options["user"]:
+                user_ids = [options["user"]]
+            else:
+                user_ids = Budget._get_collection().distinct("user_id")
+            total = sum(recompute_budgets_for_user(uid) for uid in user_ids)
+            self.stdout.write(self.style.SUCCESS(f"{total} budget(s) recomputed for {len(user_ids)} user(s)"))
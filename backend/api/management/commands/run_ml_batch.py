@@ -0,0 +1,67 @@
+"""
+Run the per-user ML jobs for every user, sharded across worker processes
+
+    python manage.py run_ml_batch [--jobs expense,anomalies,recurring,goals,salary] [--shards 64]
+                                  [--workers 4] [--run-id nightly-2024-01-31] [--restart] [--user <id>]
+"""
+
+import os
+from datetime import datetime
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ml_batch import JOBS, reset_run, run_batch
+
+
+class Command(BaseCommand):
+    help = "Precompute ML predictions/anomalies/patterns for all users; re-running a run id resumes it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", default=",".join(JOBS),
+                            help=f"Comma-separated subset of: {', '.join(JOBS)}")
+        parser.add_argument("--shards", type=int, default=64, help="Number of user shards")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                            help="Worker processes (0 = run in this process)")
+        parser.add_argument("--run-id", help="Checkpoint key (default: nightly-<today>)")
+        parser.add_argument("--restart", action="store_true", help="Discard the run's checkpoints first")
+        parser.add_argument("--user", action="append", default=[], help="Only this user id (repeatable)")
+
+    def handle(self, *args, **options):
+        jobs = [j.strip() for j in options["jobs"].split(",") if j.strip()]
+        unknown = [j for j in jobs if j not in JOBS]
+        if unknown or not jobs:
+            raise CommandError(f"Unknown job(s): {', '.join(unknown) or '(none given)'}")
+        if options["shards"] < 1:
+            raise CommandError("--shards must be at least 1")
+        try:
+            user_ids = [ObjectId(u) for u in options["user"]] or None
+        except Exception as e:
+            raise CommandError(f"Invalid id: {e}")
+
+        run_id = options["run_id"] or f"nightly-{datetime.utcnow():%Y-%m-%d}"
+        if options["restart"]:
+            reset_run(run_id)
+
+        try:
+            report = run_batch(
+                run_id, jobs,
+                shards=options["shards"],
+                workers=options["workers"],
+                user_ids=user_ids,
+                log=self.stdout.write,
+            )
+        except ValueError as e:  # resuming under a different partition
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'job':<10} {'count':>7} {'errors':>7} {'per sec':>8} "
+                          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, s in report["jobs"].items():
+            self.stdout.write(f"{name:<10} {s['count']:>7} {s['errors']:>7} {s['per_second']:>8.1f} "
+                              f"{s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f}")
+
+        wall = report["wall_seconds"]
+        self.stdout.write(f"{report['users']} user(s) checkpointed for {run_id}; this attempt took {wall:.1f}s")
+        if report["failed_shards"]:
+            raise CommandError(f"Shard(s) failed: {report['failed_shards']} — re-run with --run-id {run_id} to resume")
+        self.stdout.write(self.style.SUCCESS(f"✅ {run_id} complete"))
@@ -0,0 +1,29 @@
+"""
+Serve forecasts and ML suggestions to the web workers over a Unix socket
+
+    python manage.py run_model_server [--socket /run/finance/model.sock] [--threads 4]
+
+Point the web workers at it with MODEL_SERVER_SOCKET=<same path>.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import model_server
+
+
+class Command(BaseCommand):
+    help = "Run the long-lived model server that owns the ML stack and its caches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", default=model_server.SOCKET_PATH,
+                            help="Unix socket path (default: MODEL_SERVER_SOCKET)")
+        parser.add_argument("--threads", type=int, default=model_server.THREADS,
+                            help="Requests computed concurrently")
+
+    def handle(self, *args, **options):
+        if not options["socket"]:
+            raise CommandError("No socket path: pass --socket or set MODEL_SERVER_SOCKET")
+        try:
+            model_server.serve(options["socket"], options["threads"], log=self.stdout.write)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS("Model server stopped"))
@@ -0,0 +1,141 @@
+"""
+Lazy facade over the ML stack
+Views import ML entry points from here; numpy/pandas/sklearn/statsmodels load on the first ML call or via warm_up().
+Forecasts and suggestions go to the model server (model_server.py) when one is configured.
+"""
+
+import importlib
+import threading
+import time
+from typing import Dict, List
+
+from . import model_server
+from .data_cache import get_data_version
+
+# Modules imported by warm_up(), cheapest first. Optional ones may be missing from the install.
+WARM_UP_MODULES = (
+    "numpy",
+    "pandas",
+    "api.ledger",
+    "api.ml_utils",
+    "api.ml_suggestions_engine",
+    "sklearn.ensemble",
+    "statsmodels.tsa.holtwinters",
+    "statsmodels.tsa.statespace.sarimax",
+    "statsmodels.tsa.arima.model",
+)
+OPTIONAL_MODULES = {"statsmodels.tsa.holtwinters", "statsmodels.tsa.statespace.sarimax",
+                    "statsmodels.tsa.arima.model"}
+
+_engine = None
+_lock = threading.Lock()
+
+
+def _ml_utils():
+    return importlib.import_module(".ml_utils", __package__)
+
+
+def _ledger():
+    return importlib.import_module(".ledger", __package__)
+
+
+# -------------------------
+# ml_utils entry points
+# -------------------------
+def predict_next_month_expense(*args, **kwargs):
+    return _ml_utils().predict_next_month_expense(*args, **kwargs)
+
+
+def detect_spending_anomalies(*args, **kwargs):
+    return _ml_utils().detect_spending_anomalies(*args, **kwargs)
+
+
+def find_recurring_patterns(*args, **kwargs):
+    return _ml_utils().find_recurring_patterns(*args, **kwargs)
+
+
+def predict_goal_completion(*args, **kwargs):
+    return _ml_utils().predict_goal_completion(*args, **kwargs)
+
+
+def ml_predict_debt_payoff(*args, **kwargs):
+    return _ml_utils().ml_predict_debt_payoff(*args, **kwargs)
+
+
+def build_forecast_payload(user_id, **kwargs):
+    """raises model_server.ModelServerTimeout when the model server is too slow to answer"""
+    if model_server.enabled() and kwargs.get("ledger") is None:
+        try:
+            return model_server.call("forecast", user_id=str(user_id), **kwargs)
+        except model_server.ModelServerUnavailable as e:
+            print("❌ Model server forecast failed, computing in-process:", str(e))
+    return _ml_utils().build_forecast_payload(user_id=user_id, **kwargs)
+
+
+def generate_ml_suggestions(user_id: str, permissions: Dict[str, bool]) -> List[Dict]:
+    """
+    ML suggestions from the data the user's permissions expose ([] when none)
+    raises model_server.ModelServerTimeout when the model server is too slow to answer
+    """
+    if model_server.enabled():
+        try:
+            return model_server.call("suggestions", user_id=str(user_id), permissions=permissions)
+        except model_server.ModelServerUnavailable as e:
+            print("❌ Model server suggestions failed, computing in-process:", str(e))
+    module = importlib.import_module(".ml_suggestions_engine", __package__)
+    # read before loading: a write in between must not get a stale fit cached under its version
+    data_version = get_data_version(user_id)
+    user_data = module.load_user_data(user_id, permissions)
+    if not user_data:
+        return []
+    return suggestions_engine().generate_ml_suggestions(user_id, user_data, data_version)
+
+
+# -------------------------
+# Ledger / suggestions engine
+# -------------------------
+def load_ledger(*args, **kwargs):
+    return _ledger().load_ledger(*args, **kwargs)
+
+
+def empty_ledger():
+    return _ledger().Ledger.empty()
+
+
+def suggestions_engine():
+    """Process-wide MLSuggestionsEngine (it keeps no per-call state, so one instance is shared)"""
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                module = importlib.import_module(".ml_suggestions_engine", __package__)
+                _engine = module.MLSuggestionsEngine()
+    return _engine
+
+
+# -------------------------
+# Warm-up
+# -------------------------
+def warm_up() -> Dict[str, float]:
+    """
+    Import the whole ML stack now; returns {module: seconds} (already-loaded modules cost ~0).
+    Call from a gunicorn post_fork hook, or set ML_WARMUP_ON_START to run it from AppConfig.ready().
+    """
+    timings = {}
+    for name in WARM_UP_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            if name not in OPTIONAL_MODULES:
+                print(f"❌ ML warm-up failed to import {name}:", str(e))
+            continue
+        timings[name] = time.perf_counter() - start
+    suggestions_engine()
+    return timings
+
+
+def warm_up_in_background() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="ml-warm-up", daemon=True)
+    thread.start()
+    return thread
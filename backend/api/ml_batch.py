@@ -0,0 +1,229 @@
+"""
+Sharded batch runner for the per-user ML jobs
+Users are split into stable shards, shards run on a process pool, and every finished shard is checkpointed so a crashed run resumes where it stopped
+"""
+
+import hashlib
+import multiprocessing
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .forecast_pool import init_worker
+from .models import MLBatchShard, User
+
+
+# -------------------------
+# Jobs
+# -------------------------
+def _expense(user_id, ledger):
+    from .ml_utils import predict_next_month_expense
+    return predict_next_month_expense(user_id, ledger=ledger)
+
+
+def _anomalies(user_id, ledger):
+    from .ml_utils import detect_spending_anomalies
+    return detect_spending_anomalies(user_id)
+
+
+def _recurring(user_id, ledger):
+    from .ml_utils import find_recurring_patterns
+    return find_recurring_patterns(user_id)
+
+
+def _goals(user_id, ledger):
+    from .ml_utils import predict_goal_completion
+    return predict_goal_completion(user_id, ledger=ledger)
+
+
+def _salary(user_id, ledger):
+    from .predict.salary_predictor import predict_salary
+    return predict_salary(user_id, ledger=ledger)
+
+
+JOBS = {
+    "expense": _expense,
+    "anomalies": _anomalies,
+    "recurring": _recurring,
+    "goals": _goals,
+    "salary": _salary,
+}
+LEDGER_JOBS = {"expense", "goals", "salary"}
+
+
+def shard_of(user_id, shards: int) -> int:
+    """Stable shard for a user id, independent of how many users exist"""
+    return zlib.crc32(str(user_id).encode()) % shards
+
+
+def partition_key(user_ids: Optional[Iterable] = None) -> str:
+    """How users map to shards: the hash scheme plus the user selection (all users or a fixed list)"""
+    if user_ids is None:
+        return "crc32:all"
+    digest = hashlib.sha1(",".join(sorted(str(u) for u in user_ids)).encode()).hexdigest()
+    return f"crc32:{digest[:16]}"
+
+
+def plan_shards(user_ids: Iterable, shards: int) -> Dict[int, List[str]]:
+    plan = defaultdict(list)
+    for uid in user_ids:
+        plan[shard_of(uid, shards)].append(str(uid))
+    return dict(plan)
+
+
+# -------------------------
+# Worker side
+# -------------------------
+def run_shard(run_id: str, shard: int, user_ids: List[str], jobs: List[str],
+              shards: int = None, partition: str = None) -> Dict:
+    """Run `jobs` for every user of one shard and checkpoint the shard's stats"""
+    from .ledger import load_ledger
+
+    started = time.perf_counter()
+    latencies = {name: [] for name in jobs}
+    errors = {name: 0 for name in jobs}
+    if LEDGER_JOBS.intersection(jobs):
+        latencies["ledger"], errors["ledger"] = [], 0
+
+    for uid in user_ids:
+        ledger = None
+        if "ledger" in latencies:
+            t0 = time.perf_counter()
+            try:
+                ledger = load_ledger(uid)
+            except Exception as e:
+                errors["ledger"] += 1
+                print(f"❌ [{run_id}] shard {shard} ledger {uid}:", str(e))
+            latencies["ledger"].append(time.perf_counter() - t0)
+
+        for name in jobs:
+            t0 = time.perf_counter()
+            try:
+                JOBS[name](uid, ledger)
+            except Exception as e:
+                errors[name] += 1
+                print(f"❌ [{run_id}] shard {shard} {name} {uid}:", str(e))
+            latencies[name].append(time.perf_counter() - t0)
+
+    MLBatchShard.objects(run_id=run_id, shard=shard).update_one(
+        set__shards=shards,
+        set__partition=partition,
+        set__jobs=jobs,
+        set__users=len(user_ids),
+        set__latencies=latencies,
+        set__errors=errors,
+        set__wall_seconds=time.perf_counter() - started,
+        set__finished_at=datetime.utcnow(),
+        upsert=True,
+    )
+    return {"shard": shard, "users": len(user_ids)}
+
+
+# -------------------------
+# Coordinator side
+# -------------------------
+def completed_shards(run_id: str, shards: int = None, partition: str = None) -> set:
+    """
+    Shards already checkpointed for run_id.
+    raises ValueError when they were checkpointed under another shard count or partition:
+    the shard numbers would then cover different users and resuming would skip some silently.
+    """
+    done = set()
+    for shard, run_shards, run_partition in MLBatchShard.objects(run_id=run_id).scalar(
+        "shard", "shards", "partition"
+    ):
+        if shards is not None and (run_shards, run_partition) != (shards, partition):
+            raise ValueError(
+                f"{run_id} was checkpointed with {run_shards} shard(s) over {run_partition}, "
+                f"not {shards} over {partition}; resume with the same --shards/--user or use --restart"
+            )
+        done.add(shard)
+    return done
+
+
+def reset_run(run_id: str) -> None:
+    MLBatchShard.objects(run_id=run_id).delete()
+
+
+def run_batch(run_id: str, jobs: List[str], shards: int, workers: int,
+              user_ids: Optional[List[str]] = None, log=print) -> Dict:
+    """
+    Run every pending shard of `run_id` (shards checkpointed by an earlier attempt are skipped).
+    workers <= 0 runs the shards in this process.
+    raises ValueError when resuming with a different shard count or user selection.
+    """
+    partition = partition_key(user_ids)
+    done = completed_shards(run_id, shards, partition)
+    if user_ids is None:
+        user_ids = User.objects.scalar("id")
+    plan = plan_shards(user_ids, shards)
+    pending = sorted(s for s in plan if s not in done)
+    log(f"🔍 {run_id}: {len(plan)} shard(s) with users, {len(plan) - len(pending)} already done, "
+        f"{len(pending)} to run")
+
+    started = time.perf_counter()
+    failed = []
+    if workers <= 0:
+        for shard in pending:
+            try:
+                result = run_shard(run_id, shard, plan[shard], jobs, shards, partition)
+                log(f"✅ shard {shard}: {result['users']} user(s)")
+            except Exception as e:
+                failed.append(shard)
+                print(f"❌ shard {shard} failed:", str(e))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            # spawn, not fork: forked children would share the parent's MongoDB sockets
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        ) as pool:
+            futures = {
+                pool.submit(run_shard, run_id, shard, plan[shard], jobs, shards, partition): shard
+                for shard in pending
+            }
+            for future in as_completed(futures):
+                shard = futures[future]
+                try:
+                    result = future.result()
+                    log(f"✅ shard {shard}: {result['users']} user(s)")
+                except Exception as e:
+                    failed.append(shard)
+                    print(f"❌ shard {shard} failed:", str(e))
+
+    report = summarize(run_id)
+    report["wall_seconds"] = time.perf_counter() - started
+    report["failed_shards"] = sorted(failed)
+    return report
+
+
+def summarize(run_id: str) -> Dict:
+    """Per-job counts, errors, throughput and p50/p95/p99 latency over every finished shard of the run"""
+    latencies, errors, users = defaultdict(list), defaultdict(int), 0
+    for shard in MLBatchShard.objects(run_id=run_id).only("users", "latencies", "errors"):
+        users += shard.users or 0
+        for name, values in (shard.latencies or {}).items():
+            latencies[name].extend(values)
+        for name, count in (shard.errors or {}).items():
+            errors[name] += count
+
+    jobs = {}
+    for name, values in latencies.items():
+        arr = np.asarray(values, dtype=float)
+        if not len(arr):
+            continue
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        jobs[name] = {
+            "count": int(len(arr)),
+            "errors": int(errors[name]),
+            "per_second": float(len(arr) / arr.sum()) if arr.sum() > 0 else 0.0,
+            "p50_ms": float(p50 * 1000),
+            "p95_ms": float(p95 * 1000),
+            "p99_ms": float(p99 * 1000),
+        }
+    return {"run_id": run_id, "users": users, "jobs": jobs}
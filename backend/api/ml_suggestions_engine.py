@@ -13,26 +13,110 @@ from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import LabelEncoder
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Optional
+import pickle
 import warnings
+from django.conf import settings
+from .data_cache import BoundedLRUCache, user_key
+from .ledger import Ledger, load_ledger
+from .models import Budget, Debt, Portfolio
 warnings.filterwarnings('ignore')
 
+# (user_id, model name) -> (data_version, fitted estimators); shared by every engine instance in the process
+_fitted_cache = BoundedLRUCache(
+    max_entries=getattr(settings, 'ML_SUGGESTIONS_CACHE_MAX_ENTRIES', 1024),
+    max_bytes=getattr(settings, 'ML_SUGGESTIONS_CACHE_MAX_BYTES', 128 * 1024 * 1024),
+)
+
+
+def _fitted(user_id: str, name: str, data_version: Optional[int], fit):
+    """
+    Fitted estimators for (user, name) at data_version, training via fit() only on a miss.
+    data_version None disables caching (ad-hoc data that isn't tied to a stored version).
+    """
+    if data_version is None:
+        return fit()
+    key = (user_key(user_id), name)
+    cached = _fitted_cache.get(key)
+    if cached is not None and cached[0] == data_version:
+        return cached[1]
+    fitted = fit()
+    # estimators hold their arrays outside __dict__ sizes, so measure the pickled form
+    _fitted_cache.set(key, (data_version, fitted), size=len(pickle.dumps(fitted, pickle.HIGHEST_PROTOCOL)))
+    return fitted
+
+
+def load_user_data(user_id: str, permissions: Dict[str, bool]) -> Dict[str, Any]:
+    """Get user data for ML analysis (only the parts the user's permissions allow)"""
+    user_data = {}
+
+    try:
+        # Get transactions if permission granted
+        if permissions.get('transactions', False):
+            user_data['transactions'] = load_ledger(user_id, include_descriptions=True)
+
+        # Get debts if permission granted
+        if permissions.get('debts', False):
+            debts = Debt.objects(user_id=user_id)
+            user_data['debts'] = [
+                {
+                    'name': d.name,
+                    'remaining_amount': float(d.remaining_amount),
+                    'interest_rate': float(d.interest_rate),
+                    'minimum_payment': float(d.minimum_payment),
+                    'type': d.type
+                }
+                for d in debts
+            ]
+
+        # Get investments if permission granted
+        if permissions.get('investments', False):
+            investments = Portfolio.objects(user_id=user_id)
+            user_data['investments'] = [
+                {
+                    'name': inv.name or 'Unknown',
+                    'totalValue': float(inv.totalValue) if hasattr(inv, 'totalValue') else 0,
+                    'gainLoss': float(inv.gainLoss) if hasattr(inv, 'gainLoss') else 0,
+                    'gainLossPercent': float(inv.gainLossPercent) if hasattr(inv, 'gainLossPercent') else 0
+                }
+                for inv in investments
+            ]
+
+        # Get budgets if permission granted
+        if permissions.get('budgets', False):
+            budgets = Budget.objects(user_id=user_id)
+            user_data['budgets'] = [
+                {
+                    'name': b.name,
+                    'limit': float(b.limit),
+                    'spent': float(b.spent),
+                    'remaining': float(b.remaining)
+                }
+                for b in budgets
+            ]
+
+    except Exception as e:
+        print(f"Error getting user data for ML: {str(e)}")
+
+    return user_data
+
+
 class MLSuggestionsEngine:
-    def __init__(self):
-        self.scaler = StandardScaler()
-        self.label_encoders = {}
-        self.models = {}
-        self.user_patterns = {}
-        
-    def _prepare_transaction_data(self, transactions: List[Dict]) -> pd.DataFrame:
-        """Prepare transaction data for ML analysis"""
-        if not transactions:
+    # Stateless between calls: scalers, encoders and estimators are created per call
+    # (or reused read-only from _fitted_cache), so one engine is safe to share across threads
+
+    def _prepare_transaction_data(self, transactions) -> pd.DataFrame:
+        """Prepare transaction data (a Ledger or list of dicts) for ML analysis"""
+        if not len(transactions):
             return pd.DataFrame()
             
-        df = pd.DataFrame(transactions)
-        
-        # Convert date to datetime
-        df['date'] = pd.to_datetime(df['date'])
+        if isinstance(transactions, Ledger):
+            # Columns are already typed; copy so feature columns don't leak into the shared frame
+            df = transactions.to_frame().copy()
+        else:
+            df = pd.DataFrame(transactions)
+            # Convert date to datetime
+            df['date'] = pd.to_datetime(df['date'])
         
         # Extract time features
         df['day_of_week'] = df['date'].dt.dayofweek
@@ -45,13 +129,12 @@ class MLSuggestionsEngine:
         categorical_cols = ['category', 'type', 'description']
         for col in categorical_cols:
             if col in df.columns:
-                if col not in self.label_encoders:
-                    self.label_encoders[col] = LabelEncoder()
-                df[f'{col}_encoded'] = self.label_encoders[col].fit_transform(df[col].astype(str))
+                df[f'{col}_encoded'] = LabelEncoder().fit_transform(df[col].astype(str))
         
         return df
     
-    def _detect_spending_anomalies(self, transactions: List[Dict], user_id: str) -> List[Dict]:
+    def _detect_spending_anomalies(self, transactions: List[Dict], user_id: str,
+                                   data_version: Optional[int] = None) -> List[Dict]:
         """Detect unusual spending patterns using Isolation Forest"""
         suggestions = []
         
@@ -69,12 +152,15 @@ class MLSuggestionsEngine:
             features = ['amount', 'day_of_week', 'day_of_month', 'month']
             feature_data = expense_df[features].fillna(0)
             
-            # Scale features
-            scaled_features = self.scaler.fit_transform(feature_data)
-            
-            # Apply Isolation Forest
-            iso_forest = IsolationForest(contamination=0.1, random_state=42)
-            anomaly_labels = iso_forest.fit_predict(scaled_features)
+            # Scale features and fit Isolation Forest (once per data version)
+            def fit():
+                scaler = StandardScaler().fit(feature_data)
+                iso_forest = IsolationForest(contamination=0.1, random_state=42)
+                iso_forest.fit(scaler.transform(feature_data))
+                return scaler, iso_forest
+
+            scaler, iso_forest = _fitted(user_id, 'anomalies', data_version, fit)
+            anomaly_labels = iso_forest.predict(scaler.transform(feature_data))
             
             # Get anomalous transactions
             anomalous_indices = np.where(anomaly_labels == -1)[0]
@@ -105,7 +191,8 @@ class MLSuggestionsEngine:
         
         return suggestions
     
-    def _predict_future_savings(self, transactions: List[Dict], user_id: str) -> List[Dict]:
+    def _predict_future_savings(self, transactions: List[Dict], user_id: str,
+                                data_version: Optional[int] = None) -> List[Dict]:
         """Predict future savings using time series analysis"""
         suggestions = []
         
@@ -130,9 +217,8 @@ class MLSuggestionsEngine:
             X = monthly_data[['month_num']].values
             y = monthly_data['amount'].values
             
-            # Train linear regression model
-            model = LinearRegression()
-            model.fit(X, y)
+            # Train linear regression model (once per data version)
+            model = _fitted(user_id, 'savings', data_version, lambda: LinearRegression().fit(X, y))
             
             # Predict next 3 months
             future_months = np.array([[len(monthly_data)], [len(monthly_data) + 1], [len(monthly_data) + 2]])
@@ -171,7 +257,8 @@ class MLSuggestionsEngine:
         
         return suggestions
     
-    def _analyze_spending_patterns(self, transactions: List[Dict], user_id: str) -> List[Dict]:
+    def _analyze_spending_patterns(self, transactions: List[Dict], user_id: str,
+                                   data_version: Optional[int] = None) -> List[Dict]:
         """Analyze spending patterns using clustering"""
         suggestions = []
         
@@ -199,12 +286,15 @@ class MLSuggestionsEngine:
                 features = ['total_spent', 'avg_amount', 'transaction_count']
                 X = category_spending[features].values
                 
-                # Scale features
-                X_scaled = self.scaler.fit_transform(X)
-                
-                # Apply K-means clustering
-                kmeans = KMeans(n_clusters=min(3, len(category_spending)), random_state=42)
-                clusters = kmeans.fit_predict(X_scaled)
+                # Scale features and apply K-means clustering (once per data version)
+                def fit():
+                    scaler = StandardScaler().fit(X)
+                    kmeans = KMeans(n_clusters=min(3, len(category_spending)), random_state=42)
+                    return scaler, kmeans.fit(scaler.transform(X))
+
+                # assign the current rows rather than reusing the training labels_
+                scaler, kmeans = _fitted(user_id, 'clusters', data_version, fit)
+                clusters = kmeans.predict(scaler.transform(X))
                 
                 category_spending['cluster'] = clusters
                 
@@ -467,8 +557,13 @@ class MLSuggestionsEngine:
         
         return suggestions
     
-    def generate_ml_suggestions(self, user_id: str, user_data: Dict[str, Any]) -> List[Dict]:
-        """Generate comprehensive ML-powered suggestions"""
+    def generate_ml_suggestions(self, user_id: str, user_data: Dict[str, Any],
+                                data_version: Optional[int] = None) -> List[Dict]:
+        """
+        Generate comprehensive ML-powered suggestions
+        data_version: the user's data version read *before* user_data was loaded; fitted
+                      estimators are cached under it (None = fit without caching)
+        """
         suggestions = []
         
         try:
@@ -478,10 +573,13 @@ class MLSuggestionsEngine:
             investments = user_data.get('investments', [])
             budgets = user_data.get('budgets', [])
             
+            if not user_id:
+                data_version = None
+            
             # Generate ML-based suggestions
-            suggestions.extend(self._detect_spending_anomalies(transactions, user_id))
-            suggestions.extend(self._predict_future_savings(transactions, user_id))
-            suggestions.extend(self._analyze_spending_patterns(transactions, user_id))
+            suggestions.extend(self._detect_spending_anomalies(transactions, user_id, data_version))
+            suggestions.extend(self._predict_future_savings(transactions, user_id, data_version))
+            suggestions.extend(self._analyze_spending_patterns(transactions, user_id, data_version))
             suggestions.extend(self._predict_debt_payoff_optimization(debts, transactions, user_id))
             suggestions.extend(self._predict_investment_performance(investments, user_id))
             suggestions.extend(self._predict_budget_optimization(budgets, transactions, user_id))
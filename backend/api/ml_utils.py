@@ -4,11 +4,16 @@ from collections import defaultdict
 from statistics import mean, pstdev
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from .models import (
     User, Transaction, Goal,
-    MLPrediction, SpendingAnomaly, RecurringPattern
+    MLPrediction, SpendingAnomaly, RecurringPattern, AnomalyScanState
 )
+from .aggregations import category_amount_stats
+from .spending_stats import score_amount
+from .ledger import load_ledger
 
 # -------------------------------
 # Helpers
@@ -28,29 +33,23 @@ def _next_month_label(now: datetime) -> str:
 # -------------------------------
 # 1) Expense/Income Forecast (Monthly)
 # -------------------------------
-def predict_next_month_expense(user_id: str) -> MLPrediction:
+def predict_next_month_expense(user_id: str, ledger=None) -> MLPrediction:
     user = _get_user(user_id)
 
     window_days = 120
     cutoff = datetime.utcnow() - timedelta(days=window_days)
-    tx_qs = Transaction.objects(user_id=user, date__gte=cutoff)
+    if ledger is None:
+        ledger = load_ledger(user.id, since=cutoff)
 
-    month_income = defaultdict(float)
-    month_expense = defaultdict(float)
-
-    for tx in tx_qs:
-        key = _month_key(tx.date)
-        if tx.type == "income":
-            month_income[key] += float(tx.amount or 0)
-        elif tx.type == "expense":
-            month_expense[key] += float(tx.amount or 0)
+    month_income = ledger.monthly_totals("income", since=cutoff)
+    month_expense = ledger.monthly_totals("expense", since=cutoff)
 
     months = sorted(set(month_income.keys()) | set(month_expense.keys()))
     months = months[-3:]
 
     if months:
-        incomes = [month_income[m] for m in months]
-        expenses = [month_expense[m] for m in months]
+        incomes = [month_income.get(m, 0.0) for m in months]
+        expenses = [month_expense.get(m, 0.0) for m in months]
         predicted_income = mean(incomes)
         predicted_expense = mean(expenses)
         predicted_balance = predicted_income - predicted_expense
@@ -77,78 +76,96 @@ def predict_next_month_expense(user_id: str) -> MLPrediction:
 # -------------------------------
 # 2) Spending Anomaly Detection
 # -------------------------------
+# ObjectIds made client-side by different workers in the same second aren't ordered, so each
+# run rescans this far behind its watermark (already flagged transactions are skipped)
+ANOMALY_SCAN_OVERLAP_SECONDS = 5
+
+
 def detect_spending_anomalies(user_id: str):
+    """
+    Flag expenses far above their category / overall average.
+    Category stats are aggregated server-side over the whole history, but only expenses
+    newer than the user's last run (minus a short overlap) are scored; new anomalies are
+    written in one insert.
+    """
     user = _get_user(user_id)
-    expenses = list(Transaction.objects(user_id=user, type="expense"))
-    if not expenses:
+    cat_stats = category_amount_stats(user.id, "expense")
+    if not cat_stats:
         return []
 
-    by_cat = defaultdict(list)
-    for tx in expenses:
-        by_cat[tx.category].append(float(tx.amount or 0))
-
-    cat_stats = {}
-    all_amounts = [float(tx.amount or 0) for tx in expenses]
-    overall_mean = mean(all_amounts) if all_amounts else 0.0
-    overall_threshold = overall_mean * 1.6 if overall_mean > 0 else float("inf")
+    total_count = sum(c["count"] for c in cat_stats.values())
+    overall_mean = (sum(c["sum"] for c in cat_stats.values()) / total_count) if total_count else 0.0
+
+    # ✅ Only transactions added since the last run (ObjectId timestamps, second resolution)
+    state = AnomalyScanState.objects(user_id=str(user.id)).first()
+    candidates = Transaction.objects(user_id=user, type="expense")
+    watermark = state.last_transaction_id if state else None
+    if watermark:
+        since = watermark.generation_time - timedelta(seconds=ANOMALY_SCAN_OVERLAP_SECONDS)
+        candidates = candidates.filter(id__gte=ObjectId.from_datetime(since))
+    candidates = list(candidates.only("id", "category", "amount").order_by("id").as_pymongo())
+    if not candidates:
+        return []
 
-    for cat, vals in by_cat.items():
-        m = mean(vals)
-        s = pstdev(vals) if len(vals) > 1 else 0.0
-        cat_stats[cat] = (m, s)
+    # ✅ One query for everything already flagged
+    already_flagged = set(SpendingAnomaly._get_collection().distinct(
+        "transaction_id", {"user_id": user.id}
+    ))
 
-    created = []
-    for tx in expenses:
-        amt = float(tx.amount or 0)
-        m, s = cat_stats.get(tx.category, (overall_mean, 0.0))
-        z_like = 0 if s == 0 else (amt - m) / s
-        ratio = (amt / m) if m > 0 else 0
-        is_anomaly = (s > 0 and z_like >= 2.0) or (amt >= overall_threshold) or (ratio >= 1.6)
-        if is_anomaly:
-            existing = SpendingAnomaly.objects(user_id=user, transaction_id=tx).first()
-            if existing:
-                continue
-            reason_parts = []
-            if s > 0 and z_like >= 2.0:
-                reason_parts.append(f"z≈{round(z_like,2)}")
-            if ratio >= 1.6 and m > 0:
-                reason_parts.append(f"{round(ratio,2)}x category avg")
-            if amt >= overall_threshold and overall_mean > 0:
-                reason_parts.append(">1.6x overall avg")
-
-            anomaly = SpendingAnomaly(
+    new_anomalies = []
+    for tx in candidates:
+        if tx["_id"] in already_flagged:
+            continue
+        stats = cat_stats.get(tx.get("category"))
+        m, s = (stats["mean"], stats["std"]) if stats else (overall_mean, 0.0)
+        scored = score_amount(float(tx.get("amount") or 0), m, s, overall_mean)
+        if scored is not None:
+            new_anomalies.append(SpendingAnomaly(
                 user_id=user,
-                transaction_id=tx,
-                anomaly_score=float(max(ratio, z_like if s > 0 else 0)),
-                flag_reason="; ".join(reason_parts) or "High deviation",
-            )
-            anomaly.save()
-            created.append(anomaly)
-    return created
+                transaction_id=tx["_id"],
+                anomaly_score=scored[0],
+                flag_reason=scored[1],
+            ))
+
+    if new_anomalies:
+        SpendingAnomaly.objects.insert(new_anomalies, load_bulk=False)
+
+    AnomalyScanState.objects(user_id=str(user.id)).update_one(
+        set__last_transaction_id=max(candidates[-1]["_id"], watermark) if watermark else candidates[-1]["_id"],
+        set__last_run_at=datetime.utcnow(),
+        upsert=True,
+    )
+    return new_anomalies
 
 # -------------------------------
 # 3) Recurring Pattern Detection
 # -------------------------------
 def find_recurring_patterns(user_id: str):
+    """
+    Bucket expenses by (category, amount rounded to 100) and record buckets with 3+ hits.
+    All patterns are written in one unordered bulk upsert keyed by (user, category, pattern);
+    returns only the patterns that were newly inserted.
+    """
     user = _get_user(user_id)
-    expenses = list(Transaction.objects(user_id=user, type="expense"))
-    if not expenses:
-        return []
+    expenses = Transaction.objects(user_id=user, type="expense").only("date", "amount", "category").as_pymongo()
 
     buckets = defaultdict(list)
     for tx in expenses:
-        approx_amt = int(round(float(tx.amount or 0) / 100.0) * 100)
-        key = (tx.category, approx_amt)
+        if tx.get("date") is None:
+            continue
+        approx_amt = int(round(float(tx.get("amount") or 0) / 100.0) * 100)
+        key = (tx.get("category"), approx_amt)
         buckets[key].append(tx)
+    if not buckets:
+        return []
 
-    created = []
+    now = datetime.utcnow()
+    patterns, ops = [], []
     for (cat, approx_amt), txs in buckets.items():
         if len(txs) < 3:
             continue
-        txs.sort(key=lambda t: t.date)
-        gaps = [(txs[i].date - txs[i-1].date).days for i in range(1, len(txs))]
-        if not gaps:
-            continue
+        txs.sort(key=lambda t: t["date"])
+        gaps = [(txs[i]["date"] - txs[i-1]["date"]).days for i in range(1, len(txs))]
         avg_gap = mean(gaps)
         if 5 <= avg_gap <= 10:
             freq = "Weekly"
@@ -157,27 +174,42 @@ def find_recurring_patterns(user_id: str):
         else:
             freq = "Irregular"
 
-        avg_amount = mean([float(t.amount or 0) for t in txs])
+        avg_amount = float(mean([float(t.get("amount") or 0) for t in txs]))
         pattern_str = f"{cat} ~{approx_amt}"
 
-        existing = RecurringPattern.objects(user_id=user, category=cat, pattern=pattern_str).first()
-        if existing:
-            existing.average_amount = float(avg_amount)
-            existing.frequency = freq
-            existing.last_detected = datetime.utcnow()
-            existing.save()
-            continue
-
-        rp = RecurringPattern(
+        patterns.append(RecurringPattern(
             user_id=user,
             pattern=pattern_str,
             category=cat,
             frequency=freq,
-            average_amount=float(avg_amount),
-            last_detected=datetime.utcnow(),
-        )
-        rp.save()
-        created.append(rp)
+            average_amount=avg_amount,
+            last_detected=now,
+        ))
+        ops.append(UpdateOne(
+            {"user_id": user.id, "category": cat, "pattern": pattern_str},
+            {"$set": {"frequency": freq, "average_amount": avg_amount, "last_detected": now}},
+            upsert=True,
+        ))
+
+    if not ops:
+        return []
+
+    # ✅ One round trip for every pattern; ordered=False lets the server apply them independently
+    coll = RecurringPattern._get_collection()
+    try:
+        upserted = coll.bulk_write(ops, ordered=False).upserted_ids
+    except BulkWriteError as e:
+        lost = [err["index"] for err in e.details.get("writeErrors", []) if err.get("code") == 11000]
+        if len(lost) != len(e.details.get("writeErrors", [])):
+            raise
+        # a concurrent run inserted these patterns first; they now exist, so this just updates them
+        coll.bulk_write([ops[i] for i in lost], ordered=False)
+        upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+
+    created = []
+    for index, oid in upserted.items():
+        patterns[index].pk = oid
+        created.append(patterns[index])
     return created
 
 # -------------------------------
@@ -187,7 +219,7 @@ from statistics import mean
 from datetime import datetime, timedelta
 from collections import defaultdict
 
-def predict_goal_completion(user_id: str):
+def predict_goal_completion(user_id: str, ledger=None):
     """
     For each Goal:
       remaining = target_amount - current_amount
@@ -198,29 +230,23 @@ def predict_goal_completion(user_id: str):
     goals = list(Goal.objects(user_id=user))
 
     # ✅ Get all accounts of user
-    from .models import Account, Transaction
-    accounts = list(Account.objects(user_id=user))
-    account_ids = [acc.id for acc in accounts]
+    from .models import Account
+    account_ids = list(Account.objects(user_id=user).scalar("id"))
 
     # ✅ Last 120 days transactions of these accounts
     window_days = 120
     cutoff = datetime.utcnow() - timedelta(days=window_days)
-    tx_qs = Transaction.objects(user_id=user, account_id__in=account_ids, date__gte=cutoff)
+    if ledger is None:
+        ledger = load_ledger(user.id, since=cutoff)
 
     # ✅ Group by month
-    month_income = defaultdict(float)
-    month_expense = defaultdict(float)
-    for tx in tx_qs:
-        key = _month_key(tx.date)
-        if tx.type == "income":
-            month_income[key] += float(tx.amount or 0)
-        elif tx.type == "expense":
-            month_expense[key] += float(tx.amount or 0)
+    month_income = ledger.monthly_totals("income", since=cutoff, account_ids=account_ids)
+    month_expense = ledger.monthly_totals("expense", since=cutoff, account_ids=account_ids)
 
     months = sorted(set(month_income.keys()) | set(month_expense.keys()))
     months = months[-3:]  # last 3 months
 
-    monthly_nets = [(month_income[m] - month_expense[m]) for m in months] if months else []
+    monthly_nets = [(month_income.get(m, 0.0) - month_expense.get(m, 0.0)) for m in months] if months else []
 
     # ✅ Safe fallback
     if monthly_nets:
@@ -453,12 +479,26 @@ def ml_predict_debt_payoff(transactions, debt_amount: float):
 # ===========================
 
 
+import hashlib
+import time
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from typing import Optional, Tuple, Dict, List
 from bson import ObjectId
+from django.conf import settings
 from .models import Transaction, User
+from .data_cache import BoundedLRUCache, get_data_version, user_key
+from .aggregations import daily_sums_by_type
+from .model_registry import get_fitted_params, save_fitted_params
+from .forecast_pool import submit_fit, TIMEOUT_SECONDS as FIT_TIMEOUT_SECONDS
+
+# (user, model, periods, data_version) -> daily forecast; weekly/monthly/target views are derived from it
+_forecast_cache = BoundedLRUCache(
+    max_entries=getattr(settings, "FORECAST_CACHE_MAX_ENTRIES", 512),
+    max_bytes=getattr(settings, "FORECAST_CACHE_MAX_BYTES", 64 * 1024 * 1024),
+    ttl=getattr(settings, "FORECAST_CACHE_TTL_SECONDS", 3600),
+)
 
 
 # ---------------------------
@@ -478,41 +518,51 @@ def _ensure_user(user_id: str):
             return None
 
 
+def _observed_daily_sums(user_id: str, ledger=None) -> Dict[str, pd.Series]:
+    """
+    {"income": Series, "expense": Series} of observed daily sums (days without rows are absent).
+    Read from a preloaded ledger when given, otherwise from one $group aggregation.
+    Empty when the user can't be resolved (callers fall back to fake data).
+    """
+    if ledger is not None:
+        return {kind: ledger.daily_series(kind) for kind in ("income", "expense")}
+
+    user = _ensure_user(user_id)
+    if user is None:
+        return {}
+    try:
+        sums = daily_sums_by_type(user.id)
+    except Exception:
+        return {}
+    return {
+        kind: pd.Series(totals, index=pd.DatetimeIndex(days), dtype=float)
+        for kind, (days, totals) in sums.items()
+    }
+
+
 def _fetch_user_daily_series_by_type(
     user_id: str,
     kind: Optional[str],              # "income" | "expense" | None
     min_days: int = 30,
-    fallback_days: int = 120
+    fallback_days: int = 120,
+    ledger=None,
+    observed: Optional[pd.Series] = None
 ) -> pd.Series:
     """
     Fetch user's transactions -> daily aggregated series (Pandas Series indexed by date).
     If no/low data, generate realistic fake series.
     kind=None => all; kind="income"/"expense" => filtered
+    Pass `observed` daily sums (or a preloaded ledger) to avoid fetching again.
     """
-    user = _ensure_user(user_id)
-    try:
-        if user is None:
-            qs = []
-        else:
-            if kind in ("income", "expense"):
-                qs = Transaction.objects(user_id=user, type=kind).only('date', 'amount', 'type')
-            else:
-                qs = Transaction.objects(user_id=user).only('date', 'amount', 'type')
-    except Exception:
-        qs = []
-
-    if qs:
-        data = []
-        for t in qs:
-            d = t.date.date() if hasattr(t.date, "date") else t.date
-            try:
-                amt = float(t.amount)
-            except Exception:
-                amt = 0.0
-            data.append({"date": d, "amount": amt})
-        df = pd.DataFrame(data)
-        df["date"] = pd.to_datetime(df["date"])
-        daily = df.groupby("date")["amount"].sum().sort_index()
+    if observed is None:
+        sums = _observed_daily_sums(user_id, ledger)
+        if kind in ("income", "expense"):
+            observed = sums.get(kind)
+        elif sums:
+            observed = pd.concat(list(sums.values())).groupby(level=0).sum()
+
+    if observed is not None and not observed.empty:
+        daily = observed.sort_index()
     else:
         # Fake data generator (stable & realistic)
         end = datetime.now().date()
@@ -545,10 +595,15 @@ def _fetch_user_daily_series_by_type(
     return daily.astype(float)
 
 
-def _fetch_income_expense_series(user_id: str) -> Tuple[pd.Series, pd.Series, pd.Series]:
-    """Return (income_series, expense_series, balance_series)"""
-    inc = _fetch_user_daily_series_by_type(user_id, "income")
-    exp = _fetch_user_daily_series_by_type(user_id, "expense")
+def _fetch_income_expense_series(user_id: str, ledger=None) -> Tuple[pd.Series, pd.Series, pd.Series]:
+    """Return (income_series, expense_series, balance_series) from a single fetch"""
+    return _income_expense_from_sums(user_id, _observed_daily_sums(user_id, ledger))
+
+
+def _income_expense_from_sums(user_id: str, sums: Dict[str, pd.Series]) -> Tuple[pd.Series, pd.Series, pd.Series]:
+    none_observed = pd.Series(dtype=float)
+    inc = _fetch_user_daily_series_by_type(user_id, "income", observed=sums.get("income", none_observed))
+    exp = _fetch_user_daily_series_by_type(user_id, "expense", observed=sums.get("expense", none_observed))
     # reindex to a common date index
     full_idx = pd.date_range(min(inc.index.min(), exp.index.min()),
                              max(inc.index.max(), exp.index.max()),
@@ -565,43 +620,103 @@ def _build_future_index(last_date: pd.Timestamp, periods: int) -> pd.DatetimeInd
 
 # ---------------------------
 # Model-specific forecasters
+# Each _fit_* fits once and returns (predict(steps) -> List[float], params), so a longer
+# horizon is a cheap call on the same fit instead of a refit. `params` is what the
+# model registry stores; `warm` = {"params", "exact"} comes back from it:
+#   exact -> same training series, rebuild the fit from params without optimising
+#   else  -> new data arrived, optimise starting from the previous params
 # ---------------------------
-def _forecast_arima(series: pd.Series, periods=30, order=(5, 1, 0)) -> List[float]:
+def _fit_arima(series: pd.Series, order=(5, 1, 0), warm: Optional[Dict] = None):
     from statsmodels.tsa.arima.model import ARIMA
     model = ARIMA(series, order=order)
-    fit = model.fit()
-    fc = fit.forecast(steps=periods)
-    return fc.values.tolist()
+    if warm and warm["exact"]:
+        fit = model.filter(warm["params"]["values"])
+    else:
+        fit = model.fit(start_params=warm["params"]["values"] if warm else None)
+    params = {"values": [float(v) for v in np.asarray(fit.params)]}
+    return (lambda steps: fit.forecast(steps=steps).values.tolist()), params
 
 
-def _forecast_sarima(series: pd.Series, periods=30,
-                     order=(1, 1, 1), seasonal_order=(1, 1, 1, 7)) -> List[float]:
+def _fit_sarima(series: pd.Series, order=(1, 1, 1), seasonal_order=(1, 1, 1, 7),
+                warm: Optional[Dict] = None):
     from statsmodels.tsa.statespace.sarimax import SARIMAX
     model = SARIMAX(series, order=order, seasonal_order=seasonal_order,
                     enforce_stationarity=False, enforce_invertibility=False)
-    fit = model.fit(disp=False)
-    fc = fit.get_forecast(steps=periods).predicted_mean
-    return fc.values.tolist()
+    if warm and warm["exact"]:
+        fit = model.filter(warm["params"]["values"])
+    else:
+        fit = model.fit(start_params=warm["params"]["values"] if warm else None, disp=False)
+    params = {"values": [float(v) for v in np.asarray(fit.params)]}
+    return (lambda steps: fit.get_forecast(steps=steps).predicted_mean.values.tolist()), params
 
 
-def _forecast_holt(series: pd.Series, periods=30,
-                   seasonal_periods=7, trend='add', seasonal='add') -> List[float]:
+def _fit_holt(series: pd.Series, seasonal_periods=7, trend='add', seasonal='add',
+              warm: Optional[Dict] = None):
     from statsmodels.tsa.holtwinters import ExponentialSmoothing
-    model = ExponentialSmoothing(series, trend=trend, seasonal=seasonal, seasonal_periods=seasonal_periods)
-    fit = model.fit()
-    fc = fit.forecast(periods)
-    return fc.values.tolist()
+    if warm and warm["exact"]:
+        # smoothing + initial states fully determine the fit; no optimisation needed
+        p = warm["params"]
+        model = ExponentialSmoothing(
+            series, trend=trend, seasonal=seasonal, seasonal_periods=seasonal_periods,
+            initialization_method="known", initial_level=p["initial_level"],
+            initial_trend=p["initial_trend"], initial_seasonal=p["initial_seasons"],
+        )
+        fit = model.fit(smoothing_level=p["smoothing_level"], smoothing_trend=p["smoothing_trend"],
+                        smoothing_seasonal=p["smoothing_seasonal"], optimized=False)
+    else:
+        # Holt-Winters has no stable start_params API, so new data means a normal fit
+        model = ExponentialSmoothing(series, trend=trend, seasonal=seasonal, seasonal_periods=seasonal_periods)
+        fit = model.fit()
+    fitted = fit.params
+    params = {
+        key: float(fitted[key])
+        for key in ("smoothing_level", "smoothing_trend", "smoothing_seasonal", "initial_level", "initial_trend")
+    }
+    params["initial_seasons"] = [float(v) for v in np.asarray(fitted["initial_seasons"])]
+    return (lambda steps: fit.forecast(steps).values.tolist()), params
 
 
-def _forecast_prophet(series: pd.Series, periods=30) -> List[float]:
+def _fit_prophet(series: pd.Series, warm: Optional[Dict] = None):
     # Prophet expects columns: ds, y
     from prophet import Prophet
     df = pd.DataFrame({"ds": series.index, "y": series.values})
     m = Prophet(daily_seasonality=True, weekly_seasonality=True, yearly_seasonality=False)
-    m.fit(df)
-    future = m.make_future_dataframe(periods=periods, freq="D")
-    forecast = m.predict(future)[["ds", "yhat"]].tail(periods)
-    return forecast["yhat"].astype(float).tolist()
+    # Prophet can't be rebuilt from params, but starting Stan at the previous optimum converges fast
+    if warm:
+        m.fit(df, init=warm["params"])
+    else:
+        m.fit(df)
+
+    def predict(steps):
+        future = m.make_future_dataframe(periods=steps, freq="D")
+        forecast = m.predict(future)[["ds", "yhat"]].tail(steps)
+        return forecast["yhat"].astype(float).tolist()
+
+    params = {key: float(m.params[key][0][0]) for key in ("k", "m", "sigma_obs")}
+    params.update({key: [float(v) for v in m.params[key][0]] for key in ("delta", "beta")})
+    return predict, params
+
+
+def _forecast_arima(series: pd.Series, periods=30, order=(5, 1, 0)) -> List[float]:
+    return _fit_arima(series, order=order)[0](periods)
+
+
+def _forecast_sarima(series: pd.Series, periods=30,
+                     order=(1, 1, 1), seasonal_order=(1, 1, 1, 7)) -> List[float]:
+    return _fit_sarima(series, order=order, seasonal_order=seasonal_order)[0](periods)
+
+
+def _forecast_holt(series: pd.Series, periods=30,
+                   seasonal_periods=7, trend='add', seasonal='add') -> List[float]:
+    return _fit_holt(series, seasonal_periods=seasonal_periods, trend=trend, seasonal=seasonal)[0](periods)
+
+
+def _forecast_prophet(series: pd.Series, periods=30) -> List[float]:
+    return _fit_prophet(series)[0](periods)
+
+
+GBR_LAGS = (1, 2, 3, 7, 14)
+GBR_DIRECT_MAX_ROWS = 20000
 
 
 def _make_features_from_series(series: pd.Series):
@@ -609,7 +724,7 @@ def _make_features_from_series(series: pd.Series):
     df["dow"] = df["ds"].dt.weekday
     df["dom"] = df["ds"].dt.day
     df["month"] = df["ds"].dt.month
-    for lag in [1, 2, 3, 7, 14]:
+    for lag in GBR_LAGS:
         df[f"lag_{lag}"] = df["y"].shift(lag)
     df = df.dropna()
     X = df.drop(columns=["ds", "y"])
@@ -617,35 +732,153 @@ def _make_features_from_series(series: pd.Series):
     return df, X, y
 
 
-def _forecast_gbr(series: pd.Series, periods=30) -> List[float]:
-    """GBRT as a light 'xgb-style' tree-based regressor to avoid extra deps."""
+def _calendar_features(dates: pd.DatetimeIndex) -> np.ndarray:
+    """(n, 3) array of dow, dom, month — same columns as _make_features_from_series"""
+    return np.column_stack([dates.weekday, dates.day, dates.month]).astype(float)
+
+
+def _fit_gbr(series: pd.Series, periods=30, direct: bool = False):
+    """
+    GBRT as a light 'xgb-style' tree-based regressor to avoid extra deps.
+    Recursive by default (each prediction feeds the next step's lags);
+    direct=True fits one horizon-aware model and predicts every step in one batched call.
+    """
     from sklearn.ensemble import GradientBoostingRegressor
     df, X, y = _make_features_from_series(series)
     if len(df) < 30:
         # fallback to Holt when too little data
-        return _forecast_holt(series, periods)
-    model = GradientBoostingRegressor()
-    model.fit(X, y)
-
-    preds = []
-    last_known = series.copy()
-    future_dates = _build_future_index(series.index.max(), periods)
-    for d in future_dates:
-        row = {"dow": d.weekday(), "dom": d.day, "month": d.month}
-        for lag in [1, 2, 3, 7, 14]:
-            lag_date = d - pd.Timedelta(days=lag)
-            row[f"lag_{lag}"] = float(last_known.get(lag_date, last_known.iloc[-1]))
-        Xf = pd.DataFrame([row])
-        yhat = float(model.predict(Xf)[0])
-        preds.append(yhat)
-        last_known.loc[d] = yhat
-    return preds
+        return _fit_holt(series)[0]
+    if direct:
+        return _fit_gbr_direct(series, periods)
+
+    model = GradientBoostingRegressor(random_state=0)
+    model.fit(X.to_numpy(dtype=float), y.to_numpy(dtype=float))
+    history = series.to_numpy(dtype=float)
+    last_date = series.index.max()
+    lags = np.array(GBR_LAGS)
+
+    def predict(steps):
+        # history + forecasts in one preallocated buffer; lags are plain offsets into it
+        n = len(history)
+        values = np.empty(n + steps, dtype=float)
+        values[:n] = history
+        calendar = _calendar_features(_build_future_index(last_date, steps))
+        row = np.empty((1, 3 + len(GBR_LAGS)), dtype=float)
+        for step in range(steps):
+            pos = n + step
+            row[0, :3] = calendar[step]
+            row[0, 3:] = values[pos - lags]
+            values[pos] = model.predict(row)[0]
+        return values[n:].tolist()
+    return predict
+
+
+def _fit_gbr_direct(series: pd.Series, periods=30):
+    """
+    Direct multi-horizon GBRT: rows are (origin t, horizon h) pairs with the target's calendar,
+    h itself and lags anchored at the origin, so all `periods` steps come from one predict call.
+    """
+    from sklearn.ensemble import GradientBoostingRegressor
+    values = series.to_numpy(dtype=float)
+    n = len(values)
+    calendar = _calendar_features(series.index)
+    reach = np.array(GBR_LAGS) - 1           # lag_k of target t+h at h=1 is y[t-(k-1)]
+    origins = np.arange(reach.max(), n - 1)
+    horizons = np.arange(1, periods + 1)
+    O, H = (a.ravel() for a in np.meshgrid(origins, horizons, indexing="ij"))
+    keep = O + H < n
+    O, H = O[keep], H[keep]
+    if len(O) == 0:
+        return _fit_gbr(series, periods)
+    if len(O) > GBR_DIRECT_MAX_ROWS:
+        pick = np.random.default_rng(0).choice(len(O), GBR_DIRECT_MAX_ROWS, replace=False)
+        O, H = O[pick], H[pick]
+
+    T = O + H
+    X = np.column_stack([calendar[T], H, values[O[:, None] - reach]])
+    model = GradientBoostingRegressor(random_state=0)
+    model.fit(X, values[T])
+
+    last = n - 1
+    last_date = series.index.max()
+
+    def predict(steps):
+        if steps > periods:
+            # the model never saw horizons this long; train one that has
+            return _fit_gbr_direct(series, steps)(steps)
+        future = _calendar_features(_build_future_index(last_date, steps))
+        anchored = np.broadcast_to(values[last - reach], (steps, len(reach)))
+        Xf = np.column_stack([future, np.arange(1, steps + 1), anchored])
+        return model.predict(Xf).tolist()
+    return predict
+
+
+def _forecast_gbr(series: pd.Series, periods=30, direct: bool = False) -> List[float]:
+    return _fit_gbr(series, periods=periods, direct=direct)(periods)
 
 
 # ---------------------------
 # Generic dispatcher (single series)
 # ---------------------------
-def _forecast_one(series: pd.Series, model: str, periods: int) -> Tuple[pd.DatetimeIndex, List[float]]:
+class FittedForecaster:
+    """One fitted series model; forecast(steps) never refits"""
+
+    def __init__(self, series: pd.Series, predict):
+        self.last_date = series.index.max()
+        self.last_value = float(series.iloc[-1]) if len(series) > 0 else 0.0
+        self._predict = predict
+
+    def forecast(self, steps: int) -> Tuple[pd.DatetimeIndex, List[float]]:
+        try:
+            vals = self._predict(steps)
+        except Exception:
+            # ✅ Emergency fallback (in case the fitted model can't forecast)
+            vals = [self.last_value for _ in range(steps)]
+        return _build_future_index(self.last_date, steps), vals
+
+
+# models whose fitted parameters go through the registry (GBRT trees aren't worth persisting)
+REGISTRY_MODELS = ("arima", "sarima", "holt", "prophet")
+
+
+def _canonical_model(model: str) -> str:
+    model = (model or "holt").lower()
+    if model in ("arima", "sarima", "prophet"):
+        return model
+    if model in ("xgb", "gbrt", "tree"):
+        return "gbr"
+    if model in ("xgb_direct", "gbrt_direct", "tree_direct"):
+        return "gbr_direct"
+    return "holt"  # holt, holt_winters, expsmooth, hw and anything unknown
+
+
+def _fit_model(name: str, series: pd.Series, periods: int, warm: Optional[Dict] = None):
+    """(predict, params) for a canonical model name; params is None for unregistered models"""
+    if name == "arima":
+        return _fit_arima(series, warm=warm)
+    if name == "sarima":
+        return _fit_sarima(series, warm=warm)
+    if name == "prophet":
+        return _fit_prophet(series, warm=warm)
+    if name == "gbr":
+        return _fit_gbr(series, periods=periods), None
+    if name == "gbr_direct":
+        return _fit_gbr(series, periods=periods, direct=True), None
+    return _fit_holt(series, warm=warm)
+
+
+def _series_fingerprint(series: pd.Series) -> str:
+    digest = hashlib.sha1(str(series.index.min()).encode())
+    digest.update(series.to_numpy(dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def _fit_one(series: pd.Series, model: str, periods: int,
+             registry_key: Optional[Tuple[str, str]] = None) -> FittedForecaster:
+    """
+    Fit one series. With registry_key=(user, "income"|"expense") the fitted parameters are
+    reused when the series is unchanged, warm-start the fit when it grew, and are stored afterwards.
+    """
     # Ensure series is numeric and clean
     series = pd.to_numeric(series, errors="coerce").fillna(0.0)
 
@@ -654,49 +887,121 @@ def _forecast_one(series: pd.Series, model: str, periods: int) -> Tuple[pd.Datet
         last_val = float(series.iloc[-1]) if len(series) > 0 else 0.0
         mean_val = float(series.mean()) if len(series) > 0 else 0.0
         safe_val = (last_val + mean_val) / 2.0   # stable fallback
-        idx = _build_future_index(series.index.max(), periods)
-        vals = [safe_val for _ in range(periods)]
-        return idx, vals
+        return FittedForecaster(series, lambda steps: [safe_val for _ in range(steps)])
 
     # Normal model flow
-    model = (model or "holt").lower()
+    name = _canonical_model(model)
+    use_registry = registry_key is not None and name in REGISTRY_MODELS
+    warm = None
+    fingerprint = _series_fingerprint(series) if use_registry else None
+    if use_registry:
+        stored = get_fitted_params(registry_key[0], registry_key[1], name)
+        if stored is not None and stored.params:
+            warm = {"params": stored.params, "exact": stored.fingerprint == fingerprint}
+
     try:
-        if model == "arima":
-            vals = _forecast_arima(series, periods=periods)
-        elif model == "sarima":
-            vals = _forecast_sarima(series, periods=periods)
-        elif model in ("holt", "holt_winters", "expsmooth", "hw"):
-            vals = _forecast_holt(series, periods=periods)
-        elif model == "prophet":
-            vals = _forecast_prophet(series, periods=periods)
-        elif model in ("xgb", "gbrt", "tree"):
-            vals = _forecast_gbr(series, periods=periods)
-        else:
-            vals = _forecast_holt(series, periods=periods)
+        try:
+            predict, params = _fit_model(name, series, periods, warm)
+        except Exception:
+            if warm is None:
+                raise
+            # stored parameters don't fit this series any more (e.g. shape changed); train from scratch
+            warm = None
+            predict, params = _fit_model(name, series, periods)
+
+        if use_registry and params is not None and not (warm and warm["exact"]):
+            save_fitted_params(
+                registry_key[0], registry_key[1], name, params, fingerprint,
+                series.index.min().to_pydatetime(), series.index.max().to_pydatetime(), len(series),
+            )
     except Exception as e:
         # ✅ Emergency fallback (in case model training still fails)
-        last_val = float(series.iloc[-1]) if len(series) > 0 else 0.0
-        vals = [last_val for _ in range(periods)]
+        return _last_value_forecaster(series)
+
+    return FittedForecaster(series, predict)
 
-    idx = _build_future_index(series.index.max(), periods)
-    return idx, vals
+
+def _last_value_forecaster(series: pd.Series) -> FittedForecaster:
+    """Flat forecast at the last observed value"""
+    last_val = float(series.iloc[-1]) if len(series) > 0 else 0.0
+    return FittedForecaster(series, lambda steps: [last_val for _ in range(steps)])
+
+
+def _forecast_one(series: pd.Series, model: str, periods: int) -> Tuple[pd.DatetimeIndex, List[float]]:
+    return _fit_one(series, model, periods).forecast(periods)
 
 # ---------------------------
 # Public API helpers
 # ---------------------------
-def forecast_income_expense_balance(
-    user_id: str,
-    model: str = "holt",
-    periods: int = 30
-) -> Dict:
+def _fit_and_forecast(series: pd.Series, model: str, periods: int, registry_key=None) -> List[float]:
+    """Process-pool entry point: fit in the worker and ship back plain forecast values"""
+    return [float(v) for v in _fit_one(series, model, periods, registry_key=registry_key).forecast(periods)[1]]
+
+
+def _precomputed_forecaster(series: pd.Series, values: List[float], model: str, registry_key=None) -> FittedForecaster:
+    """Serves forecasts computed in a worker; only a horizon beyond them needs a local fit"""
+    local = []
+
+    def predict(steps):
+        if steps <= len(values):
+            return values[:steps]
+        if not local:
+            local.append(_fit_one(series, model, steps, registry_key=registry_key))
+        return local[0].forecast(steps)[1]
+    return FittedForecaster(series, predict)
+
+
+def fit_income_expense(user_id: str, model: str = "holt", periods: int = 30, ledger=None,
+                       target_day=None) -> Dict:
     """
-    Returns daily forecast for income, expense and balance lists:
-      { income: [{ds, yhat}], expense: [...], balance: [...] }
+    Fit income and expense models once: {income, expense: FittedForecaster, last_observed_date}
+    The two fits run in parallel on the forecast process pool when it has room, otherwise in-process.
+    Pool forecasts cover `periods` or up to target_day, whichever is further. A pooled fit that
+    fails or misses FIT_TIMEOUT_SECONDS falls back to a flat last-value forecast (no refit)
+    and the result is marked {"degraded": True} so it is not cached.
     """
-    inc_series, exp_series, _ = _fetch_income_expense_series(user_id)
+    sums = _observed_daily_sums(user_id, ledger)
+    inc_series, exp_series, _ = _income_expense_from_sums(user_id, sums)
+    last_observed = inc_series.index.max()
+
+    horizon = periods
+    if target_day is not None:
+        horizon = max(periods, (target_day - last_observed.date()).days)
+
+    def registry_key(kind):
+        # only real series are worth remembering; the fake fallback differs on every call
+        observed = sums.get(kind)
+        return (user_key(user_id), kind) if observed is not None and not observed.empty else None
+
+    series = {"income": inc_series, "expense": exp_series}
+    futures = {
+        kind: submit_fit(_fit_and_forecast, s, model, horizon, registry_key(kind))
+        for kind, s in series.items()
+    }
 
-    idx_inc, inc_vals = _forecast_one(inc_series, model, periods)
-    idx_exp, exp_vals = _forecast_one(exp_series, model, periods)
+    fitted = {"last_observed_date": str(last_observed.date())}
+    deadline = time.monotonic() + FIT_TIMEOUT_SECONDS  # one budget for the whole request
+    for kind, s in series.items():
+        future = futures[kind]
+        if future is None:
+            # pool disabled or saturated at submit time: fit here
+            fitted[kind] = _fit_one(s, model, horizon, registry_key=registry_key(kind))
+            continue
+        try:
+            values = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            fitted[kind] = _precomputed_forecaster(s, values, model, registry_key(kind))
+        except Exception as e:
+            # refitting here would add a full fit on top of the timeout; drop it if still queued
+            future.cancel()
+            print(f"❌ Pooled {kind} fit failed, using last-value forecast:", str(e) or type(e).__name__)
+            fitted[kind] = _last_value_forecaster(pd.to_numeric(s, errors="coerce").fillna(0.0))
+            fitted["degraded"] = True
+    return fitted
+
+
+def _forecast_from_fitted(fitted: Dict, periods: int) -> Dict:
+    idx_inc, inc_vals = fitted["income"].forecast(periods)
+    idx_exp, exp_vals = fitted["expense"].forecast(periods)
 
     # Align lengths/indexes
     dates = idx_inc  # both will start from (last_date+1)
@@ -710,10 +1015,27 @@ def forecast_income_expense_balance(
         "income": inc_list,
         "expense": exp_list,
         "balance": bal_list,
-        "last_observed_date": str(inc_series.index.max().date())
+        "last_observed_date": fitted["last_observed_date"],
     }
 
 
+def forecast_income_expense_balance(
+    user_id: str,
+    model: str = "holt",
+    periods: int = 30,
+    ledger=None
+) -> Dict:
+    """
+    Returns daily forecast for income, expense and balance lists:
+      { income: [{ds, yhat}], expense: [...], balance: [...] }
+    """
+    return _forecast_from_fitted(fit_income_expense(user_id, model, periods, ledger=ledger), periods)
+
+
+def _forecast_cache_key(user_id: str, model: str, periods: int, version: int):
+    return (user_key(user_id), (model or "holt").lower(), int(periods), version)
+
+
 def _aggregate_list(data_list: List[Dict], granularity: str = "daily") -> List[Dict]:
     """Aggregate [{ds,yhat}] into weekly/monthly if requested."""
     if granularity == "daily":
@@ -736,17 +1058,53 @@ def _aggregate_list(data_list: List[Dict], granularity: str = "daily") -> List[D
     return [{"ds": str(d.date()), "yhat": float(v)} for d, v in out.items()]
 
 
+def _point_at(daily: List[Dict], day) -> Optional[float]:
+    """O(1) lookup in a contiguous daily [{ds, yhat}] list by offset from its first date"""
+    if not daily:
+        return None
+    offset = (day - datetime.strptime(daily[0]["ds"], "%Y-%m-%d").date()).days
+    if 0 <= offset < len(daily) and daily[offset]["ds"] == str(day):
+        return float(daily[offset]["yhat"])
+    return None
+
+
 def build_forecast_payload(
     user_id: str,
     model: str = "holt",
     periods: int = 30,
     granularity: str = "daily",
-    target_date: Optional[str] = None
+    target_date: Optional[str] = None,
+    ledger=None
 ) -> Dict:
     """
     Create final payload including aggregated series + summary + (optional) target point.
+    Daily forecasts come from the forecast cache; granularity and target_date are views over them.
+    On a miss the models are fitted once per request, and a target_date past the horizon
+    only extends that fit.
     """
-    fc = forecast_income_expense_balance(user_id, model=model, periods=periods)
+    version = get_data_version(user_id)
+    fitted = None
+    target_day = None
+    if target_date:
+        try:
+            target_day = pd.to_datetime(target_date).date()
+        except Exception:
+            pass  # reported in target_point below
+
+    def daily_forecast(horizon):
+        nonlocal fitted
+        key = _forecast_cache_key(user_id, model, horizon, version)
+        fc = _forecast_cache.get(key)
+        if fc is None:
+            if fitted is None:
+                fitted = fit_income_expense(user_id, model, horizon, ledger=ledger, target_day=target_day)
+            fc = _forecast_from_fitted(fitted, horizon)
+            if not fitted.get("degraded"):
+                # a busy pool moment must not pin a flat fallback forecast for the cache TTL
+                _forecast_cache.set(key, fc)
+        return fc
+
+    fc = daily_forecast(periods)
 
     income_daily = fc["income"]
     expense_daily = fc["expense"]
@@ -796,28 +1154,17 @@ def build_forecast_payload(
             last_obs = pd.to_datetime(fc["last_observed_date"]).date()
             days_needed = (td - last_obs).days
             if days_needed > periods:
-                # Extend horizon automatically to cover target_date
-                fc_ext = forecast_income_expense_balance(user_id, model=model, periods=days_needed)
+                # Extend horizon automatically to cover target_date (same fit, longer forecast)
+                fc_ext = daily_forecast(days_needed)
                 income_daily = fc_ext["income"]
                 expense_daily = fc_ext["expense"]
                 balance_daily = fc_ext["balance"]
 
-            # find that date in daily
-            def _find_point(lst):
-                for row in lst:
-                    if row["ds"] == str(td):
-                        return float(row["yhat"])
-                return None
-
-            income_point = _find_point(income_daily)
-            expense_point = _find_point(expense_daily)
-            balance_point = _find_point(balance_daily)
-
             payload["target_point"] = {
                 "date": str(td),
-                "income": income_point,
-                "expense": expense_point,
-                "balance": balance_point,
+                "income": _point_at(income_daily, td),
+                "expense": _point_at(expense_daily, td),
+                "balance": _point_at(balance_daily, td),
             }
         except Exception:
             payload["target_point"] = {"error": "Invalid target_date format. Use YYYY-MM-DD."}
@@ -828,13 +1175,12 @@ def build_forecast_payload(
 # Legacy simple dispatcher (single total series)
 # (kept for backward compatibility; treats total = income+expense sum)
 # ---------------------------
-def forecast_dispatch(user_id, model="holt", periods=30):
+def forecast_dispatch(user_id, model="holt", periods=30, ledger=None):
     """
     Backward compatible: returns a single 'total' daily forecast (sum of amounts).
     Now built as income + expense (absolute sum). Prefer build_forecast_payload for rich output.
     """
-    inc_series = _fetch_user_daily_series_by_type(user_id, "income")
-    exp_series = _fetch_user_daily_series_by_type(user_id, "expense")
+    inc_series, exp_series, _ = _fetch_income_expense_series(user_id, ledger=ledger)
     total_series = inc_series + exp_series  # total volume
     idx, vals = _forecast_one(total_series, model, periods)
     return [{"ds": str(d.date()), "yhat": float(v)} for d, v in zip(idx, vals)]
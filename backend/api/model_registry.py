@@ -0,0 +1,49 @@
+"""
+Fitted forecast model registry
+Keeps the last fitted parameters per (user, series, model) so later requests can skip or warm-start the fit
+"""
+
+from datetime import datetime
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from .models import FittedModel
+
+ENABLED = getattr(settings, "FORECAST_MODEL_REGISTRY_ENABLED", True)
+
+
+def get_fitted_params(user_id: str, series: str, model_type: str) -> Optional[FittedModel]:
+    if not ENABLED:
+        return None
+    try:
+        return FittedModel.objects(user_id=user_id, series=series, model_type=model_type).first()
+    except Exception as e:
+        print("❌ Model registry lookup failed:", str(e))
+        return None
+
+
+def save_fitted_params(user_id: str, series: str, model_type: str, params: Dict,
+                       fingerprint: str, train_start: datetime, train_end: datetime, n_obs: int) -> None:
+    if not ENABLED:
+        return
+    try:
+        FittedModel.objects(user_id=user_id, series=series, model_type=model_type).update_one(
+            set__params=params,
+            set__fingerprint=fingerprint,
+            set__train_start=train_start,
+            set__train_end=train_end,
+            set__n_obs=n_obs,
+            set__updated_at=datetime.utcnow(),
+            upsert=True,
+        )
+    except Exception as e:
+        print("❌ Model registry save failed:", str(e))
+
+
+def forget_user(user_id: str) -> None:
+    """Drop every stored model of a user (e.g. when the user is deleted)"""
+    try:
+        FittedModel.objects(user_id=user_id).delete()
+    except Exception as e:
+        print("❌ Model registry cleanup failed:", str(e))
@@ -0,0 +1,192 @@
+"""
+Local model server
+One long-lived process owns the ML stack and its caches; web workers reach it over a Unix socket
+with length-prefixed JSON and fall back to in-process work when it is unavailable
+"""
+
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict
+
+from django.conf import settings
+
+SOCKET_PATH = getattr(settings, "MODEL_SERVER_SOCKET", "")
+TIMEOUT_SECONDS = getattr(settings, "MODEL_SERVER_TIMEOUT_SECONDS", 30)
+RETRY_SECONDS = getattr(settings, "MODEL_SERVER_RETRY_SECONDS", 30)
+THREADS = getattr(settings, "MODEL_SERVER_THREADS", 4)
+
+_HEADER = struct.Struct("!I")
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+class ModelServerUnavailable(Exception):
+    """No server configured, not reachable, or it reported an error; callers compute in-process"""
+
+
+class ModelServerTimeout(Exception):
+    """The server took the request but did not answer in time; recomputing in-process would only add to it"""
+
+
+# -------------------------
+# Wire format
+# -------------------------
+def _json_default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if hasattr(obj, "tolist"):  # numpy scalars / arrays
+        return obj.tolist()
+    return str(obj)  # ObjectId and friends
+
+
+def send_message(sock: socket.socket, payload: Dict) -> None:
+    body = json.dumps(payload, default=_json_default).encode()
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks, remaining = [], size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError("model server closed the connection")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock: socket.socket) -> Dict:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > MAX_MESSAGE_BYTES:
+        raise ConnectionError(f"message of {size} bytes exceeds the limit")
+    return json.loads(_recv_exact(sock, size))
+
+
+# -------------------------
+# Client
+# -------------------------
+_down_until = 0.0
+
+
+def enabled() -> bool:
+    return bool(SOCKET_PATH) and time.monotonic() >= _down_until
+
+
+def call(method: str, timeout: float = None, **params) -> Any:
+    """
+    Run `method` on the model server and return its result.
+    raises ModelServerUnavailable; after a connection failure or broken framing the server is
+           skipped for RETRY_SECONDS so callers fall back immediately instead of trying again.
+    raises ModelServerTimeout when a reachable server is slow to answer (no back-off: the
+           server is healthy, just busy with this request).
+    """
+    global _down_until
+    if not enabled():
+        raise ModelServerUnavailable("model server disabled or backing off")
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout or TIMEOUT_SECONDS)
+            try:
+                sock.connect(SOCKET_PATH)
+                send_message(sock, {"method": method, "params": params})
+            except socket.timeout as e:  # a full accept backlog, i.e. the server is stuck
+                raise OSError(f"connect timed out: {e}")
+            try:
+                response = recv_message(sock)
+            except socket.timeout:
+                raise ModelServerTimeout(f"{method}: no answer within {timeout or TIMEOUT_SECONDS}s")
+    except (OSError, ValueError) as e:  # refused/missing socket, broken framing
+        _down_until = time.monotonic() + RETRY_SECONDS
+        raise ModelServerUnavailable(f"{method}: {e}")
+
+    if not response.get("ok"):
+        raise ModelServerUnavailable(f"{method}: {response.get('error')}")
+    return response.get("result")
+
+
+# -------------------------
+# Server
+# -------------------------
+def _forecast(params: Dict) -> Dict:
+    from .ml_utils import build_forecast_payload
+    return build_forecast_payload(**params)
+
+
+def _suggestions(params: Dict):
+    from .data_cache import get_data_version
+    from .ml_suggestions_engine import load_user_data
+    from .ml import suggestions_engine
+    data_version = get_data_version(params["user_id"])  # before loading, see ml.generate_ml_suggestions
+    user_data = load_user_data(params["user_id"], params.get("permissions") or {})
+    if not user_data:
+        return []
+    return suggestions_engine().generate_ml_suggestions(params["user_id"], user_data, data_version)
+
+
+METHODS = {
+    "ping": lambda params: "pong",
+    "forecast": _forecast,
+    "suggestions": _suggestions,
+}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            request = recv_message(self.request)
+        except (OSError, ValueError) as e:
+            print("❌ Model server: bad request:", str(e))
+            return
+
+        method = METHODS.get(request.get("method"))
+        if method is None:
+            response = {"ok": False, "error": f"unknown method {request.get('method')!r}"}
+        else:
+            # the thread per connection is cheap; the CPU-heavy part is capped by the semaphore
+            with self.server.slots:
+                try:
+                    response = {"ok": True, "result": method(request.get("params") or {})}
+                except Exception as e:
+                    print(f"❌ Model server {request.get('method')} failed:", str(e))
+                    response = {"ok": False, "error": str(e)}
+        try:
+            send_message(self.request, response)
+        except OSError:
+            pass  # client gave up (timeout); nothing to report to
+
+
+class ModelServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, threads: int = THREADS):
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket from a previous run
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o660)
+        self.slots = threading.BoundedSemaphore(max(1, threads))
+
+
+def serve(path: str = None, threads: int = THREADS, log=print) -> None:
+    """Warm the ML stack, then serve until interrupted"""
+    from .ml import warm_up
+
+    path = path or SOCKET_PATH
+    if not path:
+        raise ValueError("no socket path (set MODEL_SERVER_SOCKET or pass one)")
+    timings = warm_up()
+    log(f"✅ ML stack loaded in {sum(timings.values()):.1f}s")
+
+    server = ModelServer(path, threads)
+    log(f"🔍 Model server listening on {path} ({threads} worker slot(s))")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
@@ -35,7 +35,7 @@ class Account(me.Document):
     total_balance = me.FloatField(default=0.0)
     savings_rate = me.FloatField(default=0.0)
 
-    meta = {'collection': 'accounts'}
+    meta = {'collection': 'accounts', 'indexes': ['user_id']}
 
 
 # ==========================
@@ -64,7 +64,18 @@ class Transaction(me.Document):
     date = me.DateTimeField(default=datetime.datetime.utcnow)
     is_recurring = me.BooleanField(default=False)
 
-    meta = {'collection': 'transactions'}
+    # Designed from the hot query shapes (see test_query_plans.py):
+    #   user ledger listing / date windows      -> (user_id, -date, -_id)
+    #   per-type scans and period aggregations  -> (user_id, type, date)
+    #   account listing / totals reconciliation -> (account_id, -date, -_id)
+    meta = {
+        'collection': 'transactions',
+        'indexes': [
+            ('user_id', '-date', '-id'),
+            ('user_id', 'type', 'date'),
+            ('account_id', '-date', '-id'),
+        ],
+    }
 
 
 # ==========================
@@ -81,7 +92,8 @@ class Budget(me.Document):
     toggle = me.BooleanField(default=False)
     date = me.DateTimeField(required=True)
 
-    meta = {'collection': 'budgets'}
+    # (user, account, name) serves per-user lists, per-account lists and the spend delta updates
+    meta = {'collection': 'budgets', 'indexes': [('user_id', 'account_id', 'name'), 'account_id']}
 
 
 # ==========================
@@ -107,7 +119,7 @@ class Goal(me.Document):
     created_at = me.DateTimeField(default=datetime.datetime.utcnow)
     updated_at = me.DateTimeField(default=datetime.datetime.utcnow)
 
-    meta = {"collection": "goals"}
+    meta = {"collection": "goals", "indexes": ["user_id"]}
 
 # ==========================
 # PORTFOLIO MODEL
@@ -130,7 +142,7 @@ class Portfolio(me.Document):
     purchase_date = me.DateTimeField()
     notes = me.StringField()
 
-    meta = {'collection': 'portfolios'}
+    meta = {'collection': 'portfolios', 'indexes': ['user_id']}
 
 
     @property
@@ -225,7 +237,7 @@ class SpendingAnomaly(me.Document):
     flag_reason = me.StringField()
     flagged_at = me.DateTimeField(default=datetime.datetime.utcnow)
     reviewed = me.BooleanField(default=False)
-    meta = {'collection': 'spending_anomalies'}
+    meta = {'collection': 'spending_anomalies', 'indexes': [('user_id', 'transaction_id')]}
 
 class RecurringPattern(me.Document):
     user_id = me.ReferenceField('User', required=True)
@@ -234,7 +246,9 @@ class RecurringPattern(me.Document):
     frequency = me.StringField(choices=["Weekly", "Monthly", "Irregular"])
     average_amount = me.FloatField(default=0.0)
     last_detected = me.DateTimeField(default=datetime.datetime.utcnow)
-    meta = {'collection': 'recurring_patterns'}
+    # unique: find_recurring_patterns upserts on this key, so concurrent runs can't duplicate a pattern
+    meta = {'collection': 'recurring_patterns',
+            'indexes': [{'fields': ['user_id', 'category', 'pattern'], 'unique': True}]}
 
 class IncomeSource(me.Document):
     meta = {"collection": "income_sources", "indexes": ["user_id", "start_date", "type", "name"]}
@@ -303,7 +317,11 @@ class UserPermission(Document):
     
     def save(self, *args, **kwargs):
         self.updated_at = datetime.datetime.utcnow()
-        return super().save(*args, **kwargs)
+        result = super().save(*args, **kwargs)
+        # Permissions gate what the AI engines may read, so cached snapshots must go
+        from .data_cache import bump_data_version
+        bump_data_version(self.user_id)
+        return result
     
     def get_permissions_dict(self):
         """Return permissions as a dictionary"""
@@ -324,4 +342,123 @@ class UserPermission(Document):
         self.goals_permission = permissions_dict.get('goals', False)
         self.investments_permission = permissions_dict.get('investments', False)
         self.debts_permission = permissions_dict.get('debts', False)
-        self.save()
\ No newline at end of file
+        self.save()
+
+
+class UserDataVersion(Document):
+    """Per-user counter bumped on every financial data or permission write"""
+    user_id = StringField(required=True, max_length=100, unique=True)
+    version = me.IntField(default=0)
+    updated_at = DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {'collection': 'user_data_versions'}
+
+
+class ForecastJob(Document):
+    """A forecast request run by the background worker pool (see forecast_jobs.py)"""
+    user_id = StringField(required=True, max_length=100)
+    dedup_key = StringField(required=True)
+    params = me.DictField()
+    status = StringField(default="queued", choices=["queued", "running", "done", "failed"])
+    active = BooleanField(default=True)  # queued or running; cleared when the job finishes or expires
+    result = me.DictField()
+    error = StringField()
+    created_at = DateTimeField(default=datetime.datetime.utcnow)
+    started_at = DateTimeField()
+    finished_at = DateTimeField()
+
+    meta = {
+        'collection': 'forecast_jobs',
+        'indexes': [
+            ('user_id', '-created_at'),
+            # one active job per dedup key across all workers
+            {'fields': ['dedup_key'], 'unique': True, 'partialFilterExpression': {'active': True}},
+            # finished or abandoned jobs are purged by MongoDB after a day
+            {'fields': ['created_at'], 'expireAfterSeconds': 24 * 60 * 60},
+        ],
+    }
+
+
+class FittedModel(Document):
+    """Last fitted forecast parameters per (user, series, model) — see model_registry.py"""
+    user_id = StringField(required=True, max_length=100)
+    series = StringField(required=True, choices=["income", "expense"])
+    model_type = StringField(required=True)
+    params = me.DictField()
+    fingerprint = StringField()          # hash of the training series the params were fitted on
+    train_start = DateTimeField()
+    train_end = DateTimeField()
+    n_obs = me.IntField(default=0)
+    updated_at = DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'fitted_models',
+        'indexes': [{'fields': ['user_id', 'series', 'model_type'], 'unique': True}],
+    }
+
+
+class AnomalyScanState(Document):
+    """Highest transaction _id already scanned by detect_spending_anomalies, per user"""
+    user_id = StringField(required=True, max_length=100, unique=True)
+    last_transaction_id = me.ObjectIdField()
+    last_run_at = DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {'collection': 'anomaly_scan_state'}
+
+
+class CategorySpendingStats(Document):
+    """
+    Running expense count/mean/M2 (Welford) per (user, category) — see spending_stats.py
+    One extra row per user (category spending_stats.TOTALS) holds count/total over all categories.
+    """
+    user_id = me.ObjectIdField(required=True)
+    category = StringField(required=True)
+    count = me.IntField(default=0)
+    mean = me.FloatField(default=0.0)
+    m2 = me.FloatField(default=0.0)
+    total = me.FloatField(default=0.0)  # TOTALS row only
+    updated_at = DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'category_spending_stats',
+        'indexes': [{'fields': ['user_id', 'category'], 'unique': True}],
+    }
+
+
+class MLBatchShard(Document):
+    """Checkpoint + stats of one finished shard of a run_ml_batch run — see ml_batch.py"""
+    run_id = StringField(required=True)
+    shard = me.IntField(required=True)
+    shards = me.IntField()           # shard count of the run; shard numbers only mean something under it
+    partition = StringField()        # ml_batch.partition_key: hash scheme + user selection
+    jobs = me.ListField(StringField())
+    users = me.IntField(default=0)
+    latencies = me.DictField()       # job -> [seconds per user]
+    errors = me.DictField()          # job -> error count
+    wall_seconds = me.FloatField(default=0.0)
+    finished_at = DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'ml_batch_shards',
+        'indexes': [
+            {'fields': ['run_id', 'shard'], 'unique': True},
+            {'fields': ['finished_at'], 'expireAfterSeconds': 30 * 24 * 60 * 60},
+        ],
+    }
+
+
+class ConversationState(Document):
+    """Chat context of one user for one engine (MongoContextStore) — see context_store.py"""
+    user_id = StringField(required=True, max_length=100)
+    namespace = StringField(required=True)
+    state = me.DictField()
+    expires_at = DateTimeField(required=True)
+
+    meta = {
+        'collection': 'conversation_states',
+        'indexes': [
+            {'fields': ['user_id', 'namespace'], 'unique': True},
+            # MongoDB drops the document once expires_at has passed
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ],
+    }
@@ -6,13 +6,227 @@ Handles context-aware conversations and intelligent financial queries
 import re
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Tuple
+from functools import lru_cache
+from typing import Dict, List, Any, NamedTuple, Optional, Tuple
+from django.conf import settings
 from .models import User, Account, Transaction, Budget, Goal, Portfolio, Debt, UserPermission
 from .financial_ai_engine import FinancialAIEngine
+from .intent_router import PatternRouter
+from .context_store import HISTORY_LIMIT, get_context_store
+
+# -------------------------
+# Pattern tables (priority order: the first matching entry wins)
+# -------------------------
+QUERY_INTENT_PATTERNS = [
+    ('spending_query', [
+        r'how much did i spend',
+        r'what did i spend',
+        r'spending on (.+)',
+        r'expenses for (.+)',
+        r'cost of (.+)',
+        r'money spent on (.+)'
+    ]),
+    ('income_query', [
+        r'how much did i earn',
+        r'what did i earn',
+        r'income from (.+)',
+        r'money earned',
+        r'revenue from (.+)'
+    ]),
+    ('balance_query', [
+        r'what is my balance',
+        r'current balance',
+        r'how much money do i have',
+        r'total balance',
+        r'account balance'
+    ]),
+    ('budget_query', [
+        r'budget for (.+)',
+        r'budget remaining',
+        r'budget status',
+        r'budget progress',
+        r'how much left in budget'
+    ]),
+    ('goal_query', [
+        r'goal progress',
+        r'savings goal',
+        r'how close am i to (.+)',
+        r'goal completion',
+        r'target amount'
+    ]),
+    ('debt_query', [
+        r'debt balance',
+        r'how much do i owe',
+        r'debt progress',
+        r'debt payoff',
+        r'remaining debt'
+    ]),
+    ('investment_query', [
+        r'portfolio value',
+        r'investment performance',
+        r'stock performance',
+        r'investment returns',
+        r'portfolio balance'
+    ]),
+    ('analysis_query', [
+        r'spending patterns',
+        r'financial trends',
+        r'analysis of (.+)',
+        r'insights about (.+)',
+        r'summary of (.+)'
+    ]),
+    ('prediction_query', [
+        r'predict (.+)',
+        r'forecast (.+)',
+        r'future (.+)',
+        r'what will happen',
+        r'projection for (.+)'
+    ]),
+    ('recommendation_query', [
+        r'what should i do',
+        r'how can i improve',
+        r'suggestions for (.+)',
+        r'recommendations',
+        r'advice on (.+)'
+    ]),
+]
+
+INTENT_CATEGORIES = {
+    'spending_query': 'expense',
+    'income_query': 'income',
+    'balance_query': 'balance',
+    'budget_query': 'budget',
+    'goal_query': 'goal',
+    'debt_query': 'debt',
+    'investment_query': 'investment',
+    'analysis_query': 'analysis',
+    'prediction_query': 'prediction',
+    'recommendation_query': 'recommendation',
+}
+
+TIME_REFERENCE_PATTERNS = [
+    # Direct time references
+    ('today', [r'today']),
+    ('yesterday', [r'yesterday']),
+    ('this_week', [r'this week']),
+    ('last_week', [r'last week']),
+    ('this_month', [r'this month']),
+    ('last_month', [r'last month']),
+    ('this_year', [r'this year']),
+    ('last_year', [r'last year']),
+    # Relative time references
+    ('last_3_months', [r'last 3 months', r'past 3 months']),
+    ('last_6_months', [r'last 6 months', r'past 6 months']),
+    ('last_12_months', [r'last 12 months', r'past year']),
+    # Number-based references
+    ('last_n_days', [r'last (\d+) days?']),
+    ('past_n_days', [r'past (\d+) days?']),
+    ('n_months_ago', [r'(\d+) months? ago']),
+]
+
+TIME_PERIODS = {
+    'today': {'period': 'today', 'days': 1},
+    'yesterday': {'period': 'yesterday', 'days': 1, 'offset': 1},
+    'this_week': {'period': 'this_week', 'days': 7},
+    'last_week': {'period': 'last_week', 'days': 7, 'offset': 7},
+    'this_month': {'period': 'this_month', 'days': 30},
+    'last_month': {'period': 'last_month', 'days': 30, 'offset': 30},
+    'this_year': {'period': 'this_year', 'days': 365},
+    'last_year': {'period': 'last_year', 'days': 365, 'offset': 365},
+    'last_3_months': {'period': 'last_3_months', 'days': 90},
+    'last_6_months': {'period': 'last_6_months', 'days': 180},
+    'last_12_months': {'period': 'last_12_months', 'days': 365},
+}
+
+FOLLOW_UP_PATTERNS = [
+    ('time_extension', [
+        r'what about (.+)',
+        r'how about (.+)',
+        r'and (.+)',
+        r'also (.+)',
+        r'(.+) too',
+        r'(.+) as well'
+    ]),
+    ('comparison', [
+        r'compare (.+)',
+        r'difference between (.+)',
+        r'vs (.+)',
+        r'versus (.+)'
+    ]),
+    ('clarification', [
+        r'what do you mean',
+        r'explain (.+)',
+        r'tell me more about (.+)',
+        r'can you elaborate'
+    ]),
+    ('action_request', [
+        r'how can i (.+)',
+        r'what should i do',
+        r'suggest (.+)',
+        r'recommend (.+)',
+        r'help me (.+)'
+    ]),
+]
+
+# all three tables compiled once; one scan per distinct query
+QUERY_MATCHER = PatternRouter({
+    'intent': QUERY_INTENT_PATTERNS,
+    'time': TIME_REFERENCE_PATTERNS,
+    'follow_up': FOLLOW_UP_PATTERNS,
+})
+
+
+class QueryAnalysis(NamedTuple):
+    intent: str
+    category: str
+    entity: Optional[str]             # capture of the winning intent pattern, e.g. "groceries"
+    time_reference: Optional[Tuple]   # (TIME_REFERENCE_PATTERNS label, captured number) or None
+    follow_up_intent: str
+
+
+# longer queries are cut before matching/caching: the scan is superlinear on long repetitive input
+# and chat bodies are unauthenticated, so both the work and the memo keys must stay bounded
+MAX_QUERY_CHARS = getattr(settings, 'NL_QUERY_MAX_CHARS', 500)
+
+
+def parse_query(query: str) -> QueryAnalysis:
+    """analyze_query() on the lower-cased query, truncated to MAX_QUERY_CHARS"""
+    return analyze_query(query[:MAX_QUERY_CHARS].lower())
+
+
+@lru_cache(maxsize=getattr(settings, 'NL_QUERY_CACHE_SIZE', 4096))
+def analyze_query(query_lower: str) -> QueryAnalysis:
+    """Context-free parse of a lower-cased query; memoised since the same questions repeat a lot"""
+    hits = QUERY_MATCHER.match(query_lower)
+    intent, entity = hits['intent']
+    time_label, time_value = hits['time']
+    return QueryAnalysis(
+        intent=intent or 'general_query',
+        category=INTENT_CATEGORIES.get(intent, 'general'),
+        entity=entity,
+        time_reference=(time_label, time_value) if time_label else None,
+        follow_up_intent=hits['follow_up'][0] or 'new_query',
+    )
+
+
+def time_period_info(label: str, value: Optional[str]) -> Dict[str, Any]:
+    """Fresh time-period dict for a TIME_REFERENCE_PATTERNS label"""
+    if label in TIME_PERIODS:
+        return dict(TIME_PERIODS[label])
+    n = int(value)
+    if label == 'last_n_days':
+        return {'period': f'last_{n}_days', 'days': n}
+    if label == 'past_n_days':
+        return {'period': f'past_{n}_days', 'days': n}
+    return {'period': f'{n}_months_ago', 'days': n * 30, 'offset': n * 30}
+
 
 class ConversationContext:
     """Maintains conversation context and history"""
     
+    FIELDS = ('conversation_history', 'current_topic', 'last_query_type', 'last_time_period',
+              'last_category', 'last_amount', 'follow_up_intent')
+    
     def __init__(self, user_id: str):
         self.user_id = user_id
         self.conversation_history = []
@@ -32,9 +246,20 @@ class ConversationContext:
             'query_type': query_type
         })
         
-        # Keep only last 10 interactions to manage context size
-        if len(self.conversation_history) > 10:
-            self.conversation_history = self.conversation_history[-10:]
+        # Keep only the last few interactions to manage context size
+        if len(self.conversation_history) > HISTORY_LIMIT:
+            self.conversation_history = self.conversation_history[-HISTORY_LIMIT:]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+    
+    @classmethod
+    def from_dict(cls, user_id: str, state: Dict[str, Any]) -> 'ConversationContext':
+        context = cls(user_id)
+        for field in cls.FIELDS:
+            if field in state:
+                setattr(context, field, state[field])
+        return context
     
     def get_context_summary(self) -> str:
         """Get a summary of recent conversation context"""
@@ -53,59 +278,28 @@ class ConversationContext:
 class NaturalLanguageEngine:
     """Enhanced natural language processing for financial queries"""
     
-    def __init__(self):
-        self.ai_engine = FinancialAIEngine()
-        self.conversation_contexts = {}  # user_id -> ConversationContext
+    CONTEXT_NAMESPACE = "nl"
+    
+    def __init__(self, context_store=None):
+        # contexts live in the shared store, so every view (and, with the mongo backend, every worker) sees them
+        self.context_store = context_store or get_context_store()
+        self.ai_engine = FinancialAIEngine(self.context_store)
         
     def _get_or_create_context(self, user_id: str) -> ConversationContext:
         """Get or create conversation context for user"""
-        if user_id not in self.conversation_contexts:
-            self.conversation_contexts[user_id] = ConversationContext(user_id)
-        return self.conversation_contexts[user_id]
+        state = self.context_store.get(self.CONTEXT_NAMESPACE, user_id)
+        if state is None:
+            return ConversationContext(user_id)
+        return ConversationContext.from_dict(user_id, state)
+    
+    def _save_context(self, context: ConversationContext) -> None:
+        self.context_store.put(self.CONTEXT_NAMESPACE, context.user_id, context.to_dict())
     
     def _parse_time_references(self, query: str, context: ConversationContext) -> Dict[str, Any]:
         """Parse time references in natural language"""
-        query_lower = query.lower()
-        
-        # Direct time references
-        if 'today' in query_lower:
-            return {'period': 'today', 'days': 1}
-        elif 'yesterday' in query_lower:
-            return {'period': 'yesterday', 'days': 1, 'offset': 1}
-        elif 'this week' in query_lower:
-            return {'period': 'this_week', 'days': 7}
-        elif 'last week' in query_lower:
-            return {'period': 'last_week', 'days': 7, 'offset': 7}
-        elif 'this month' in query_lower:
-            return {'period': 'this_month', 'days': 30}
-        elif 'last month' in query_lower:
-            return {'period': 'last_month', 'days': 30, 'offset': 30}
-        elif 'this year' in query_lower:
-            return {'period': 'this_year', 'days': 365}
-        elif 'last year' in query_lower:
-            return {'period': 'last_year', 'days': 365, 'offset': 365}
-        
-        # Relative time references
-        elif 'last 3 months' in query_lower or 'past 3 months' in query_lower:
-            return {'period': 'last_3_months', 'days': 90}
-        elif 'last 6 months' in query_lower or 'past 6 months' in query_lower:
-            return {'period': 'last_6_months', 'days': 180}
-        elif 'last 12 months' in query_lower or 'past year' in query_lower:
-            return {'period': 'last_12_months', 'days': 365}
-        
-        # Number-based references
-        elif re.search(r'last (\d+) days?', query_lower):
-            match = re.search(r'last (\d+) days?', query_lower)
-            days = int(match.group(1))
-            return {'period': f'last_{days}_days', 'days': days}
-        elif re.search(r'past (\d+) days?', query_lower):
-            match = re.search(r'past (\d+) days?', query_lower)
-            days = int(match.group(1))
-            return {'period': f'past_{days}_days', 'days': days}
-        elif re.search(r'(\d+) months? ago', query_lower):
-            match = re.search(r'(\d+) months? ago', query_lower)
-            months = int(match.group(1))
-            return {'period': f'{months}_months_ago', 'days': months * 30, 'offset': months * 30}
+        time_reference = parse_query(query).time_reference
+        if time_reference:
+            return time_period_info(*time_reference)
         
         # Use context if no specific time mentioned
         elif context.last_time_period:
@@ -116,164 +310,15 @@ class NaturalLanguageEngine:
     
     def _parse_follow_up_intent(self, query: str, context: ConversationContext) -> str:
         """Detect follow-up intent based on context"""
-        query_lower = query.lower()
-        
-        # Follow-up patterns
-        follow_up_patterns = {
-            'time_extension': [
-                r'what about (.+)',
-                r'how about (.+)',
-                r'and (.+)',
-                r'also (.+)',
-                r'(.+) too',
-                r'(.+) as well'
-            ],
-            'comparison': [
-                r'compare (.+)',
-                r'difference between (.+)',
-                r'vs (.+)',
-                r'versus (.+)'
-            ],
-            'clarification': [
-                r'what do you mean',
-                r'explain (.+)',
-                r'tell me more about (.+)',
-                r'can you elaborate'
-            ],
-            'action_request': [
-                r'how can i (.+)',
-                r'what should i do',
-                r'suggest (.+)',
-                r'recommend (.+)',
-                r'help me (.+)'
-            ]
-        }
-        
-        for intent, patterns in follow_up_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, query_lower):
-                    return intent
-        
-        return 'new_query'
+        return parse_query(query).follow_up_intent
     
     def _extract_query_intent(self, query: str) -> Dict[str, Any]:
         """Extract intent and entities from natural language query"""
-        query_lower = query.lower()
-        
-        # Spending queries
-        spending_patterns = [
-            r'how much did i spend',
-            r'what did i spend',
-            r'spending on (.+)',
-            r'expenses for (.+)',
-            r'cost of (.+)',
-            r'money spent on (.+)'
-        ]
-        
-        # Income queries
-        income_patterns = [
-            r'how much did i earn',
-            r'what did i earn',
-            r'income from (.+)',
-            r'money earned',
-            r'revenue from (.+)'
-        ]
-        
-        # Balance queries
-        balance_patterns = [
-            r'what is my balance',
-            r'current balance',
-            r'how much money do i have',
-            r'total balance',
-            r'account balance'
-        ]
-        
-        # Budget queries
-        budget_patterns = [
-            r'budget for (.+)',
-            r'budget remaining',
-            r'budget status',
-            r'budget progress',
-            r'how much left in budget'
-        ]
-        
-        # Goal queries
-        goal_patterns = [
-            r'goal progress',
-            r'savings goal',
-            r'how close am i to (.+)',
-            r'goal completion',
-            r'target amount'
-        ]
-        
-        # Debt queries
-        debt_patterns = [
-            r'debt balance',
-            r'how much do i owe',
-            r'debt progress',
-            r'debt payoff',
-            r'remaining debt'
-        ]
-        
-        # Investment queries
-        investment_patterns = [
-            r'portfolio value',
-            r'investment performance',
-            r'stock performance',
-            r'investment returns',
-            r'portfolio balance'
-        ]
-        
-        # Analysis queries
-        analysis_patterns = [
-            r'spending patterns',
-            r'financial trends',
-            r'analysis of (.+)',
-            r'insights about (.+)',
-            r'summary of (.+)'
-        ]
-        
-        # Prediction queries
-        prediction_patterns = [
-            r'predict (.+)',
-            r'forecast (.+)',
-            r'future (.+)',
-            r'what will happen',
-            r'projection for (.+)'
-        ]
-        
-        # Recommendation queries
-        recommendation_patterns = [
-            r'what should i do',
-            r'how can i improve',
-            r'suggestions for (.+)',
-            r'recommendations',
-            r'advice on (.+)'
-        ]
-        
-        # Match patterns
-        if any(re.search(pattern, query_lower) for pattern in spending_patterns):
-            return {'intent': 'spending_query', 'category': 'expense'}
-        elif any(re.search(pattern, query_lower) for pattern in income_patterns):
-            return {'intent': 'income_query', 'category': 'income'}
-        elif any(re.search(pattern, query_lower) for pattern in balance_patterns):
-            return {'intent': 'balance_query', 'category': 'balance'}
-        elif any(re.search(pattern, query_lower) for pattern in budget_patterns):
-            return {'intent': 'budget_query', 'category': 'budget'}
-        elif any(re.search(pattern, query_lower) for pattern in goal_patterns):
-            return {'intent': 'goal_query', 'category': 'goal'}
-        elif any(re.search(pattern, query_lower) for pattern in debt_patterns):
-            return {'intent': 'debt_query', 'category': 'debt'}
-        elif any(re.search(pattern, query_lower) for pattern in investment_patterns):
-            return {'intent': 'investment_query', 'category': 'investment'}
-        elif any(re.search(pattern, query_lower) for pattern in analysis_patterns):
-            return {'intent': 'analysis_query', 'category': 'analysis'}
-        elif any(re.search(pattern, query_lower) for pattern in prediction_patterns):
-            return {'intent': 'prediction_query', 'category': 'prediction'}
-        elif any(re.search(pattern, query_lower) for pattern in recommendation_patterns):
-            return {'intent': 'recommendation_query', 'category': 'recommendation'}
-        else:
-            return {'intent': 'general_query', 'category': 'general'}
+        analysis = parse_query(query)
+        result = {'intent': analysis.intent, 'category': analysis.category}
+        if analysis.entity:
+            result['entity'] = analysis.entity.strip()
+        return result
     
     def _generate_contextual_response(self, query: str, context: ConversationContext, 
                                     query_intent: Dict[str, Any], time_info: Dict[str, Any]) -> str:
@@ -410,6 +455,7 @@ class NaturalLanguageEngine:
             
             # Add to conversation history
             context.add_interaction(query, ai_result['response'], query_intent.get('intent'))
+            self._save_context(context)
             
             return {
                 'response': ai_result['response'],
@@ -485,8 +531,7 @@ class NaturalLanguageEngine:
         return context.conversation_history
     
     def clear_conversation_history(self, user_id: str) -> bool:
-        """Clear conversation history for user"""
-        if user_id in self.conversation_contexts:
-            self.conversation_contexts[user_id] = ConversationContext(user_id)
-            return True
-        return False
+        """Clear conversation history for user (including the wrapped FinancialAIEngine's follow-up context)"""
+        cleared = self.context_store.delete(self.CONTEXT_NAMESPACE, user_id)
+        cleared_ai = self.context_store.delete(self.ai_engine.CONTEXT_NAMESPACE, user_id)
+        return cleared or cleared_ai
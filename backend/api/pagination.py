@@ -0,0 +1,121 @@
+"""
+Keyset pagination and NDJSON streaming for ledger list endpoints
+Pages walk the (user_id|account_id, -date, -_id) indexes so cost stays flat however deep the cursor is
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from django.http import StreamingHttpResponse
+from mongoengine.queryset.visitor import Q
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+
+# -------------------------
+# Cursors
+# -------------------------
+def encode_cursor(date: datetime, oid) -> str:
+    raw = f"{date.isoformat()}|{oid}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Returns (date, ObjectId); raises ValueError on anything malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_part, oid_part = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(date_part), ObjectId(oid_part)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+# -------------------------
+# Request parameters
+# -------------------------
+def _parse_date(value: str, end_of_day: bool = False) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if end_of_day and len(value) == 10:  # plain YYYY-MM-DD means the whole day
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return parsed
+
+
+def transaction_filters(params) -> dict:
+    """start_date / end_date / type / category query params -> mongoengine filter kwargs"""
+    filters = {}
+    if params.get("start_date"):
+        filters["date__gte"] = _parse_date(params["start_date"])
+    if params.get("end_date"):
+        filters["date__lte"] = _parse_date(params["end_date"], end_of_day=True)
+    if params.get("type"):
+        filters["type"] = params["type"]
+    if params.get("category"):
+        categories = [c for c in params["category"].split(",") if c]
+        if len(categories) > 1:
+            filters["category__in"] = categories
+        elif categories:
+            filters["category"] = categories[0]
+    return filters
+
+
+def wants_pagination(params) -> bool:
+    """Legacy clients get the full list; any paging/streaming param opts in"""
+    return any(params.get(key) for key in ("limit", "after", "stream"))
+
+
+def page_size(params) -> int:
+    try:
+        limit = int(params.get("limit") or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+# -------------------------
+# Paging / streaming
+# -------------------------
+def keyset_page(queryset, limit: int, after: str = None):
+    """
+    Newest-first page of `queryset` after the given cursor.
+    returns: (documents, next_cursor or None)
+    """
+    queryset = queryset.order_by("-date", "-id")
+    if after:
+        date, oid = decode_cursor(after)
+        queryset = queryset.filter(Q(date__lt=date) | (Q(date=date) & Q(id__lt=oid)))
+
+    rows = list(queryset.limit(limit + 1))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+    return rows, next_cursor
+
+
+def stream_ndjson(queryset, serialize, clean=None):
+    """
+    One JSON document per line, read from a server-side cursor in batches.
+    `clean` may drop rows per batch (e.g. orphans) before they are serialized.
+    """
+    def rows():
+        batch = []
+        for doc in queryset.order_by("-date", "-id").no_cache().batch_size(STREAM_BATCH_SIZE):
+            batch.append(doc)
+            if len(batch) >= STREAM_BATCH_SIZE:
+                yield from _dump(batch)
+                batch = []
+        if batch:
+            yield from _dump(batch)
+
+    def _dump(batch):
+        for doc in (clean(batch) if clean else batch):
+            yield json.dumps(serialize(doc), default=str) + "\n"
+
+    return StreamingHttpResponse(rows(), content_type="application/x-ndjson")
@@ -1,19 +1,15 @@
 from sklearn.linear_model import LinearRegression
-from collections import defaultdict
 from datetime import datetime
 
 
-from api.models import Transaction, MLPrediction
+from api.models import MLPrediction
+from api.ledger import load_ledger
 
 
-def predict_salary(user_id):
-    transactions = Transaction.objects(user_id=user_id, type="income")
-    monthly_totals = defaultdict(float)
-
-    for tx in transactions:
-        if tx.date:
-            key = tx.date.strftime("%Y-%m")
-            monthly_totals[key] += tx.amount
+def predict_salary(user_id, ledger=None):
+    if ledger is None:
+        ledger = load_ledger(user_id)
+    monthly_totals = ledger.monthly_totals("income")
 
     months = sorted(monthly_totals.keys())
     y = [monthly_totals[m] for m in months]
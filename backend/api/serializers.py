@@ -1,10 +1,13 @@
 import datetime
 from rest_framework import serializers
 from bson import ObjectId
+from pymongo import UpdateMany, UpdateOne
 from .models import (
     Review, User, Transaction, Budget, Account,
     Goal, Portfolio, ContactMessage
 )
+from .data_cache import bump_data_version
+from .spending_stats import flag_transaction, update_category_stats
 
 # -------------------------
 # ✅ Common Helper
@@ -15,6 +18,13 @@ def update_instance(instance, validated_data):
     instance.save()
     return instance
 
+
+class ReferenceIdField(serializers.CharField):
+    """Id string of a reference, whether it arrives as a Document, DBRef or ObjectId"""
+
+    def to_representation(self, value):
+        return str(getattr(value, "id", value))
+
 # =======================
 # AUTH SERIALIZERS
 # =======================
@@ -57,61 +67,204 @@ class AccountSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         validated_data['user_id'] = User.objects.get(id=ObjectId(validated_data['user_id']))
-        return Account(**validated_data).save()
+        account = Account(**validated_data).save()
+        bump_data_version(account.user_id)
+        return account
 
     def update(self, instance, validated_data):
         if 'user_id' in validated_data:
             validated_data['user_id'] = User.objects.get(id=ObjectId(validated_data['user_id']))
-        return update_instance(instance, validated_data)
+        instance = update_instance(instance, validated_data)
+        bump_data_version(instance.user_id)
+        return instance
 
 
 # =======================
 # TRANSACTION SERIALIZER
 # =======================
 
-def update_account_totals(account):
-    transactions = Transaction.objects(account_id=account)
-    total_income = sum(t.amount for t in transactions if t.type == "income")
-    total_expenses = sum(t.amount for t in transactions if t.type == "expense")
-    balance = account.total_balance + total_income - total_expenses
-    savings_rate = (balance / total_income * 100) if total_income > 0 else 0.0
-    account.total_income = total_income
-    account.total_expenses = total_expenses
-    account.total_balance = balance
-    account.savings_rate = round(savings_rate, 2)
-    account.save()
-
-def update_matching_budgets(transaction):
+def transaction_state(tx):
+    """Raw snapshot of the fields that feed account totals and budgets (no dereferencing)"""
+    if tx is None:
+        return None
+    raw = tx.to_mongo()
+    return {
+        "user_id": raw.get("user_id"),
+        "account_id": raw.get("account_id"),
+        "type": raw.get("type"),
+        "amount": float(raw.get("amount") or 0),
+        "category": raw.get("category"),
+    }
+
+
+# savings_rate = balance / income * 100, evaluated server-side after the totals move
+_SAVINGS_RATE_EXPR = {
+    "$cond": [
+        {"$gt": ["$total_income", 0]},
+        {"$round": [{"$multiply": [{"$divide": ["$total_balance", "$total_income"]}, 100]}, 2]},
+        0.0,
+    ]
+}
+
+
+def apply_account_delta(account_id, income_delta=0.0, expense_delta=0.0):
+    """Atomically shift an account's totals by the given deltas and refresh its savings rate"""
+    if not income_delta and not expense_delta:
+        return
+    Account._get_collection().update_one(
+        {"_id": account_id},
+        [
+            {"$set": {
+                "total_income": {"$add": [{"$ifNull": ["$total_income", 0.0]}, income_delta]},
+                "total_expenses": {"$add": [{"$ifNull": ["$total_expenses", 0.0]}, expense_delta]},
+                "total_balance": {"$add": [{"$ifNull": ["$total_balance", 0.0]}, income_delta - expense_delta]},
+            }},
+            {"$set": {"savings_rate": _SAVINGS_RATE_EXPR}},
+        ],
+    )
+
+
+def update_account_totals(before=None, after=None):
+    """
+    Move account totals from the `before` to the `after` transaction state.
+    Create: (None, new). Edit: (old, new). Delete: (old, None).
+    Cost is O(1) per write regardless of how many transactions the account holds.
+    """
+    deltas = {}
+    for state, sign in ((before, -1.0), (after, 1.0)):
+        if not state or state["type"] not in ("income", "expense"):
+            continue
+        income_delta, expense_delta = deltas.get(state["account_id"], (0.0, 0.0))
+        if state["type"] == "income":
+            income_delta += sign * state["amount"]
+        else:
+            expense_delta += sign * state["amount"]
+        deltas[state["account_id"]] = (income_delta, expense_delta)
+
+    for account_id, (income_delta, expense_delta) in deltas.items():
+        apply_account_delta(account_id, income_delta, expense_delta)
+
+
+def reconcile_account_totals(account_ids=None, fix=True, tolerance=0.01):
+    """
+    Recompute income/expense totals from scratch with one aggregation and report drift.
+    The opening balance is not stored, so it is inferred from the current totals
+    (balance - income + expenses) and carried over to the corrected balance.
+    """
+    match = {"account_id": {"$in": list(account_ids)}} if account_ids is not None else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": {"account": "$account_id", "type": "$type"}, "total": {"$sum": "$amount"}}},
+    ]
+    actual = {}
+    for row in Transaction._get_collection().aggregate(pipeline):
+        income, expenses = actual.get(row["_id"]["account"], (0.0, 0.0))
+        if row["_id"]["type"] == "income":
+            income = float(row["total"])
+        elif row["_id"]["type"] == "expense":
+            expenses = float(row["total"])
+        actual[row["_id"]["account"]] = (income, expenses)
+
+    query = {"_id": {"$in": list(account_ids)}} if account_ids is not None else {}
+    fields = {"user_id": 1, "total_income": 1, "total_expenses": 1, "total_balance": 1, "savings_rate": 1}
+    drifted = []
+    for acc in Account._get_collection().find(query, fields):
+        stored_income = float(acc.get("total_income") or 0)
+        stored_expenses = float(acc.get("total_expenses") or 0)
+        stored_balance = float(acc.get("total_balance") or 0)
+        income, expenses = actual.get(acc["_id"], (0.0, 0.0))
+        opening = stored_balance - stored_income + stored_expenses
+        balance = opening + income - expenses
+        savings_rate = round(balance / income * 100, 2) if income > 0 else 0.0
+
+        drift = {
+            "total_income": income - stored_income,
+            "total_expenses": expenses - stored_expenses,
+            "total_balance": balance - stored_balance,
+            "savings_rate": savings_rate - float(acc.get("savings_rate") or 0),
+        }
+        if all(abs(v) <= tolerance for v in drift.values()):
+            continue
+
+        drifted.append({"account_id": str(acc["_id"]), "drift": drift})
+        if fix:
+            Account._get_collection().update_one({"_id": acc["_id"]}, {"$set": {
+                "total_income": income,
+                "total_expenses": expenses,
+                "total_balance": balance,
+                "savings_rate": savings_rate,
+            }})
+            bump_data_version(acc.get("user_id"))
+    return drifted
+
+
+# remaining/toggle follow spent; applied after every change to spent
+_BUDGET_STATUS_STAGE = {"$set": {
+    "remaining": {"$subtract": ["$limit", "$spent"]},
+    "toggle": {"$gte": ["$spent", "$limit"]},
+}}
+
+
+def update_matching_budgets(before=None, after=None):
+    """
+    Move `spent` on budgets matching (user, account, category) by the expense delta
+    between the `before` and `after` transaction states, in one bulk write.
+    """
     try:
-        user = transaction.user_id
-        account = transaction.account_id
-        category = transaction.category
-        matching_budgets = Budget.objects(
-            user_id=user,
-            account_id=account,
-            name=category
-        )
-        for budget in matching_budgets:
-            total_spent = sum(
-                t.amount for t in Transaction.objects(
-                    user_id=user,
-                    account_id=account,
-                    category=category,
-                    type="expense"
-                )
+        deltas = {}
+        for state, sign in ((before, -1.0), (after, 1.0)):
+            if not state or state["type"] != "expense":
+                continue
+            key = (state["user_id"], state["account_id"], state["category"])
+            deltas[key] = deltas.get(key, 0.0) + sign * state["amount"]
+
+        ops = [
+            UpdateMany(
+                {"user_id": user, "account_id": account, "name": category},
+                [
+                    {"$set": {"spent": {"$add": [{"$ifNull": ["$spent", 0.0]}, delta]}}},
+                    _BUDGET_STATUS_STAGE,
+                ],
             )
-            budget.spent = total_spent
-            budget.remaining = budget.limit - total_spent
-            budget.toggle = total_spent >= budget.limit
-            budget.save()
+            for (user, account, category), delta in deltas.items() if delta
+        ]
+        if ops:
+            Budget._get_collection().bulk_write(ops, ordered=False)
     except Exception as e:
         print("❌ Budget update failed:", str(e))
 
 
+def recompute_budgets_for_user(user_id):
+    """Rebuild spent/remaining/toggle for all of a user's budgets from one aggregation"""
+    user_oid = ObjectId(str(getattr(user_id, "id", user_id)))
+    pipeline = [
+        {"$match": {"user_id": user_oid, "type": "expense"}},
+        {"$group": {"_id": {"account": "$account_id", "category": "$category"}, "spent": {"$sum": "$amount"}}},
+    ]
+    spent_by_key = {
+        (row["_id"]["account"], row["_id"]["category"]): float(row["spent"])
+        for row in Transaction._get_collection().aggregate(pipeline)
+    }
+
+    ops = []
+    for budget in Budget._get_collection().find({"user_id": user_oid}, {"account_id": 1, "name": 1, "limit": 1}):
+        spent = spent_by_key.get((budget.get("account_id"), budget.get("name")), 0.0)
+        limit = float(budget.get("limit") or 0)
+        ops.append(UpdateOne({"_id": budget["_id"]}, {"$set": {
+            "spent": spent,
+            "remaining": limit - spent,
+            "toggle": spent >= limit,
+        }}))
+    if ops:
+        Budget._get_collection().bulk_write(ops, ordered=False)
+        bump_data_version(user_oid)
+    return len(ops)
+
+
 class TransactionSerializer(serializers.Serializer):
     id = serializers.CharField(read_only=True)
-    user_id = serializers.CharField()
-    account_id = serializers.CharField()
+    user_id = ReferenceIdField()
+    account_id = ReferenceIdField()
     type = serializers.ChoiceField(choices=["income", "expense"])
     amount = serializers.FloatField()
     category = serializers.CharField()
@@ -123,8 +276,12 @@ class TransactionSerializer(serializers.Serializer):
         validated_data['user_id'] = User.objects.get(id=validated_data['user_id'])
         validated_data['account_id'] = Account.objects.get(id=validated_data['account_id'])
         tx = Transaction(**validated_data).save()
-        update_account_totals(tx.account_id)
-        update_matching_budgets(tx)
+        state = transaction_state(tx)
+        update_account_totals(after=state)
+        update_matching_budgets(after=state)
+        update_category_stats(after=state)
+        flag_transaction(tx.id, state)
+        bump_data_version(tx.user_id)
         return tx
 
     def update(self, instance, validated_data):
@@ -132,9 +289,14 @@ class TransactionSerializer(serializers.Serializer):
             validated_data['user_id'] = User.objects.get(id=validated_data['user_id'])
         if 'account_id' in validated_data:
             validated_data['account_id'] = Account.objects.get(id=validated_data['account_id'])
+        before = transaction_state(instance)
         instance = update_instance(instance, validated_data)
-        update_account_totals(instance.account_id)
-        update_matching_budgets(instance)
+        after = transaction_state(instance)
+        update_account_totals(before, after)
+        update_matching_budgets(before, after)
+        update_category_stats(before, after)
+        flag_transaction(instance.id, after, check_existing=True)
+        bump_data_version(instance.user_id)
         return instance
 
 
@@ -161,7 +323,9 @@ class BudgetSerializer(serializers.Serializer):
             validated_data['remaining'] = validated_data['limit'] - validated_data.get('spent', 0)
         if 'toggle' not in validated_data:
             validated_data['toggle'] = validated_data['spent'] >= validated_data['limit']
-        return Budget(**validated_data).save()
+        budget = Budget(**validated_data).save()
+        bump_data_version(budget.user_id)
+        return budget
 
     def update(self, instance, validated_data):
         if 'user_id' in validated_data:
@@ -177,6 +341,7 @@ class BudgetSerializer(serializers.Serializer):
             instance.remaining = instance.limit - instance.spent
             instance.toggle = instance.spent >= instance.limit
         instance.save()
+        bump_data_version(instance.user_id)
         return instance
 
 
@@ -273,7 +438,9 @@ class GoalSerializer(serializers.Serializer):
         validated_data["status"] = (
             "Completed" if validated_data["current_amount"] >= validated_data["target_amount"] else "In Progress"
         )
-        return Goal(**validated_data).save()
+        goal = Goal(**validated_data).save()
+        bump_data_version(goal.user_id)
+        return goal
 
     # ------------------
     # UPDATE
@@ -294,6 +461,7 @@ class GoalSerializer(serializers.Serializer):
 
         instance.status = "Completed" if instance.current_amount >= instance.target_amount else "In Progress"
         instance.save()
+        bump_data_version(instance.user_id)
         return instance
 
     # ------------------
@@ -338,7 +506,9 @@ class PortfolioSerializer(serializers.Serializer):
             validated_data['user_id'] = User.objects.get(id=ObjectId(validated_data['user_id']))
         except User.DoesNotExist:
             raise serializers.ValidationError({"user_id": "User not found"})
-        return Portfolio(**validated_data).save()
+        portfolio = Portfolio(**validated_data).save()
+        bump_data_version(portfolio.user_id)
+        return portfolio
 
     def update(self, instance, validated_data):
         if 'user_id' in validated_data:
@@ -352,6 +522,7 @@ class PortfolioSerializer(serializers.Serializer):
 
         instance.updated_at = datetime.datetime.utcnow()
         instance.save()
+        bump_data_version(instance.user_id)
         return instance
 
     def to_representation(self, instance):
@@ -432,6 +603,7 @@ class DebtSerializer(serializers.Serializer):
             color=validated_data.get("color") or "from-gray-400 to-gray-500",
         )
         debt.save()
+        bump_data_version(user)
         return debt
 
     def update(self, instance, validated_data):
@@ -449,6 +621,7 @@ class DebtSerializer(serializers.Serializer):
             if f in validated_data:
                 setattr(instance, f, validated_data[f])
         instance.save()
+        bump_data_version(instance.user_id)
         return instance
 
 
@@ -539,6 +712,9 @@ class SpendingAnomalySerializer(serializers.Serializer):
         try:
             from .serializers import TransactionSerializer
             txn = obj.transaction_id
+            if txn is not None and not isinstance(txn, Transaction):
+                # anomalies bulk-inserted by the scan / insert-time flagging hold the raw ObjectId (or a DBRef)
+                txn = Transaction.objects(id=getattr(txn, "id", txn)).first()
             return TransactionSerializer(txn).data if txn else None
         except Exception:
             return None
@@ -0,0 +1,226 @@
+"""
+Online per-category spending statistics
+Running count/mean/M2 (Welford) per (user, category), moved on every transaction write so new expenses are scored at insert time
+"""
+
+import math
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.conf import settings
+from pymongo import DeleteMany, ReplaceOne, UpdateOne
+
+from .aggregations import _user_oid, category_amount_stats
+from .models import CategorySpendingStats, SpendingAnomaly
+
+ENABLED = getattr(settings, "SPENDING_STATS_ENABLED", True)
+
+# same thresholds as the batch scan in ml_utils.detect_spending_anomalies
+Z_THRESHOLD = 2.0
+RATIO_THRESHOLD = 1.6
+
+# category of the per-user row holding count/total over every category (for the overall mean)
+TOTALS = "__all__"
+
+
+# -------------------------
+# Scoring (shared with the batch scan)
+# -------------------------
+def score_amount(amount: float, mean: float, std: float, overall_mean: float) -> Optional[Tuple[float, str]]:
+    """(anomaly_score, flag_reason) when `amount` is an outlier for its category, else None"""
+    z_like = 0 if std == 0 else (amount - mean) / std
+    ratio = (amount / mean) if mean > 0 else 0
+    overall_threshold = overall_mean * RATIO_THRESHOLD if overall_mean > 0 else float("inf")
+
+    if not ((std > 0 and z_like >= Z_THRESHOLD) or amount >= overall_threshold or ratio >= RATIO_THRESHOLD):
+        return None
+
+    reason_parts = []
+    if std > 0 and z_like >= Z_THRESHOLD:
+        reason_parts.append(f"z≈{round(z_like,2)}")
+    if ratio >= RATIO_THRESHOLD and mean > 0:
+        reason_parts.append(f"{round(ratio,2)}x category avg")
+    if amount >= overall_threshold and overall_mean > 0:
+        reason_parts.append(">1.6x overall avg")
+    score = float(max(ratio, z_like if std > 0 else 0))
+    return score, "; ".join(reason_parts) or "High deviation"
+
+
+# -------------------------
+# Welford updates (server-side, atomic per document)
+# -------------------------
+_N = {"$ifNull": ["$count", 0]}
+_MEAN = {"$ifNull": ["$mean", 0.0]}
+_M2 = {"$ifNull": ["$m2", 0.0]}
+
+
+def _add_stage(x: float, now: datetime):
+    new_mean = {"$add": [_MEAN, {"$divide": [{"$subtract": [x, _MEAN]}, {"$add": [_N, 1]}]}]}
+    return [{"$set": {
+        "count": {"$add": [_N, 1]},
+        "mean": new_mean,
+        "m2": {"$add": [_M2, {"$multiply": [{"$subtract": [x, _MEAN]}, {"$subtract": [x, new_mean]}]}]},
+        "updated_at": now,
+    }}]
+
+
+def _remove_stage(x: float, now: datetime):
+    # inverse Welford step; a category emptied back to zero rows resets to 0/0/0
+    n = {"$subtract": [_N, 1]}
+    new_mean = {"$cond": [
+        {"$gt": [n, 0]},
+        {"$divide": [{"$subtract": [{"$multiply": [_N, _MEAN]}, x]}, n]},
+        0.0,
+    ]}
+    new_m2 = {"$cond": [
+        {"$gt": [n, 0]},
+        {"$max": [0.0, {"$subtract": [_M2, {"$multiply": [{"$subtract": [x, new_mean]}, {"$subtract": [x, _MEAN]}]}]}]},
+        0.0,
+    ]}
+    return [{"$set": {
+        "count": {"$max": [0, n]},
+        "mean": new_mean,
+        "m2": new_m2,
+        "updated_at": now,
+    }}]
+
+
+def update_category_stats(before=None, after=None) -> None:
+    """
+    Move the running stats from the `before` to the `after` transaction state
+    (same states as serializers.transaction_state). Only expenses are tracked.
+    Each state touches its category row and the user's TOTALS row, all in one bulk write.
+    Users without a TOTALS row yet are backfilled from one aggregation instead.
+    """
+    if not ENABLED:
+        return
+    try:
+        states = [(s, sign) for s, sign in ((before, -1), (after, 1)) if s and s["type"] == "expense"]
+        if not states:
+            return
+
+        coll = CategorySpendingStats._get_collection()
+        user_oid = _user_oid(states[-1][0]["user_id"])
+        if coll.find_one({"user_id": user_oid, "category": TOTALS}, {"_id": 1}) is None:
+            # first tracked write: the aggregation already sees this write, so no delta on top
+            rebuild_category_stats(user_oid)
+            return
+
+        now = datetime.utcnow()
+        ops = []
+        for state, sign in states:
+            state_user = _user_oid(state["user_id"])
+            query = {"user_id": state_user, "category": state["category"]}
+            if sign > 0:
+                ops.append(UpdateOne(query, _add_stage(state["amount"], now), upsert=True))
+            else:
+                ops.append(UpdateOne(query, _remove_stage(state["amount"], now)))
+            ops.append(UpdateOne(
+                {"user_id": state_user, "category": TOTALS},
+                {"$inc": {"count": sign, "total": sign * state["amount"]}, "$set": {"updated_at": now}},
+                upsert=True,
+            ))
+        coll.bulk_write(ops)
+    except Exception as e:
+        print("❌ Spending stats update failed:", str(e))
+
+
+def rebuild_category_stats(user_id) -> int:
+    """Recompute a user's stats from scratch (backfill, or after bulk deletes); returns categories written"""
+    if not ENABLED:
+        return 0
+    user_oid = _user_oid(user_id)
+    try:
+        stats = category_amount_stats(user_oid, "expense")
+        now = datetime.utcnow()
+        ops = [
+            ReplaceOne(
+                {"user_id": user_oid, "category": category},
+                {
+                    "user_id": user_oid,
+                    "category": category,
+                    "count": s["count"],
+                    "mean": s["mean"],
+                    "m2": s["std"] ** 2 * s["count"],
+                    "updated_at": now,
+                },
+                upsert=True,
+            )
+            for category, s in stats.items()
+        ]
+        ops.append(ReplaceOne(
+            {"user_id": user_oid, "category": TOTALS},
+            {
+                "user_id": user_oid,
+                "category": TOTALS,
+                "count": sum(s["count"] for s in stats.values()),
+                "total": sum(s["sum"] for s in stats.values()),
+                "updated_at": now,
+            },
+            upsert=True,
+        ))
+        ops.append(DeleteMany({"user_id": user_oid, "category": {"$nin": list(stats) + [TOTALS]}}))
+        CategorySpendingStats._get_collection().bulk_write(ops, ordered=False)
+        return len(stats)
+    except Exception as e:
+        print("❌ Spending stats rebuild failed:", str(e))
+        return 0
+
+
+def forget_user(user_id) -> None:
+    try:
+        CategorySpendingStats.objects(user_id=_user_oid(user_id)).delete()
+    except Exception as e:
+        print("❌ Spending stats cleanup failed:", str(e))
+
+
+# -------------------------
+# Insert-time flagging
+# -------------------------
+def load_category_stats(user_id, category: str) -> Tuple[Optional[Tuple[float, float]], float]:
+    """((mean, std) of `category` or None when untracked, overall_mean), from two rows in one query"""
+    category_stats, overall_mean = None, 0.0
+    fields = {"category": 1, "count": 1, "mean": 1, "m2": 1, "total": 1}
+    rows = CategorySpendingStats._get_collection().find(
+        {"user_id": _user_oid(user_id), "category": {"$in": [category, TOTALS]}}, fields
+    )
+    for row in rows:
+        n = int(row.get("count") or 0)
+        if n <= 0:
+            continue
+        if row["category"] == TOTALS:
+            overall_mean = float(row.get("total") or 0.0) / n
+        else:
+            mean = float(row.get("mean") or 0.0)
+            category_stats = (mean, math.sqrt(max(0.0, float(row.get("m2") or 0.0)) / n))
+    return category_stats, overall_mean
+
+
+def flag_transaction(tx_id, state, check_existing: bool = False) -> Optional[SpendingAnomaly]:
+    """
+    Score one expense against the running stats and record a SpendingAnomaly if it is an outlier.
+    check_existing skips transactions that are already flagged (edits).
+    """
+    if not ENABLED or not state or state["type"] != "expense":
+        return None
+    try:
+        category_stats, overall_mean = load_category_stats(state["user_id"], state["category"])
+        mean, std = category_stats or (overall_mean, 0.0)
+        scored = score_amount(state["amount"], mean, std, overall_mean)
+        if scored is None:
+            return None
+        if check_existing and SpendingAnomaly.objects(
+            user_id=_user_oid(state["user_id"]), transaction_id=tx_id
+        ).only("id").first() is not None:
+            return None
+
+        score, reason = scored
+        return SpendingAnomaly(
+            user_id=_user_oid(state["user_id"]),
+            transaction_id=tx_id,
+            anomaly_score=score,
+            flag_reason=reason,
+        ).save()
+    except Exception as e:
+        print("❌ Anomaly flagging failed:", str(e))
+        return None
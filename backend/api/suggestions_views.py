@@ -8,7 +8,8 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 from .models import User, Account, Transaction, Budget, Goal, Portfolio, Debt, IncomeSource, UserPermission
-from .ml_suggestions_engine import MLSuggestionsEngine
+from .ml import generate_ml_suggestions
+from .model_server import ModelServerTimeout
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 import json
@@ -19,10 +20,6 @@ class AISuggestionsView(APIView):
     """
     permission_classes = [AllowAny]
     
-    def __init__(self):
-        super().__init__()
-        self.ml_engine = MLSuggestionsEngine()
-    
     def get(self, request):
         """Get AI-powered suggestions based on user data and permissions"""
         try:
@@ -85,13 +82,12 @@ class AISuggestionsView(APIView):
         """Generate personalized suggestions based on user data with optional ML enhancement"""
         suggestions = []
         
-        # Get user data for ML analysis
-        user_data = self._get_user_data(user_id, permissions) if use_ml else {}
-        
-        # Generate ML-powered suggestions if enabled
-        if use_ml and user_data:
-            ml_suggestions = self.ml_engine.generate_ml_suggestions(user_id, user_data)
-            suggestions.extend(ml_suggestions)
+        # Generate ML-powered suggestions if enabled (on the model server when one is configured)
+        if use_ml:
+            try:
+                suggestions.extend(generate_ml_suggestions(user_id, permissions))
+            except ModelServerTimeout as e:
+                print("❌ ML suggestions timed out, returning rule-based ones only:", str(e))
         
         # Generate traditional rule-based suggestions
         if category == 'all' or category == 'debt':
@@ -120,70 +116,6 @@ class AISuggestionsView(APIView):
         
         return suggestions
     
-    def _get_user_data(self, user_id: str, permissions: Dict[str, bool]) -> Dict[str, Any]:
-        """Get user data for ML analysis"""
-        user_data = {}
-        
-        try:
-            # Get transactions if permission granted
-            if permissions.get('transactions', False):
-                transactions = Transaction.objects(user_id=user_id)
-                user_data['transactions'] = [
-                    {
-                        'amount': float(t.amount),
-                        'type': t.type,
-                        'category': t.category,
-                        'date': t.date.isoformat() if t.date else None,
-                        'description': t.description or ''
-                    }
-                    for t in transactions
-                ]
-            
-            # Get debts if permission granted
-            if permissions.get('debts', False):
-                debts = Debt.objects(user_id=user_id)
-                user_data['debts'] = [
-                    {
-                        'name': d.name,
-                        'remaining_amount': float(d.remaining_amount),
-                        'interest_rate': float(d.interest_rate),
-                        'minimum_payment': float(d.minimum_payment),
-                        'type': d.type
-                    }
-                    for d in debts
-                ]
-            
-            # Get investments if permission granted
-            if permissions.get('investments', False):
-                investments = Portfolio.objects(user_id=user_id)
-                user_data['investments'] = [
-                    {
-                        'name': inv.name or 'Unknown',
-                        'totalValue': float(inv.totalValue) if hasattr(inv, 'totalValue') else 0,
-                        'gainLoss': float(inv.gainLoss) if hasattr(inv, 'gainLoss') else 0,
-                        'gainLossPercent': float(inv.gainLossPercent) if hasattr(inv, 'gainLossPercent') else 0
-                    }
-                    for inv in investments
-                ]
-            
-            # Get budgets if permission granted
-            if permissions.get('budgets', False):
-                budgets = Budget.objects(user_id=user_id)
-                user_data['budgets'] = [
-                    {
-                        'name': b.name,
-                        'limit': float(b.limit),
-                        'spent': float(b.spent),
-                        'remaining': float(b.remaining)
-                    }
-                    for b in budgets
-                ]
-            
-        except Exception as e:
-            print(f"Error getting user data for ML: {str(e)}")
-        
-        return user_data
-    
     def _deduplicate_and_sort_suggestions(self, suggestions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Remove duplicates and sort suggestions by priority"""
         # Remove duplicates based on title and type
@@ -8,6 +8,8 @@ from .views import (
 
     ExpenseForecastUnifiedAPIView,
     ExpensePredictionAPIView,
+    ForecastJobSubmitAPIView,
+    ForecastJobDetailAPIView,
    
     GoalAPIView,
     GoalETAPredictionAPIView,
@@ -164,6 +166,8 @@ urlpatterns = [
     
     
     path("ml/forecast/", ExpenseForecastUnifiedAPIView.as_view(), name="ml-forecast-unified"),
+    path("ml/forecast/jobs/", ForecastJobSubmitAPIView.as_view(), name="ml-forecast-job-submit"),
+    path("ml/forecast/jobs/<str:job_id>/", ForecastJobDetailAPIView.as_view(), name="ml-forecast-job-detail"),
     
     path("transactions/count/<str:user_id>/", TransactionCountAPIView.as_view(), name="transaction-count"),
 
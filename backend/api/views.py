@@ -1,6 +1,6 @@
 
 
-from .ml_utils import (
+from .ml import (
     predict_next_month_expense,
     detect_spending_anomalies,
     find_recurring_patterns,
@@ -26,7 +26,16 @@ from .serializers import (
     RecurringPatternSerializer, ReviewSerializer, SignupSerializer, LoginSerializer, SpendingAnomalySerializer,
     TransactionSerializer, BudgetSerializer, AccountSerializer,
     GoalSerializer, PortfolioSerializer,
-    update_account_totals, update_matching_budgets
+    transaction_state, update_account_totals, update_matching_budgets
+)
+from .data_cache import bump_data_version
+from .model_registry import forget_user
+from .spending_stats import (
+    update_category_stats, rebuild_category_stats, forget_user as forget_spending_stats
+)
+from .context_store import forget_user as forget_conversations
+from .pagination import (
+    transaction_filters, wants_pagination, page_size, keyset_page, stream_ndjson
 )
 
 # ========================
@@ -105,6 +114,10 @@ class UserDeleteView(APIView):
             acc.delete()
 
         user.delete()
+        bump_data_version(user)
+        forget_user(str(user.id))
+        forget_spending_stats(user.id)
+        forget_conversations(user.id)
         return Response({"message": "User and related data deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -161,6 +174,7 @@ class AccountUpdateView(APIView):
             account.account_type = data.get("account_type", account.account_type)
             account.description = data.get("description", account.description)
             account.save()
+            bump_data_version(account.user_id)
 
             return Response({"message": "Account updated successfully"}, status=status.HTTP_200_OK)
 
@@ -180,6 +194,8 @@ class AccountDeleteView(APIView):
             Budget.objects(account_id=account).delete()
 
             account.delete()
+            rebuild_category_stats(account.user_id)
+            bump_data_version(account.user_id)
             return Response({"message": "Account and related data deleted"}, status=status.HTTP_204_NO_CONTENT)
 
         except Exception as e:
@@ -192,6 +208,51 @@ class AccountDeleteView(APIView):
 
 from mongoengine.errors import DoesNotExist
 
+
+def drop_orphan_transactions(transactions):
+    """
+    Skip transactions whose account was deleted.
+    Expects non-dereferenced documents; existence is checked with one $in query per batch.
+    """
+    transactions = list(transactions)
+    account_ids = {getattr(txn.account_id, "id", txn.account_id) for txn in transactions}
+    if not account_ids:
+        return transactions
+    live = set(Account.objects(id__in=list(account_ids)).scalar("id"))
+    return [txn for txn in transactions if getattr(txn.account_id, "id", txn.account_id) in live]
+
+
+def list_transactions(request, transactions, clean=None):
+    """
+    Full list for legacy callers; with ?limit=&after= a keyset page
+    {"results", "next", "limit"}; with ?stream=ndjson a streamed NDJSON body.
+    start_date / end_date / type / category filters are pushed into the query.
+    References are never dereferenced, so user_id/account_id serialize as id strings
+    and the query count does not grow with the number of rows.
+    """
+    params = request.query_params
+    try:
+        transactions = transactions.no_dereference().filter(**transaction_filters(params))
+        if params.get("stream") == "ndjson":
+            return stream_ndjson(transactions, lambda txn: TransactionSerializer(txn).data, clean)
+        if not wants_pagination(params):
+            rows = clean(transactions) if clean else transactions
+            return Response(TransactionSerializer(rows, many=True).data)
+
+        limit = page_size(params)
+        rows, next_cursor = keyset_page(transactions, limit, params.get("after"))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if clean:
+        rows = clean(rows)
+    return Response({
+        "results": TransactionSerializer(rows, many=True).data,
+        "next": next_cursor,
+        "limit": limit,
+    })
+
+
 class TransactionListCreateAPIView(APIView):
     def get(self, request):
         user_id = request.query_params.get("user_id")
@@ -204,17 +265,7 @@ class TransactionListCreateAPIView(APIView):
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
         transactions = Transaction.objects(user_id=user)
-
-        clean_transactions = []
-        for txn in transactions:
-            try:
-                _ = txn.account_id.id
-                clean_transactions.append(txn)
-            except DoesNotExist:
-                continue
-
-        serializer = TransactionSerializer(clean_transactions, many=True)
-        return Response(serializer.data)
+        return list_transactions(request, transactions, clean=drop_orphan_transactions)
 
     def post(self, request):
         serializer = TransactionSerializer(data=request.data)
@@ -231,7 +282,7 @@ class TransactionsByUserView(APIView):
     def get(self, request, user_id):
         user = get_object_or_404(User, id=ObjectId(user_id))
         transactions = Transaction.objects(user_id=user)
-        return Response(TransactionSerializer(transactions, many=True).data)
+        return list_transactions(request, transactions)
 
 
 class TransactionsByAccountView(APIView):
@@ -245,16 +296,7 @@ class TransactionsByAccountView(APIView):
             return Response({"error": "Account not found"}, status=404)
 
         transactions = Transaction.objects(account_id=account)
-
-        clean_transactions = []
-        for tx in transactions:
-            try:
-                _ = tx.account_id.id
-                clean_transactions.append(tx)
-            except Exception:
-                continue
-
-        return Response(TransactionSerializer(clean_transactions, many=True).data)
+        return list_transactions(request, transactions, clean=drop_orphan_transactions)
 
 
 class TransactionDetailView(APIView):
@@ -284,10 +326,12 @@ class TransactionDeleteView(APIView):
         except Transaction.DoesNotExist:
             raise NotFound("Transaction not found")
 
-        account = tx.account_id
+        before = transaction_state(tx)
         tx.delete()
-        update_account_totals(account)
-        update_matching_budgets(tx)
+        update_account_totals(before=before)
+        update_matching_budgets(before=before)
+        update_category_stats(before=before)
+        bump_data_version(tx.user_id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -370,6 +414,7 @@ class BudgetDetailView(APIView):
         budget = self.get_object(pk)
         self._ensure_owner(request, budget)
         budget.delete()
+        bump_data_version(budget.user_id)
         return Response({"message": "✅ Budget deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -455,6 +500,7 @@ class GoalAPIView(APIView):
             return Response({"error": "Goal not found"}, status=status.HTTP_404_NOT_FOUND)
 
         goal.delete()
+        bump_data_version(goal.user_id)
         return Response({"message": "Goal deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -507,6 +553,7 @@ class PortfolioDetailView(APIView):
     def delete(self, request, pk):
         portfolio = self.get_object(pk)
         portfolio.delete()
+        bump_data_version(portfolio.user_id)
         return Response({"message": "Portfolio deleted"}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -584,6 +631,7 @@ class DebtAPIView(APIView):
             return Response({"error": "Debt not found"}, status=status.HTTP_404_NOT_FOUND)
 
         debt.delete()
+        bump_data_version(debt.user_id)
         return Response({"message": "Debt deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
 # =========
@@ -812,10 +860,49 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .ml_utils import (
-    build_forecast_payload,
-    forecast_dispatch,  # legacy single-series support (if needed elsewhere)
-)
+from .ml import build_forecast_payload
+from .model_server import ModelServerTimeout
+from .forecast_jobs import JobQueueFull, submit_forecast_job, get_job, job_payload
+
+
+def parse_forecast_params(params):
+    """
+    model / horizon / periods / granularity / target_date -> build_forecast_payload kwargs.
+    returns: (kwargs, error message or None)
+    """
+    model = (params.get("model") or "holt").lower()
+    horizon = params.get("horizon")  # week|month|year
+    periods = params.get("periods")
+    granularity = (params.get("granularity") or "daily").lower()
+    target_date = params.get("target_date")  # optional YYYY-MM-DD
+
+    # resolve periods
+    if periods is not None:
+        try:
+            periods = int(periods)
+        except Exception:
+            return None, "periods must be integer days"
+    else:
+        horizon = (horizon or "").lower()
+        if horizon == "week":
+            periods = 7
+        elif horizon == "month":
+            periods = 30
+        elif horizon == "year":
+            periods = 365
+        else:
+            periods = 30
+
+    if granularity not in ("daily", "weekly", "monthly"):
+        return None, "granularity must be daily|weekly|monthly"
+
+    return {
+        "model": model,
+        "periods": periods,
+        "granularity": granularity,
+        "target_date": target_date,
+    }, None
+
 
 class ExpenseForecastUnifiedAPIView(APIView):
     """
@@ -832,48 +919,66 @@ class ExpenseForecastUnifiedAPIView(APIView):
     """
     def get(self, request):
         user_id = request.query_params.get("user_id")
-        model = request.query_params.get("model", "holt").lower()
-        horizon = request.query_params.get("horizon")  # week|month|year
-        periods = request.query_params.get("periods")
-        granularity = request.query_params.get("granularity", "daily").lower()
-        target_date = request.query_params.get("target_date")  # optional YYYY-MM-DD
-
         if not user_id:
             return Response({"error": "user_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # resolve periods
-        if periods is not None:
-            try:
-                periods = int(periods)
-            except Exception:
-                return Response({"error": "periods must be integer days"}, status=400)
-        else:
-            horizon = (horizon or "").lower()
-            if horizon == "week":
-                periods = 7
-            elif horizon == "month":
-                periods = 30
-            elif horizon == "year":
-                periods = 365
-            else:
-                periods = 30
-
-        if granularity not in ("daily", "weekly", "monthly"):
-            return Response({"error": "granularity must be daily|weekly|monthly"}, status=400)
+        params, error = parse_forecast_params(request.query_params)
+        if error:
+            return Response({"error": error}, status=400)
 
         try:
-            payload = build_forecast_payload(
-                user_id=user_id,
-                model=model,
-                periods=periods,
-                granularity=granularity,
-                target_date=target_date
-            )
+            payload = build_forecast_payload(user_id=user_id, **params)
             return Response({"status": "ok", **payload}, status=200)
+        except ModelServerTimeout as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
         except Exception as e:
             return Response({"status": "error", "message": str(e)}, status=500)
 
 
+class ForecastJobSubmitAPIView(APIView):
+    """
+    POST /api/ml/forecast/jobs/  {user_id, model, horizon|periods, granularity, target_date}
+
+    Queues the forecast on the background worker pool and returns 202 {job_id, status} right away.
+    An identical forecast already in flight for the user is returned instead of queueing another.
+    """
+    def post(self, request):
+        user_id = request.data.get("user_id")
+        if not user_id:
+            return Response({"error": "user_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        params, error = parse_forecast_params(request.data)
+        if error:
+            return Response({"error": error}, status=400)
+
+        try:
+            job, created = submit_forecast_job(user_id, params)
+        except JobQueueFull as e:
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            return Response({"status": "error", "message": str(e)}, status=500)
+
+        return Response({**job_payload(job), "deduplicated": not created}, status=status.HTTP_202_ACCEPTED)
+
+
+class ForecastJobDetailAPIView(APIView):
+    """
+    GET /api/ml/forecast/jobs/<job_id>/?wait=<seconds>
+
+    Returns the job state; with `wait` it long-polls until the job finishes or the wait runs out.
+    """
+    def get(self, request, job_id):
+        try:
+            wait = float(request.query_params.get("wait", 0))
+        except ValueError:
+            return Response({"error": "wait must be a number of seconds"}, status=400)
+
+        job = get_job(job_id, wait=wait)
+        if job is None:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_payload(job))
+
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from .models import Transaction, User
@@ -893,7 +998,7 @@ class TransactionCountAPIView(APIView):
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from bson import ObjectId
-from .ml_utils import ml_predict_debt_payoff
+from .ml import ml_predict_debt_payoff
 from .models import Transaction, Debt
 
 class DebtPayoffMLAPIView(APIView):
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Benchmark + equivalence check for the FinancialAIEngine intent router and the
+NaturalLanguageEngine pattern matcher. Routes a corpus of real assistant queries through the
+compiled matchers and the former if/elif chains; fails on any difference or a latency regression
+"""
+
+import os
+import re
+import sys
+import time
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# financial_ai_engine imports the models, so Django settings must be loaded
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'item_service.settings')
+import django
+django.setup()
+
+from api.financial_ai_engine import QUERY_ROUTER
+from api.natural_language_engine import (
+    FOLLOW_UP_PATTERNS, QUERY_INTENT_PATTERNS, QUERY_MATCHER, TIME_REFERENCE_PATTERNS, analyze_query,
+    parse_query,
+)
+
+ROUNDS = 2000
+BUDGET_US = float(os.getenv("INTENT_ROUTER_BUDGET_US", "50"))
+MAX_SLOWDOWN = 1.25  # router may not be meaningfully slower than the chain it replaced
+
+# queries used across the assistant test scripts and docs, plus a few mixed-intent edge cases
+CORPUS = [
+    "Are there any strange or abnormal expenses in my data?",
+    "Can I afford a new car worth ₹500000?",
+    "Can I afford a vacation next month?",
+    "Can I afford to take a vacation next month?",
+    "How about compared to last month?",
+    "How are my budgets doing?",
+    "How are my investments performing?",
+    "How can I optimize my debt repayment strategy?",
+    "How can I optimize my debt repayment?",
+    "How can I optimize my debt?",
+    "How can I reduce expenses?",
+    "How can I reduce my monthly expenses?",
+    "How close am I to my savings goal?",
+    "How is my budget performing?",
+    "How much can I save this month?",
+    "How much debt do I have remaining?",
+    "How much did I earn this year?",
+    "How much did I spend last month?",
+    "How much did I spend on food this month?",
+    "How much did I spend on groceries?",
+    "How much did I spend this month?",
+    "How much did I spend today?",
+    "How much do I spend on entertainment?",
+    "Should I invest more or pay off debt first?",
+    "Should I pay off my credit card debt first?",
+    "What about 6 months ago?",
+    "What about last 3 months?",
+    "What about last month?",
+    "What about my income trends?",
+    "What about the last 3 months?",
+    "What about this month?",
+    "What should I do to improve my finances?",
+    "What was my income yesterday?",
+    "What was my total income this month?",
+    "What will my financial situation look like in 6 months?",
+    "What's my best option for repaying my loan faster?",
+    "What's my current account balance?",
+    "What's my current balance?",
+    "What's my current net worth?",
+    "What's my income last month?",
+    "What's my investment portfolio worth?",
+    "What's my savings trend?",
+    "What's my spending pattern this month?",
+    "What's the smartest way to pay off my loans?",
+    "Why did my expenses increase last quarter?",
+    "What about last year?",
+    "Show me my balance and my income",
+    "Is my spending higher than my savings?",
+    "My net worth vs last year",
+    "Tell me a joke",
+    "Should I invest more in my portfolio?",
+    "Budget status for groceries",
+    "What did I spend on rent versus last month?",
+]
+
+
+def legacy_route(query_lower, has_context):
+    """The pre-router process_query / _is_follow_up_query logic, returning the chosen branch"""
+    follow_up_indicators = [
+        'what about', 'how about', 'and', 'also', 'then', 'next',
+        'last 3 months', 'last 6 months', 'last year', 'this year',
+        'compared to', 'vs', 'versus', 'difference', 'change',
+        'more', 'less', 'higher', 'lower', 'increase', 'decrease'
+    ]
+    has_follow_up_indicators = any(indicator in query_lower for indicator in follow_up_indicators)
+    time_period_queries = [
+        'what about last month', 'what about this month', 'what about last year',
+        'what about last 3 months', 'what about last 6 months', 'what about this year'
+    ]
+    is_time_period_query = any(time_query in query_lower for time_query in time_period_queries)
+    if (has_follow_up_indicators and has_context) or is_time_period_query:
+        return "follow_up"
+
+    if any(phrase in query_lower for phrase in ["what's my income", "my income", "income last month", "income this month", "how much do i earn", "my salary"]):
+        return "income"
+    elif any(phrase in query_lower for phrase in ["what's my balance", "my balance", "current balance", "account balance", "how much money do i have"]):
+        return "balance"
+    elif any(phrase in query_lower for phrase in ["how much did i spend", "my spending", "spending this month", "spending last month", "what did i spend"]):
+        return "spending"
+    elif any(phrase in query_lower for phrase in ["what's my net worth", "my net worth", "total assets", "my worth"]):
+        return "net_worth"
+    elif any(phrase in query_lower for phrase in ["how much can i save", "my savings", "saving this month", "savings potential"]):
+        return "savings"
+    elif any(phrase in query_lower for phrase in ["my investments", "investment portfolio", "should i invest", "invest more"]):
+        return "investment"
+    elif any(phrase in query_lower for phrase in ["my budget", "budget status", "how are my budgets"]):
+        return "budget"
+    elif any(phrase in query_lower for phrase in ["can i afford", "afford a vacation", "afford to buy", "afford to take"]):
+        return "affordability"
+    elif any(phrase in query_lower for phrase in ["why did my expenses increase", "expenses increased", "expense analysis"]):
+        return "expense_analysis"
+    elif any(phrase in query_lower for phrase in ["repay my loan", "pay off debt", "debt repayment", "best option for repaying"]):
+        return "debt_repayment"
+    return "general"
+
+
+def router_route(query_lower, has_context):
+    """process_query's dispatch decision using the compiled router"""
+    route = QUERY_ROUTER.match(query_lower)
+    if ('follow_up' in route.flags and has_context) or 'time_period' in route.flags:
+        return "follow_up"
+    return route.intent or "general"
+
+
+def per_query_us(route_fn, queries, has_context):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for q in queries:
+            route_fn(q, has_context)
+    return (time.perf_counter() - start) / (ROUNDS * len(queries)) * 1e6
+
+
+def test_router_matches_legacy_ordering():
+    queries = [q.lower() for q in CORPUS]
+    for has_context in (False, True):
+        for q in queries:
+            expected, actual = legacy_route(q, has_context), router_route(q, has_context)
+            assert expected == actual, f"{q!r} (context={has_context}): legacy={expected} router={actual}"
+    print(f"✅ {len(queries)} queries route identically with and without context")
+
+
+def test_router_latency():
+    queries = [q.lower() for q in CORPUS]
+    legacy_us = per_query_us(legacy_route, queries, True)
+    router_us = per_query_us(router_route, queries, True)
+    print(f"🔍 legacy chain {legacy_us:.1f} µs/query, compiled router {router_us:.1f} µs/query "
+          f"({legacy_us / router_us:.2f}x)")
+    assert router_us <= BUDGET_US, f"router takes {router_us:.1f} µs/query, budget is {BUDGET_US:.0f} µs"
+    assert router_us <= legacy_us * MAX_SLOWDOWN, "router is slower than the chain it replaced"
+
+
+def sequential_search(table, query_lower):
+    """The NaturalLanguageEngine's former loop: first label with a re.search() hit"""
+    for label, patterns in table:
+        for pattern in patterns:
+            match = re.search(pattern, query_lower)
+            if match:
+                return label, match.group(1) if match.groups() else None
+    return None, None
+
+
+def test_nl_matcher_matches_sequential_search():
+    tables = {'intent': QUERY_INTENT_PATTERNS, 'time': TIME_REFERENCE_PATTERNS, 'follow_up': FOLLOW_UP_PATTERNS}
+    queries = [q.lower() for q in CORPUS]
+    for q in queries:
+        hits = QUERY_MATCHER.match(q)
+        for name, table in tables.items():
+            expected = sequential_search(table, q)
+            assert hits[name] == expected, f"{q!r} [{name}]: search={expected} matcher={hits[name]}"
+    analyze_query.cache_clear()
+    for q in queries + queries:
+        analyze_query(q)
+    info = analyze_query.cache_info()
+    assert info.misses == len(set(queries)), info
+    print(f"✅ {len(queries)} queries parse identically; repeats served from the memo ({info.hits} hits)")
+
+
+def test_nl_long_queries_are_truncated():
+    """Unauthenticated chat bodies have no length limit; parse time and memo keys must not grow with them"""
+    analyze_query.cache_clear()
+    start = time.perf_counter()
+    parse_query("predict " * 3000)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    assert elapsed_ms < 200, f"24k-character query took {elapsed_ms:.0f} ms"
+    print(f"✅ 24k-character query parsed in {elapsed_ms:.1f} ms (truncated)")
+
+
+if __name__ == "__main__":
+    test_router_matches_legacy_ordering()
+    test_router_latency()
+    test_nl_matcher_matches_sequential_search()
+    test_nl_long_queries_are_truncated()
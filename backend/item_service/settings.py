@@ -253,6 +253,62 @@ REST_FRAMEWORK = {
     ),
 }
 
+# -----------------------------
+# ✅ In-process caches
+# -----------------------------
+FINANCIAL_SNAPSHOT_CACHE_MAX_ENTRIES = int(os.getenv("FINANCIAL_SNAPSHOT_CACHE_MAX_ENTRIES", "1024"))
+FINANCIAL_SNAPSHOT_CACHE_MAX_BYTES = int(os.getenv("FINANCIAL_SNAPSHOT_CACHE_MAX_MB", "128")) * 1024 * 1024
+ML_SUGGESTIONS_CACHE_MAX_ENTRIES = int(os.getenv("ML_SUGGESTIONS_CACHE_MAX_ENTRIES", "1024"))
+ML_SUGGESTIONS_CACHE_MAX_BYTES = int(os.getenv("ML_SUGGESTIONS_CACHE_MAX_MB", "128")) * 1024 * 1024
+# distinct lower-cased queries whose NaturalLanguageEngine parse is memoised
+NL_QUERY_CACHE_SIZE = int(os.getenv("NL_QUERY_CACHE_SIZE", "4096"))
+# characters of a query that are parsed (and used as the memo key); the rest is ignored
+NL_QUERY_MAX_CHARS = int(os.getenv("NL_QUERY_MAX_CHARS", "500"))
+# import numpy/pandas/sklearn in a background thread at startup instead of on the first ML request
+ML_WARMUP_ON_START = os.getenv("ML_WARMUP_ON_START", "False").lower() == "true"
+FORECAST_CACHE_MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "512"))
+FORECAST_CACHE_MAX_BYTES = int(os.getenv("FORECAST_CACHE_MAX_MB", "64")) * 1024 * 1024
+FORECAST_CACHE_TTL_SECONDS = int(os.getenv("FORECAST_CACHE_TTL_SECONDS", "3600"))
+FORECAST_MODEL_REGISTRY_ENABLED = os.getenv("FORECAST_MODEL_REGISTRY_ENABLED", "True").lower() == "true"
+# worker processes for income/expense fits (0 = always fit in-process)
+FORECAST_FIT_WORKERS = int(os.getenv("FORECAST_FIT_WORKERS", "2"))
+FORECAST_FIT_TIMEOUT_SECONDS = int(os.getenv("FORECAST_FIT_TIMEOUT_SECONDS", "60"))
+
+# -----------------------------
+# ✅ Background forecast jobs
+# -----------------------------
+FORECAST_JOB_WORKERS = int(os.getenv("FORECAST_JOB_WORKERS", "2"))
+FORECAST_JOB_QUEUE_SIZE = int(os.getenv("FORECAST_JOB_QUEUE_SIZE", "16"))
+FORECAST_JOB_MAX_WAIT_SECONDS = int(os.getenv("FORECAST_JOB_MAX_WAIT_SECONDS", "30"))
+FORECAST_JOB_STALE_SECONDS = int(os.getenv("FORECAST_JOB_STALE_SECONDS", "900"))
+
+# -----------------------------
+# ✅ Model server (python manage.py run_model_server)
+# -----------------------------
+# empty = forecasts and ML suggestions run inside the web worker
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+MODEL_SERVER_TIMEOUT_SECONDS = int(os.getenv("MODEL_SERVER_TIMEOUT_SECONDS", "30"))
+MODEL_SERVER_RETRY_SECONDS = int(os.getenv("MODEL_SERVER_RETRY_SECONDS", "30"))
+MODEL_SERVER_THREADS = int(os.getenv("MODEL_SERVER_THREADS", "4"))
+
+# -----------------------------
+# ✅ Real-time anomaly flagging
+# -----------------------------
+# keep per-category running stats on every transaction write and flag outliers at insert time
+SPENDING_STATS_ENABLED = os.getenv("SPENDING_STATS_ENABLED", "True").lower() == "true"
+
+# -----------------------------
+# ✅ Conversation context (chat assistants)
+# -----------------------------
+# "memory" = per worker process, "mongo" = shared by all workers and kept across restarts
+CONVERSATION_CONTEXT_BACKEND = os.getenv("CONVERSATION_CONTEXT_BACKEND", "memory")
+# contexts idle for longer than this are dropped (TTL index on the mongo backend)
+CONVERSATION_CONTEXT_TTL_SECONDS = int(os.getenv("CONVERSATION_CONTEXT_TTL_SECONDS", str(24 * 60 * 60)))
+CONVERSATION_CONTEXT_HISTORY_LIMIT = int(os.getenv("CONVERSATION_CONTEXT_HISTORY_LIMIT", "10"))
+# memory backend only: least recently used users are evicted past either cap
+CONVERSATION_CONTEXT_MAX_ENTRIES = int(os.getenv("CONVERSATION_CONTEXT_MAX_ENTRIES", "10000"))
+CONVERSATION_CONTEXT_MAX_BYTES = int(os.getenv("CONVERSATION_CONTEXT_MAX_MB", "32")) * 1024 * 1024
+
 
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND')
 EMAIL_HOST = os.getenv('EMAIL_HOST')
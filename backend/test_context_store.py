@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Conversation context store tests
+Checks the in-process backend's history ring buffer, TTL, LRU and byte cap, and that chat
+contexts written by one engine instance are seen by another
+"""
+
+import os
+import sys
+import time
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'item_service.settings')
+import django
+django.setup()
+
+from api.context_store import HISTORY_LIMIT, MemoryContextStore
+from api.natural_language_engine import ConversationContext, NaturalLanguageEngine
+
+
+def history(n):
+    return {'last_query_type': 'spending', 'conversation_history': [{'query_type': str(i)} for i in range(n)]}
+
+
+def test_history_is_a_ring_buffer():
+    store = MemoryContextStore()
+    store.put('ai', 'u1', history(HISTORY_LIMIT + 5))
+    kept = store.get('ai', 'u1')['conversation_history']
+    assert [h['query_type'] for h in kept] == [str(i) for i in range(5, HISTORY_LIMIT + 5)], kept
+    print(f"✅ Only the last {HISTORY_LIMIT} interactions are kept")
+
+
+def test_get_returns_a_copy():
+    store = MemoryContextStore()
+    store.put('ai', 'u1', history(1))
+    store.get('ai', 'u1')['conversation_history'].append({'query_type': 'x'})
+    assert len(store.get('ai', 'u1')['conversation_history']) == 1
+    print("✅ Mutating a loaded context does not change the stored one")
+
+
+def test_ttl_and_lru_eviction():
+    store = MemoryContextStore(ttl=0.05)
+    store.put('nl', 'u1', history(1))
+    time.sleep(0.1)
+    assert store.get('nl', 'u1') is None
+    print("✅ Idle contexts expire")
+
+    store = MemoryContextStore(max_entries=2)
+    for user in ('u1', 'u2'):
+        store.put('nl', user, history(1))
+    store.get('nl', 'u1')          # u2 becomes least recently used
+    store.put('nl', 'u3', history(1))
+    assert store.get('nl', 'u2') is None and store.get('nl', 'u1') is not None
+    print("✅ Least recently used user evicted past max_entries")
+
+
+def test_memory_cap():
+    store = MemoryContextStore(max_bytes=4096)
+    for i in range(100):
+        store.put('ai', f'u{i}', history(HISTORY_LIMIT))
+    stats = store.stats()
+    assert stats['bytes'] <= 4096, stats
+    assert store.get('ai', 'u99') is not None
+    print(f"✅ {stats['entries']} context(s) kept within a 4 KB cap")
+
+
+def test_forget_user_and_delete():
+    store = MemoryContextStore()
+    store.put('ai', 'u1', history(1))
+    store.put('nl', 'u1', history(1))
+    store.put('nl', 'u2', history(1))
+    assert store.delete('nl', 'u2') and not store.delete('nl', 'u2')
+    store.forget_user('u1')
+    assert store.get('ai', 'u1') is None and store.get('nl', 'u1') is None
+    print("✅ delete() and forget_user() drop contexts")
+
+
+def test_engines_share_the_store():
+    store = MemoryContextStore()
+    context = ConversationContext('u1')
+    context.last_time_period = {'period': 'last_month', 'days': 30, 'offset': 30}
+    context.add_interaction('How much did I spend last month?', 'You spent ₹1,000', 'spending_query')
+    NaturalLanguageEngine(store)._save_context(context)
+
+    other = NaturalLanguageEngine(store)  # e.g. ConversationHistoryView's engine
+    loaded = other._get_or_create_context('u1')
+    assert loaded.to_dict() == context.to_dict()
+    assert other.get_conversation_history('u1')[0]['query_type'] == 'spending_query'
+
+    # the wrapped FinancialAIEngine keeps its own follow-up context in the same store
+    other.ai_engine._update_conversation_context('u1', 'spending', 'last_month', 'groceries', 1000.0)
+    assert store.get(other.ai_engine.CONTEXT_NAMESPACE, 'u1') is not None
+    assert other.clear_conversation_history('u1') and other.get_conversation_history('u1') == []
+    assert store.get(other.ai_engine.CONTEXT_NAMESPACE, 'u1') is None
+    assert other.ai_engine._get_conversation_context('u1')['last_query_type'] is None
+    print("✅ A context saved by one engine is loaded and cleared (with its AI context) by another")
+
+
+if __name__ == "__main__":
+    test_history_is_a_ring_buffer()
+    test_get_returns_a_copy()
+    test_ttl_and_lru_eviction()
+    test_memory_cap()
+    test_forget_user_and_delete()
+    test_engines_share_the_store()
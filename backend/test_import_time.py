@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Cold-start import regression test
+Imports the URLconf in a fresh interpreter under `python -X importtime` and fails if the ML stack
+gets pulled in eagerly again or total import time exceeds the budget
+"""
+
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# must only load lazily through api/ml.py
+FORBIDDEN = {"numpy", "pandas", "sklearn", "scipy", "statsmodels", "prophet"}
+BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+
+COLD_START = (
+    "import os, django;"
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'item_service.settings');"
+    "django.setup();"
+    "import item_service.urls"
+)
+
+
+def profile_cold_start():
+    """[(module, self_us, cumulative_us)] as reported by -X importtime"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", COLD_START],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    assert proc.returncode == 0, f"URLconf import failed:\n{proc.stderr[-2000:]}"
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def test_urlconf_skips_ml_stack():
+    rows = profile_cold_start()
+    eager = sorted({name for name, _, _ in rows if name.split(".")[0] in FORBIDDEN})
+    assert not eager, f"ML modules imported at startup: {', '.join(eager[:10])}"
+    print("✅ No ML libraries imported by the URLconf")
+
+
+def test_urlconf_import_budget():
+    rows = profile_cold_start()
+    total_ms = sum(self_us for _, self_us, _ in rows) / 1000
+    slowest = sorted(rows, key=lambda r: r[2], reverse=True)[:10]
+    print(f"🔍 Cold start imports: {total_ms:.0f} ms (budget {BUDGET_MS:.0f} ms)")
+    for name, _, cumulative_us in slowest:
+        print(f"   {cumulative_us / 1000:8.1f} ms  {name}")
+    assert total_ms <= BUDGET_MS, f"cold start took {total_ms:.0f} ms, budget is {BUDGET_MS:.0f} ms"
+    print("✅ Cold start within budget")
+
+
+if __name__ == "__main__":
+    test_urlconf_skips_ml_stack()
+    test_urlconf_import_budget()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Explain-plan regression suite for the hot ledger queries
+Fails if any of them falls back to a collection scan (COLLSCAN)
+"""
+
+import os
+import sys
+import django
+from datetime import datetime, timedelta
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Set up Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'item_service.settings')
+django.setup()
+
+from api.models import (
+    User, Account, Transaction, Budget, Goal, Portfolio, SpendingAnomaly, RecurringPattern,
+)
+
+INDEXED_MODELS = [Account, Transaction, Budget, Goal, Portfolio, SpendingAnomaly, RecurringPattern]
+
+
+# -------------------------
+# Helpers
+# -------------------------
+def winning_stages(explain):
+    """Every stage name found under any winningPlan of an explain document"""
+    stages = []
+
+    def walk_plan(node):
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.append(node["stage"])
+            for value in node.values():
+                walk_plan(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk_plan(value)
+
+    def find_plans(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "winningPlan":
+                    walk_plan(value)
+                else:
+                    find_plans(value)
+        elif isinstance(node, list):
+            for value in node:
+                find_plans(value)
+
+    find_plans(explain)
+    return stages
+
+
+def explain_aggregate(model, pipeline):
+    collection = model._get_collection()
+    return collection.database.command(
+        "aggregate", collection.name, pipeline=pipeline, explain=True
+    )
+
+
+def seed(user):
+    account = Account(user_id=user, account_name="Explain Test Account", account_type="bank").save()
+    now = datetime.utcnow()
+    Transaction.objects.insert([
+        Transaction(
+            user_id=user,
+            account_id=account,
+            type="expense" if i % 3 else "income",
+            category=["salary", "groceries", "rent"][i % 3],
+            amount=10.0 + i,
+            date=now - timedelta(days=i),
+        )
+        for i in range(60)
+    ])
+    Budget(user_id=user, account_id=account, type="Monthly", name="groceries", limit=500.0, date=now).save()
+    return account
+
+
+# -------------------------
+# Query shapes (mirror views.py / serializers.py / aggregations.py / ml_utils.py)
+# -------------------------
+def query_shapes(user, account):
+    now = datetime.utcnow()
+    start = now - timedelta(days=90)
+    return {
+        "transactions by user (newest first)":
+            Transaction.objects(user_id=user).order_by("-date", "-id").explain(),
+        "transactions by user in date window":
+            Transaction.objects(user_id=user, date__gte=start).explain(),
+        "transactions by user and type in date window":
+            Transaction.objects(user_id=user, type="expense", date__gte=start).explain(),
+        "transactions by account (newest first)":
+            Transaction.objects(account_id=account).order_by("-date", "-id").explain(),
+        "budgets by user":
+            Budget.objects(user_id=user).explain(),
+        "budgets by user/account/category":
+            Budget.objects(user_id=user, account_id=account, name="groceries").explain(),
+        "goals by user":
+            Goal.objects(user_id=user).explain(),
+        "portfolios by user":
+            Portfolio.objects(user_id=user).explain(),
+        "accounts by user":
+            Account.objects(user_id=user).explain(),
+        "anomalies by user/transaction":
+            SpendingAnomaly.objects(user_id=user, transaction_id=None).explain(),
+        "recurring pattern lookup":
+            RecurringPattern.objects(user_id=user, category="rent", pattern="rent ~20").explain(),
+        "period totals aggregation": explain_aggregate(Transaction, [
+            {"$match": {"user_id": user.id, "type": {"$in": ["income", "expense"]},
+                        "date": {"$gte": start, "$lte": now}}},
+            {"$group": {"_id": "$type", "total": {"$sum": "$amount"}}},
+        ]),
+        "daily sums by type aggregation": explain_aggregate(Transaction, [
+            {"$match": {"user_id": user.id, "type": {"$in": ["income", "expense"]}}},
+            {"$group": {"_id": {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+                                "type": "$type"},
+                        "total": {"$sum": "$amount"}}},
+        ]),
+        "account reconciliation aggregation": explain_aggregate(Transaction, [
+            {"$match": {"account_id": {"$in": [account.id]}}},
+            {"$group": {"_id": {"account": "$account_id", "type": "$type"}, "total": {"$sum": "$amount"}}},
+        ]),
+    }
+
+
+def test_query_plans():
+    """Every hot query must be served by an index"""
+    print("🔍 Checking explain plans for hot queries...")
+
+    for model in INDEXED_MODELS:
+        model.ensure_indexes()
+
+    user = User(
+        username="Explain Test",
+        email=f"explain-{datetime.utcnow().timestamp()}@example.com",
+        password="explain-test",
+    ).save()
+    account = seed(user)
+
+    failures = []
+    try:
+        for name, explain in query_shapes(user, account).items():
+            stages = winning_stages(explain)
+            if "COLLSCAN" in stages:
+                failures.append(name)
+                print(f"❌ {name}: {' <- '.join(stages)}")
+            else:
+                print(f"✅ {name}: {' <- '.join(stages)}")
+    finally:
+        Transaction.objects(user_id=user).delete()
+        Budget.objects(user_id=user).delete()
+        account.delete()
+        user.delete()
+
+    assert not failures, f"Collection scans in: {', '.join(failures)}"
+    print("🎉 No collection scans!")
+
+
+if __name__ == "__main__":
+    try:
+        test_query_plans()
+    except AssertionError as e:
+        print("❌", str(e))
+        sys.exit(1)
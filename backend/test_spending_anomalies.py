@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Spending anomaly serialization test
+Anomalies created by the batch scan are bulk-inserted with raw transaction ids; the anomaly API
+must still return the flagged transaction for them
+"""
+
+import os
+import sys
+import django
+from datetime import datetime, timedelta
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Set up Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'item_service.settings')
+django.setup()
+
+from api.ml_utils import detect_spending_anomalies
+from api.models import User, Account, Transaction, SpendingAnomaly, AnomalyScanState, CategorySpendingStats
+from api.serializers import SpendingAnomalySerializer
+
+
+def test_detected_anomaly_serializes_transaction():
+    print("🔍 Serializing newly detected anomalies...")
+
+    user = User(
+        username="Anomaly Serializer Test",
+        email=f"anomaly-{datetime.utcnow().timestamp()}@example.com",
+        password="anomaly-test",
+    ).save()
+    account = Account(user_id=user, account_name="Live", account_type="bank").save()
+    now = datetime.utcnow()
+    try:
+        Transaction.objects.insert([
+            Transaction(user_id=user, account_id=account, type="expense", category="groceries",
+                        amount=100.0 + i, date=now - timedelta(days=i + 1))
+            for i in range(10)
+        ])
+        outlier = Transaction(user_id=user, account_id=account, type="expense", category="groceries",
+                              amount=5000.0, date=now).save()
+
+        anomalies = detect_spending_anomalies(str(user.id))
+        assert anomalies, "the 5000 grocery expense was not flagged"
+
+        fresh = SpendingAnomalySerializer(anomalies, many=True).data
+        stored = SpendingAnomalySerializer(SpendingAnomaly.objects(user_id=user), many=True).data
+        for rows in (fresh, stored):
+            flagged = [row["transaction"] for row in rows]
+            assert all(flagged), f"transaction missing from serialized anomaly: {rows}"
+            assert str(outlier.id) in [t["id"] for t in flagged]
+            assert all(t["amount"] > 0 and t["category"] == "groceries" for t in flagged)
+        print(f"   {len(fresh)} anomaly(ies) serialized with their transaction")
+    finally:
+        SpendingAnomaly.objects(user_id=user).delete()
+        AnomalyScanState.objects(user_id=str(user.id)).delete()
+        CategorySpendingStats.objects(user_id=user.id).delete()
+        Transaction.objects(user_id=user).delete()
+        account.delete()
+        user.delete()
+
+    print("🎉 Detected anomalies serialize with their transaction!")
+
+
+if __name__ == "__main__":
+    try:
+        test_detected_anomaly_serializes_transaction()
+    except AssertionError as e:
+        print("❌", str(e))
+        sys.exit(1)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Query-count guard for the transaction list endpoints
+Listing N transactions must cost the same number of MongoDB round trips as listing a handful
+"""
+
+import os
+import sys
+import django
+from datetime import datetime, timedelta
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Set up Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'item_service.settings')
+django.setup()
+
+from pymongo import monitoring
+from mongoengine import connect, disconnect
+from rest_framework.test import APIRequestFactory
+
+from api.models import User, Account, Transaction
+from api.views import TransactionListCreateAPIView, TransactionsByAccountView
+
+# getMore is cursor continuation of one query, not a new round trip per row
+COUNTED_COMMANDS = {"find", "aggregate", "count"}
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name in COUNTED_COMMANDS:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+counter = CommandCounter()
+
+# Reconnect with the listener attached (listeners are fixed at client creation)
+disconnect()
+connect(
+    db=os.getenv('MONGODB_DATABASE_NAME'),
+    host=os.getenv('MONGODB_URI'),
+    event_listeners=[counter],
+)
+
+factory = APIRequestFactory()
+
+
+def seed(user, account, n):
+    now = datetime.utcnow()
+    Transaction.objects.insert([
+        Transaction(
+            user_id=user,
+            account_id=account,
+            type="expense",
+            category="groceries",
+            amount=5.0 + i,
+            date=now - timedelta(hours=i),
+        )
+        for i in range(n)
+    ])
+
+
+def count_queries(view, path, **kwargs):
+    counter.count = 0
+    response = view(factory.get(path), **kwargs)
+    return counter.count, response
+
+
+def test_constant_query_count():
+    """Per-row dereferences would make the second count grow with N"""
+    print("🔍 Checking query counts for transaction lists...")
+
+    user = User(
+        username="Query Count Test",
+        email=f"querycount-{datetime.utcnow().timestamp()}@example.com",
+        password="query-count-test",
+    ).save()
+    account = Account(user_id=user, account_name="Live", account_type="bank").save()
+    orphaned = Account(user_id=user, account_name="Deleted", account_type="cash").save()
+
+    list_view = TransactionListCreateAPIView.as_view()
+    account_view = TransactionsByAccountView.as_view()
+    try:
+        seed(user, account, 5)
+        seed(user, orphaned, 3)
+        orphaned.delete()
+
+        small, response = count_queries(list_view, f"/api/transactions/?user_id={user.id}")
+        assert len(response.data) == 5, f"orphans not filtered: {len(response.data)} rows"
+        assert all(row["account_id"] == str(account.id) for row in response.data)
+
+        seed(user, account, 200)
+        large, response = count_queries(list_view, f"/api/transactions/?user_id={user.id}")
+        assert len(response.data) == 205
+        print(f"   user list: {small} queries for 5 rows, {large} queries for 205 rows")
+        assert large == small, "user list query count grows with rows"
+
+        paged, response = count_queries(list_view, f"/api/transactions/?user_id={user.id}&limit=50")
+        assert len(response.data["results"]) == 50 and response.data["next"]
+        print(f"   user page of 50: {paged} queries")
+        assert paged == small
+
+        by_account, response = count_queries(
+            account_view, f"/api/transactions/account/{account.id}/", account_id=str(account.id)
+        )
+        assert len(response.data) == 205
+        print(f"   account list: {by_account} queries for 205 rows")
+        assert by_account == small
+    finally:
+        Transaction.objects(user_id=user).delete()
+        account.delete()
+        user.delete()
+
+    print("🎉 Query count is independent of the number of transactions!")
+
+
+if __name__ == "__main__":
+    try:
+        test_constant_query_count()
+    except AssertionError as e:
+        print("❌", str(e))
+        sys.exit(1)